@@ -8,7 +8,7 @@ Functionality common to multiple modules.
 
 import enum
 
-__all__ = ['CloseMode', 'WriteFailureAction', 'Format', 'Compression', 'SortByType', 'SortOrder']
+__all__ = ['CloseMode', 'WriteFailureAction', 'Format', 'Compression', 'SortByType', 'SortOrder', 'Schedule']
 
 @enum.unique
 class CloseMode(enum.Enum):
@@ -59,6 +59,16 @@ class Compression(enum.Enum):
     """`gzip <https:://en.wikipedia.org/wiki/Gzip>`_ data compression."""
     bzip2 = 2
     """`bzip2 <https:://en.wikipedia.org/wiki/Bzip2>`_ data compression."""
+    zstd = 3
+    """`Zstandard <https://en.wikipedia.org/wiki/Zstd>`_ data compression, only supported by local execution with Python 3.14 or the ``zstandard`` package.
+
+    .. versionadded:: 1.6
+    """
+    lz4 = 4
+    """`LZ4 <https://en.wikipedia.org/wiki/LZ4_(compression_algorithm)>`_ frame data compression, only supported by local execution with the ``lz4`` package.
+
+    .. versionadded:: 1.6
+    """
 
 @enum.unique
 class SortByType(enum.Enum):
@@ -76,3 +86,21 @@ class SortOrder(enum.Enum):
     descending = 1
     """descending"""
 
+@enum.unique
+class Schedule(enum.Enum):
+    """Scheduling policies of files found by a directory scan.
+
+    The policies determine the order in which file names are generated and
+    how they are grouped into the batches handed off to downstream operators,
+    a :py:func:`~streamsx.standard.utility.spray` passes each batch to the
+    channel with the fewest batches queued or being processed, ties going
+    to the channels in turn.
+
+    .. versionadded:: 1.6
+    """
+    batch_small = 0
+    """Files of at least the size budget are generated first, each in its own batch, and smaller files are grouped into batches of up to the size budget."""
+    largest_first = 1
+    """Files are generated largest first, each in its own batch, so that large files are started first on the least loaded channels."""
+    oldest_first = 2
+    """Files are generated oldest first, at most the size budget of files (but at least one file) for each scan."""
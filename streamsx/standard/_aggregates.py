@@ -0,0 +1,503 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+"""
+Incremental aggregation for the local executor.
+
+Aggregation state is maintained as tuples enter and leave a window
+so that the cost per tuple does not depend on the window size:
+
+* invertible functions (count, sum, average) subtract evicted values,
+* standard deviation removes evicted values from Welford moments,
+* selective functions (min, max, first, last) use the *two-stacks*
+  sliding window aggregation which is O(1) amortized per tuple,
+* approximate functions (percentile, count distinct with an error, top-k)
+  insert into a mergeable sketch of bounded size, sliding windows
+  keep a logarithmic number of sketches of blocks of tuples.
+"""
+
+import collections
+
+import streamsx.standard._sketches as _sketches
+
+
+class _Count(object):
+    __slots__ = ['n']
+    def __init__(self):
+        self.n = 0
+    def insert(self, v):
+        self.n += 1
+    def evict(self, v):
+        self.n -= 1
+    def merge(self, other):
+        self.n += other.n
+    def value(self):
+        return self.n
+
+
+class _Sum(object):
+    __slots__ = ['total']
+    def __init__(self):
+        self.total = 0
+    def insert(self, v):
+        self.total += v
+    def evict(self, v):
+        self.total -= v
+    def merge(self, other):
+        self.total += other.total
+    def value(self):
+        return self.total
+
+
+class _Average(object):
+    __slots__ = ['total', 'n']
+    def __init__(self):
+        self.total = 0
+        self.n = 0
+    def insert(self, v):
+        self.total += v
+        self.n += 1
+    def evict(self, v):
+        self.total -= v
+        self.n -= 1
+    def merge(self, other):
+        self.total += other.total
+        self.n += other.n
+    def value(self):
+        return self.total / self.n if self.n else 0.0
+
+
+class _Distinct(object):
+    """Exact count of distinct values."""
+    __slots__ = ['counts']
+    def __init__(self):
+        self.counts = collections.Counter()
+    def insert(self, v):
+        self.counts[v] += 1
+    def evict(self, v):
+        c = self.counts[v] - 1
+        if c:
+            self.counts[v] = c
+        else:
+            del self.counts[v]
+    def merge(self, other):
+        self.counts.update(other.counts)
+    def value(self):
+        return len(self.counts)
+
+
+class _Select(object):
+    """Associative function of values for windows that do not evict individual tuples."""
+    __slots__ = ['fn', 'agg', 'empty']
+    def __init__(self, fn):
+        self.fn = fn
+        self.agg = None
+        self.empty = True
+    def insert(self, v):
+        self.agg = v if self.empty else self.fn(self.agg, v)
+        self.empty = False
+    def merge(self, other):
+        if not other.empty:
+            self.agg = other.agg if self.empty else self.fn(other.agg, self.agg)
+            self.empty = False
+    def value(self):
+        return self.agg
+
+
+class _TwoStacks(object):
+    """Sliding window aggregation of an associative function.
+
+    Values are inserted onto the back stack, maintaining a running
+    aggregate. On eviction, when the front stack is empty, the back
+    stack is flipped onto the front stack computing suffix aggregates,
+    so each value is moved at most once.
+    """
+    __slots__ = ['fn', 'front', 'back', 'back_agg']
+    def __init__(self, fn):
+        self.fn = fn
+        self.front = []
+        self.back = []
+        self.back_agg = None
+
+    def insert(self, v):
+        self.back_agg = v if not self.back else self.fn(self.back_agg, v)
+        self.back.append(v)
+
+    def evict(self, v):
+        front = self.front
+        if not front:
+            fn = self.fn
+            back = self.back
+            while back:
+                b = back.pop()
+                front.append((b, fn(b, front[-1][1]) if front else b))
+            self.back_agg = None
+        front.pop()
+
+    def value(self):
+        if not self.front:
+            return self.back_agg
+        if not self.back:
+            return self.front[-1][1]
+        return self.fn(self.front[-1][1], self.back_agg)
+
+
+class _StdDev(object):
+    __slots__ = ['moments', 'sample']
+    def __init__(self, sample):
+        self.moments = _sketches._Moments()
+        self.sample = sample
+    def insert(self, v):
+        self.moments.insert(v)
+    def evict(self, v):
+        self.moments.remove(v)
+    def merge(self, other):
+        self.moments.merge(other.moments)
+    def value(self):
+        return self.moments.stddev(self.sample)
+
+
+class _Sketch(object):
+    """Sketch for windows that do not evict individual tuples."""
+    __slots__ = ['sketch', 'query']
+    def __init__(self, sketch, query):
+        self.sketch = sketch
+        self.query = query
+    def insert(self, v):
+        self.sketch.insert(v)
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+    def value(self):
+        return self.query(self.sketch)
+
+
+class _Block(object):
+    __slots__ = ['sketch', 'n', 'remaining']
+    def __init__(self, sketch):
+        self.sketch = sketch
+        self.n = 0
+        self.remaining = 0
+
+
+class _Blocks(object):
+    """Sketches of a sliding window where values cannot be removed from a sketch.
+
+    The window is split into consecutive blocks each with its own sketch.
+    Blocks are closed after `size` values and when there are more than
+    `per_level` blocks of the same size the two oldest are merged, so
+    older blocks are larger and the number of blocks is logarithmic in
+    the number of values (an *exponential histogram*).
+
+    An evicted value reduces the remaining count of the oldest block,
+    which is discarded once all its values are evicted. A partially
+    evicted block is merged into the result with its weight reduced
+    by the fraction of evicted values.
+
+    Closed blocks other than the oldest do not change until they become
+    the oldest, so their merge is kept and extended as blocks are closed.
+    A value merges only the kept sketch, the oldest block and the open
+    block, the kept sketch is rebuilt when the oldest block is discarded.
+
+    Eviction only counts values so the evicted value is not required.
+    """
+    evicts_value = False
+    __slots__ = ['factory', 'query', 'size', 'per_level', 'blocks', '_closed']
+    def __init__(self, factory, query, size=64, per_level=32):
+        self.factory = factory
+        self.query = query
+        self.size = size
+        self.per_level = per_level
+        self.blocks = []
+        # Merge of the closed blocks after the oldest, None when stale.
+        self._closed = None
+
+    def insert(self, v):
+        blocks = self.blocks
+        if not blocks or blocks[-1].n >= self.size:
+            blocks.append(_Block(self.factory()))
+        b = blocks[-1]
+        b.sketch.insert(v)
+        b.n += 1
+        b.remaining += 1
+        if b.n == self.size:
+            if self._closed is not None and len(blocks) > 1:
+                self._closed.merge(b.sketch)
+            self._cascade()
+
+    def _cascade(self):
+        blocks = self.blocks
+        i = len(blocks) - 1
+        while i > 0:
+            n = blocks[i].n
+            j = i
+            while j > 0 and blocks[j-1].n == n:
+                j -= 1
+            older = blocks[j]
+            if i - j + 1 > self.per_level and older.remaining == older.n:
+                newer = blocks[j+1]
+                older.sketch.merge(newer.sketch)
+                older.n += newer.n
+                older.remaining += newer.remaining
+                del blocks[j+1]
+                if j == 0:
+                    # Values of the kept sketch moved to the oldest block.
+                    self._closed = None
+                i = j
+            else:
+                i = j - 1
+
+    def evict(self, v):
+        oldest = self.blocks[0]
+        oldest.remaining -= 1
+        if oldest.remaining == 0:
+            del self.blocks[0]
+            self._closed = None
+
+    def value(self):
+        blocks = self.blocks
+        result = self.factory()
+        if not blocks:
+            return self.query(result)
+        last = len(blocks) if blocks[-1].n >= self.size else len(blocks) - 1
+        if self._closed is None:
+            self._closed = self.factory()
+            for b in blocks[1:last]:
+                self._closed.merge(b.sketch)
+        oldest = blocks[0]
+        result.merge(oldest.sketch, oldest.remaining / oldest.n)
+        result.merge(self._closed)
+        if last < len(blocks) and len(blocks) > 1:
+            result.merge(blocks[-1].sketch)
+        return self.query(result)
+
+
+def _first(a, b):
+    return a
+
+def _last(a, b):
+    return b
+
+_FACTORIES = {
+    'Count': _Count,
+    'Sum': _Sum,
+    'Average': _Average,
+    'CountDistinct': _Distinct,
+    'PopulationStdDev': lambda: _StdDev(False),
+    'SampleStdDev': lambda: _StdDev(True),
+}
+
+_SELECTIVE = {
+    'Max': max,
+    'Min': min,
+    'First': _first,
+    'Last': _last,
+}
+
+# Approximate functions, given the additional function arguments
+# return the sketch factory and the query of the sketch.
+_SKETCHES = {
+    'Percentile': lambda p: (_sketches._TDigest, lambda d: d.quantile(p / 100.0)),
+    'CountDistinct': lambda error: (lambda: _sketches._HyperLogLog(error), lambda h: int(round(h.cardinality()))),
+    'TopK': lambda k: (lambda: _sketches._SpaceSaving(_TOP_K_CAPACITY * int(k)), lambda s: s.top(int(k))),
+}
+
+# Values counted by top-k per value returned.
+_TOP_K_CAPACITY = 10
+
+_WINDOW_SCOPE = ('CountAll', 'CountGroups')
+
+
+class _Function(object):
+    """Aggregation function of an output attribute.
+
+    Args:
+        name(str): SPL output function name, for example ``Max``.
+        value: Function returning the value to aggregate from a tuple.
+        factory: Function returning a new aggregator, `None` for window scoped functions.
+        sliding: Function returning a new aggregator supporting eviction, defaults to `factory`.
+
+    Aggregators support ``insert(v)`` and ``value()``, those returned by
+    `factory` support ``merge(other)`` where `other` aggregated older values
+    and those returned by `sliding` support ``evict(v)`` of the oldest value.
+    """
+    __slots__ = ['name', 'value', 'factory', 'sliding']
+    def __init__(self, name, value, factory, sliding=None):
+        self.name = name
+        self.value = value
+        self.factory = factory
+        self.sliding = sliding if sliding is not None else factory
+
+
+def _function(name, value, args=()):
+    """Aggregation function for the SPL output function `name`, `None` if unsupported.
+
+    Args:
+        name(str): Output function name.
+        value: Function returning the value to aggregate from a tuple.
+        args(tuple): Additional literal arguments of the function.
+    """
+    if name in _WINDOW_SCOPE:
+        return _Function(name, value, None)
+    if args and name in _SKETCHES:
+        sketch, query = _SKETCHES[name](*args)
+        return _Function(name, value, lambda: _Sketch(sketch(), query), lambda: _Blocks(sketch, query))
+    if name in _FACTORIES:
+        return _Function(name, value, _FACTORIES[name])
+    if name in _SELECTIVE:
+        fn = _SELECTIVE[name]
+        return _Function(name, value, lambda: _Select(fn), lambda: _TwoStacks(fn))
+    return None
+
+
+class _Group(object):
+    __slots__ = ['n', 'last', 'aggregators', 'evicts_value']
+    def __init__(self, functions, sliding):
+        self.n = 0
+        self.last = None
+        if sliding:
+            self.aggregators = [f.sliding() if f.sliding else None for f in functions]
+        else:
+            self.aggregators = [f.factory() if f.factory else None for f in functions]
+        # Whether evicting a tuple requires its values, sketches only count evictions.
+        self.evicts_value = any(getattr(agg, 'evicts_value', True) for agg in self.aggregators if agg is not None)
+
+
+class _Partition(object):
+    """Incrementally aggregated contents of a window partition.
+
+    Args:
+        functions(list): Aggregation functions.
+        group(function): Function returning the group key of a tuple.
+        retain(bool): Whether tuples are retained for eviction, tumbling windows do not evict individual tuples.
+
+    Only the arrival time and group key are retained for tuples of a group
+    whose aggregators do not require the evicted values, such as sketches.
+    """
+    def __init__(self, functions, group, retain=True):
+        self.functions = functions
+        self.group = group
+        self.retain = retain
+        self.tuples = collections.deque()
+        self.groups = collections.OrderedDict()
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def insert(self, t, now=None):
+        key = self.group(t)
+        g = self.groups.get(key)
+        if g is None:
+            g = self.groups[key] = _Group(self.functions, self.retain)
+        g.n += 1
+        g.last = t
+        for f, agg in zip(self.functions, g.aggregators):
+            if agg is not None:
+                agg.insert(f.value(t) if f.value else None)
+        self.count += 1
+        if self.retain:
+            self.tuples.append((now, key, t if g.evicts_value else None))
+
+    def evict(self):
+        """Evict the oldest tuple."""
+        _, key, t = self.tuples.popleft()
+        self.count -= 1
+        g = self.groups[key]
+        g.n -= 1
+        if g.n == 0:
+            del self.groups[key]
+            return
+        for f, agg in zip(self.functions, g.aggregators):
+            if agg is not None:
+                agg.evict(f.value(t) if f.value and t is not None else None)
+
+    def evict_before(self, limit):
+        """Evict tuples that arrived at or before `limit`."""
+        tuples = self.tuples
+        while tuples and tuples[0][0] <= limit:
+            self.evict()
+
+    def clear(self):
+        self.tuples.clear()
+        self.groups.clear()
+        self.count = 0
+
+    def results(self):
+        """Aggregated values for each group as ``(last tuple, values)``."""
+        return _results(self.functions, self.groups, self.count)
+
+
+def _results(functions, groups, count):
+    n_groups = len(groups)
+    results = []
+    for g in groups.values():
+        values = []
+        for f, agg in zip(functions, g.aggregators):
+            if agg is not None:
+                values.append(agg.value())
+            elif f.name == 'CountAll':
+                values.append(count)
+            else:
+                values.append(n_groups)
+        results.append((g.last, values))
+    return results
+
+
+class _Panes(object):
+    """Pre-aggregated panes of a partition shared by windows of different sizes.
+
+    Tuples are inserted into the newest pane and panes are rotated as
+    time passes. The aggregations of a window covering the newest `n`
+    panes are computed by merging the groups of those panes, windows
+    are nested so the panes are merged once for all windows.
+
+    Args:
+        functions(list): Aggregation functions.
+        group(function): Function returning the group key of a tuple.
+        count(int): Number of panes retained, the size of the largest window.
+    """
+    def __init__(self, functions, group, count):
+        self.functions = functions
+        self.group = group
+        self.count = count
+        self.panes = collections.deque([_Partition(functions, group, retain=False)])
+
+    def __len__(self):
+        return sum(len(pane) for pane in self.panes)
+
+    def insert(self, t):
+        self.panes[-1].insert(t)
+
+    def rotate(self):
+        """Start a new pane, discarding the oldest when `count` are retained."""
+        if len(self.panes) >= self.count:
+            pane = self.panes.popleft()
+            pane.clear()
+        else:
+            pane = _Partition(self.functions, self.group, retain=False)
+        self.panes.append(pane)
+
+    def results(self, sizes):
+        """Aggregated values for windows of increasing `sizes` in panes.
+
+        Yields a list of ``(last tuple, values)`` for each group of each window.
+        """
+        functions = self.functions
+        merged = collections.OrderedDict()
+        count = 0
+        covered = 0
+        for size in sizes:
+            while covered < size and covered < len(self.panes):
+                covered += 1
+                pane = self.panes[-covered]
+                count += len(pane)
+                for key, g in pane.groups.items():
+                    m = merged.get(key)
+                    if m is None:
+                        m = merged[key] = _Group(functions, False)
+                        m.last = g.last
+                    m.n += g.n
+                    for ma, ga in zip(m.aggregators, g.aggregators):
+                        if ma is not None:
+                            ma.merge(ga)
+            yield _results(functions, merged, count)
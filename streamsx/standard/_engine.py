@@ -0,0 +1,807 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+"""
+Core of the in-process local executor.
+
+A topology is executed by creating one local operator per SPL operator
+invocation in the topology's graph. Each operator runs on its own thread
+and receives *batches* of tuples through a bounded inbox, thus the
+synchronization cost of the hand-off between operators is paid once
+per batch rather than once per tuple.
+
+Local operator implementations register themselves against the SPL
+operator kind they implement using :py:func:`_operator`.
+"""
+
+import collections
+import math
+import os
+import queue
+import re
+import threading
+import time
+import zlib
+
+import streamsx.spl.op
+import streamsx.spl.types
+from streamsx.topology.schema import CommonSchema, StreamSchema
+
+_OPERATORS = {}
+
+def _operator(*kinds):
+    """Register a local operator class, or a function returning an operator, for SPL operator kinds."""
+    def _register(cls):
+        for kind in kinds:
+            _OPERATORS[kind] = cls
+        return cls
+    return _register
+
+
+class _Punctuation(object):
+    def __init__(self, name):
+        self.name = name
+    def __repr__(self):
+        return self.name
+
+_WINDOW = _Punctuation('WindowMarker')
+_FINAL = _Punctuation('FinalMarker')
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class _Inbox(object):
+    """Bounded multi-producer inbox of ``(port, batch)`` items.
+
+    A batch is either a list of tuples or a punctuation marker.
+    """
+    def __init__(self, job, size):
+        self._job = job
+        self._queue = queue.Queue(maxsize=size)
+        self.closed = False
+
+    def put(self, item):
+        if self.closed:
+            return
+        while True:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self._job._cancelled.is_set() or self.closed:
+                    raise _Cancelled()
+
+    def get(self, timeout=None):
+        """Get the next item, ``None`` when `timeout` expires."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def empty(self):
+        return self._queue.empty()
+
+    def done(self):
+        """Mark the last item got as processed."""
+        self._queue.task_done()
+
+    @property
+    def unfinished(self):
+        """Number of items queued or being processed."""
+        return self._queue.unfinished_tasks
+
+    def close(self):
+        self.closed = True
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+
+
+class _OutputPort(object):
+    """Output port of a local operator.
+
+    Tuples are buffered and handed off to the connected input
+    ports in batches of up to `batch_size` tuples.
+    """
+    def __init__(self, operator, index, schema, batch_size):
+        self.operator = operator
+        self.index = index
+        self.schema = schema
+        self.batch_size = batch_size
+        self.targets = []
+        self.buffer = []
+        self.count = 0
+        self.convert = _converter(schema)
+        self._copy = _copier(schema)
+
+    def connect(self, inbox, port):
+        self.targets.append((inbox, port))
+
+    def submit(self, tuple_):
+        self.buffer.append(tuple_)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def submit_batch(self, batch):
+        if self.buffer:
+            self.buffer.extend(batch)
+            if len(self.buffer) >= self.batch_size:
+                self.flush()
+        elif len(batch) >= self.batch_size:
+            self._send(batch)
+        else:
+            self.buffer = list(batch)
+
+    def flush(self):
+        if self.buffer:
+            batch = self.buffer
+            self.buffer = []
+            self._send(batch)
+
+    def _send(self, batch):
+        self.count += len(batch)
+        first = True
+        for inbox, port in self.targets:
+            # Each connected input port receives its own tuples
+            # so that operators may modify them in place.
+            inbox.put((port, batch if first else self._copy(batch)))
+            first = False
+
+    def punct(self, marker=_WINDOW):
+        self.flush()
+        for inbox, port in self.targets:
+            inbox.put((port, marker))
+
+
+class _Operator(object):
+    """Base class for local operators.
+
+    Args:
+        job(LocalJob): Job executing the operator.
+        op: SPL operator invocation from the topology graph.
+    """
+    final_ports = None
+    """Input ports whose final marker completes the operator, `None` means all ports."""
+
+    def __init__(self, job, op):
+        self.job = job
+        self.op = op
+        self.name = op.name
+        self.inputs = [ip.schema for ip in op.inputPorts]
+        self.outputs = [_OutputPort(self, p.index, p.schema, job.batch_size) for p in op.outputPorts]
+        self.inbox = _Inbox(job, job.queue_size) if self.inputs else None
+        self.deadline = None
+        self.tuples_in = 0
+        self._finals = set()
+
+    @property
+    def invoke(self):
+        """``streamsx.spl.op.Invoke`` instance that declared the operator, if any."""
+        return getattr(self.op, '_ex_op', None)
+
+    def param(self, name, default=None):
+        """Python value of the operator parameter `name`."""
+        return _param_value(self.op.params.get(name), default)
+
+    def assignments(self, port=0):
+        """Output assignments for an output port as a list of ``(attribute, Expression)``."""
+        return _output_assignments(self.invoke, port)
+
+    def submit(self, port, tuple_):
+        self.outputs[port].submit(tuple_)
+
+    def punct(self, port=None):
+        ports = self.outputs if port is None else [self.outputs[port]]
+        for oport in ports:
+            oport.punct(_WINDOW)
+
+    def flush(self):
+        for oport in self.outputs:
+            oport.flush()
+
+    def start(self):
+        """Called on the operator's thread before any tuple is processed."""
+        pass
+
+    def process(self, port, batch):
+        """Process a batch of tuples arriving on input port `port`."""
+        on_tuple = self.on_tuple
+        for tuple_ in batch:
+            on_tuple(port, tuple_)
+
+    def on_tuple(self, port, tuple_):
+        pass
+
+    def on_punct(self, port):
+        """Window marker arrived on `port`, forwarded to all outputs by default."""
+        self.punct()
+
+    def on_final(self, port):
+        """Final marker arrived on `port`."""
+        pass
+
+    def on_timer(self, now):
+        """Called when :py:attr:`deadline` has passed."""
+        pass
+
+    def completed(self):
+        ports = range(len(self.inputs)) if self.final_ports is None else self.final_ports
+        return all(p in self._finals for p in ports)
+
+    def close(self):
+        """Called on the operator's thread once the operator has completed."""
+        pass
+
+    def run(self):
+        inbox = self.inbox
+        self.start()
+        while not self.job._cancelled.is_set():
+            if self.deadline is not None:
+                wait = self.deadline - time.monotonic()
+                if wait <= 0:
+                    self.deadline = None
+                    self.on_timer(time.monotonic())
+                    self.flush()
+                    if self.completed():
+                        break
+                    continue
+                item = inbox.get(timeout=min(wait, 0.1))
+            else:
+                item = inbox.get(timeout=0.1)
+            if item is None:
+                continue
+            port, batch = item
+            if batch is _FINAL:
+                self._finals.add(port)
+                self.on_final(port)
+            elif batch is _WINDOW:
+                self.on_punct(port)
+            else:
+                self.tuples_in += len(batch)
+                self.process(port, batch)
+            inbox.done()
+            if self.completed():
+                break
+            # Only hand off partial batches when there is no
+            # more work queued, coalescing tuples under load.
+            if inbox.empty():
+                self.flush()
+        else:
+            return
+        inbox.close()
+        self.close()
+        for oport in self.outputs:
+            oport.punct(_FINAL)
+
+
+class _SourceOperator(_Operator):
+    """Base class for local operators that have no input ports."""
+
+    def produce(self):
+        """Generate tuples until the source is exhausted or the job is cancelled."""
+        pass
+
+    @property
+    def cancelled(self):
+        return self.job._cancelled.is_set()
+
+    def sleep(self, seconds):
+        """Sleep for `seconds` returning `False` if the job was cancelled."""
+        self.flush()
+        return not self.job._cancelled.wait(seconds)
+
+    def run(self):
+        self.start()
+        self.produce()
+        if self.cancelled:
+            return
+        self.close()
+        for oport in self.outputs:
+            oport.punct(_FINAL)
+
+
+#
+# Schemas and tuple conversion
+#
+
+def _attribute_names(schema):
+    """Attribute names of a structured schema, `None` for other schemas."""
+    if isinstance(schema, StreamSchema) and not isinstance(schema, CommonSchema):
+        types = getattr(schema, '_types', None)
+        if types is not None:
+            return [name for _, name in types]
+    return None
+
+def _attribute_types(schema):
+    if isinstance(schema, StreamSchema) and not isinstance(schema, CommonSchema):
+        types = getattr(schema, '_types', None)
+        if types is not None:
+            return collections.OrderedDict((name, type_) for type_, name in types)
+    return None
+
+def _converter(schema):
+    """Function converting a value returned from a Python callable to a tuple of `schema`."""
+    if schema is CommonSchema.String:
+        return lambda v: v if isinstance(v, str) else str(v)
+    names = _attribute_names(schema)
+    if names is None:
+        return lambda v: v
+    def _convert(v):
+        if isinstance(v, dict):
+            return v
+        if isinstance(v, tuple):
+            return dict(zip(names, v))
+        raise TypeError('Cannot convert {} to schema {}'.format(type(v), schema))
+    return _convert
+
+def _copier(schema):
+    if _attribute_names(schema) is not None or schema is CommonSchema.Json:
+        return lambda batch: [dict(t) if isinstance(t, dict) else t for t in batch]
+    return lambda batch: list(batch)
+
+def _as_dict(schema, tuple_):
+    """Structured view of a tuple, string tuples have a single ``string`` attribute."""
+    if isinstance(tuple_, dict):
+        return tuple_
+    if schema is CommonSchema.String:
+        return {'string': tuple_}
+    return {'__spl_po': tuple_}
+
+_DEFAULTS = {'boolean': False, 'rstring': '', 'ustring': '', 'timestamp': None, 'blob': b''}
+
+def _default_value(type_):
+    if isinstance(type_, str):
+        if type_ in _DEFAULTS:
+            return _DEFAULTS[type_]
+        if type_.startswith('float') or type_.startswith('decimal'):
+            return 0.0
+        if type_.startswith('int') or type_.startswith('uint'):
+            return 0
+    return None
+
+def _parser(type_):
+    """Function converting a text field to a value of the SPL type `type_`."""
+    if isinstance(type_, str):
+        if type_.startswith('int') or type_.startswith('uint'):
+            return int
+        if type_.startswith('float') or type_.startswith('decimal'):
+            return float
+        if type_ == 'boolean':
+            return lambda v: v.strip().lower() == 'true'
+    return lambda v: v
+
+
+#
+# Parameter values
+#
+
+def _param_value(value, default=None):
+    """Python value of an SPL operator parameter value.
+
+    SPL expressions are returned as their expression text,
+    typed literals as the Python value.
+    """
+    if value is None:
+        return default
+    if isinstance(value, streamsx.spl.op.Expression):
+        if value._type == 'splexpr':
+            if str(value._value) == 'null':
+                return default
+            return str(value._value)
+        return value._value
+    if hasattr(value, 'spl_json'):
+        return value.spl_json()['value']
+    if hasattr(value, 'name') and hasattr(value, 'value') and not isinstance(value, (str, bytes)):
+        return value.name
+    return value
+
+def _param_bool(value, default=False):
+    value = _param_value(value, default)
+    if isinstance(value, str):
+        return value.strip() == 'true'
+    return bool(value)
+
+def _param_names(value):
+    """Attribute names from a parameter value such as ``groupBy``."""
+    value = _param_value(value)
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(_param_value(v)).split('.')[-1] for v in value]
+    return [v.strip().split('.')[-1] for v in str(value).split(',') if v.strip()]
+
+def _output_assignments(invoke, port=0):
+    assigns = []
+    if invoke is None:
+        return assigns
+    for attr, e in invoke.__dict__.items():
+        if isinstance(e, streamsx.spl.op.Expression) and hasattr(e, '_stream'):
+            if e._stream.oport.index == port:
+                assigns.append((attr, e))
+    return assigns
+
+
+#
+# SPL expressions
+#
+
+_TOKENS = re.compile(r'''\s*(?:
+    (?P<num>(?:\d+\.\d*|\.\d+|\d+)(?:[eE][+-]?\d+)?)(?P<suffix>[a-zA-Z]*)
+   |(?P<str>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')[ru]?
+   |(?P<name>[A-Za-z_$][A-Za-z0-9_$]*(?:::[A-Za-z_][A-Za-z0-9_]*)*)
+   |(?P<op>&&|\|\||==|!=|<=|>=|[-+*/%<>!()\[\],.?:])
+   )''', re.VERBOSE)
+
+_CASTS = {
+    'int8': int, 'int16': int, 'int32': int, 'int64': int,
+    'uint8': int, 'uint16': int, 'uint32': int, 'uint64': int,
+    'float32': float, 'float64': float,
+    'decimal32': float, 'decimal64': float, 'decimal128': float,
+    'rstring': str, 'ustring': str, 'boolean': bool,
+}
+
+_OPS = {'&&': ' and ', '||': ' or ', '!': ' not '}
+
+def _hash_code(value):
+    """Stable hash of a value, consistent across processes and runs."""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, int):
+        return value & 0xFFFFFFFFFFFFFFFF
+    if not isinstance(value, bytes):
+        value = str(value).encode('utf-8')
+    return zlib.crc32(value)
+
+_FUNCTIONS = {
+    'abs': abs, 'min': min, 'max': max,
+    'length': len, 'size': len,
+    'toString': str, 'hashCode': _hash_code,
+    'sqrt': math.sqrt, 'log': math.log, 'exp': math.exp, 'pow': pow,
+    'floor': math.floor, 'ceil': math.ceil, 'round': round,
+    'getTimestamp': streamsx.spl.types.Timestamp.now,
+    'getTimestampInSecs': time.time,
+    'getChannel': lambda: 0,
+    'getMaxChannels': lambda: 1,
+}
+
+def _tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = _TOKENS.match(text, pos)
+        if m is None or m.end() == pos:
+            raise ValueError('Unsupported SPL expression: ' + text)
+        pos = m.end()
+        if m.group('num') is not None:
+            num = m.group('num')
+            suffix = m.group('suffix')
+            if '.' in num or 'e' in num.lower() or 'f' in suffix or 'd' in suffix:
+                tokens.append(('lit', repr(float(num))))
+            else:
+                tokens.append(('lit', repr(int(num))))
+        elif m.group('str') is not None:
+            tokens.append(('lit', m.group('str')))
+        elif m.group('name') is not None:
+            tokens.append(('name', m.group('name')))
+        else:
+            tokens.append(('op', m.group('op')))
+    return tokens
+
+def _operand_end(tokens, i):
+    """Index after the unary operand starting at `tokens[i]`."""
+    kind, value = tokens[i]
+    if kind == 'op' and value in ('-', '+', '!'):
+        return _operand_end(tokens, i + 1)
+    if kind == 'op' and value == '(':
+        i = _matching(tokens, i)
+    i += 1
+    while i < len(tokens):
+        if tokens[i] == ('op', '('):
+            i = _matching(tokens, i) + 1
+        elif tokens[i] == ('op', '['):
+            i = _matching(tokens, i) + 1
+        elif tokens[i] == ('op', '.') and i + 1 < len(tokens):
+            i += 2
+        else:
+            break
+    return i
+
+def _matching(tokens, i):
+    close = ')' if tokens[i][1] == '(' else ']'
+    depth = 0
+    for j in range(i, len(tokens)):
+        if tokens[j][0] == 'op':
+            if tokens[j][1] in ('(', '['):
+                depth += 1
+            elif tokens[j][1] in (')', ']'):
+                depth -= 1
+                if depth == 0:
+                    return j
+    raise ValueError('Unbalanced SPL expression')
+
+def _translate(tokens, functions, ports):
+    out = []
+    i = 0
+    while i < len(tokens):
+        kind, value = tokens[i]
+        nxt = tokens[i + 1] if i + 1 < len(tokens) else (None, None)
+        if kind == 'lit':
+            out.append(value)
+        elif kind == 'name':
+            if value in ('true', 'false'):
+                out.append(value == 'true' and 'True' or 'False')
+            elif value == 'null':
+                out.append('None')
+            elif nxt == ('op', '('):
+                fn = value.split('::')[-1]
+                if fn not in functions:
+                    raise ValueError('Unsupported SPL function: ' + value)
+                out.append('__f_' + fn)
+            elif ports and value in ports and nxt == ('op', '.'):
+                out.append('__t{}[{!r}]'.format(ports[value], tokens[i + 2][1]))
+                i += 2
+            else:
+                out.append('__t[{!r}]'.format(value))
+            # Tuple attribute access
+            while i + 2 < len(tokens) and tokens[i + 1] == ('op', '.') and tokens[i + 2][0] == 'name' and out[-1].startswith('__t'):
+                out.append('[{!r}]'.format(tokens[i + 2][1]))
+                i += 2
+        elif value == '(' and nxt[0] == 'name' and nxt[1] in _CASTS and i + 3 < len(tokens) and tokens[i + 2] == ('op', ')') and tokens[i + 3] not in (('op', ')'), ('op', ','), ('op', '&&'), ('op', '||')):
+            end = _operand_end(tokens, i + 3)
+            out.append('__cast_{}({})'.format(nxt[1], _translate(tokens[i + 3:end], functions, ports)))
+            i = end
+            continue
+        elif value in ('?', ':'):
+            raise ValueError('Conditional SPL expressions are not supported')
+        else:
+            out.append(_OPS.get(value, value))
+        i += 1
+    return ''.join(out)
+
+def _expression_source(expression, functions=_FUNCTIONS, ports=None):
+    """Python source for an SPL expression.
+
+    In the returned source the input tuple is ``__t`` or
+    ``__t0``, ``__t1``... when `ports` maps input aliases to port indexes.
+    """
+    if isinstance(expression, streamsx.spl.op.Expression):
+        etype = expression._type
+        value = expression._value
+    elif hasattr(expression, 'spl_json'):
+        sj = expression.spl_json()
+        etype = sj['type']
+        value = sj['value']
+    elif isinstance(expression, str):
+        etype = 'splexpr'
+        value = expression
+    else:
+        return repr(expression)
+    if etype == 'attribute':
+        if ports and '.' in value:
+            alias, name = value.split('.', 1)
+            return '__t{}[{!r}]'.format(ports[alias], name)
+        return '__t[{!r}]'.format(value)
+    if etype != 'splexpr':
+        return repr(value)
+    return _translate(_tokenize(str(value)), functions, ports)
+
+def _environment(functions):
+    env = {'__builtins__': {}}
+    for name, fn in functions.items():
+        env['__f_' + name] = fn
+    for name, fn in _CASTS.items():
+        env['__cast_' + name] = fn
+    return env
+
+def _compile(expression, functions=None, ports=None):
+    """Compile an SPL expression to a function of the input tuple(s)."""
+    functions = dict(_FUNCTIONS, **(functions or {}))
+    src = _expression_source(expression, functions, ports)
+    args = '__t' if not ports else ','.join('__t' + str(i) for i in sorted(set(ports.values())))
+    return eval('lambda {}: {}'.format(args, src), _environment(functions))
+
+def _compile_assignments(names, assigns, functions=None, ports=None):
+    """Compile output assignments to a function returning the output tuple.
+
+    Attributes in `names` without an assignment are set from the
+    input attribute with the same name, from the first port that
+    has the attribute when `ports` is set.
+
+    Args:
+        names(list): Output attribute names.
+        assigns(dict): Output attribute name to SPL expression.
+        functions(dict): Additional functions available to the expressions.
+        ports(dict): Input alias to port index and attribute names.
+    """
+    functions = dict(_FUNCTIONS, **(functions or {}))
+    aliases = None
+    if ports:
+        aliases = {alias: index for alias, (index, _) in ports.items()}
+    items = []
+    for name in names:
+        if name in assigns:
+            src = _expression_source(assigns[name], functions, aliases)
+        elif ports:
+            src = 'None'
+            for alias, (index, attrs) in sorted(ports.items(), key=lambda p: p[1][0]):
+                if attrs is not None and name in attrs:
+                    src = '__t{}[{!r}]'.format(index, name)
+                    break
+        else:
+            src = '__t.get({!r})'.format(name)
+        items.append('{!r}: {}'.format(name, src))
+    args = '__t' if not ports else ','.join('__t' + str(i) for i in sorted(aliases.values()))
+    return eval('lambda {}: {{{}}}'.format(args, ', '.join(items)), _environment(functions))
+
+
+#
+# Windows
+#
+
+class _WindowSpec(object):
+    """Window configuration of an input port."""
+    def __init__(self, config):
+        config = config or {}
+        self.tumbling = config.get('type') == 'TUMBLING'
+        self.evict_policy = config.get('evictPolicy')
+        self.evict = _window_value(config, 'evict')
+        self.trigger_policy = config.get('triggerPolicy')
+        self.trigger = _window_value(config, 'trigger')
+        self.partition_by = config.get('partitionBy') if config.get('partitioned') else None
+        if self.evict_policy not in (None, 'COUNT', 'TIME', 'PUNCTUATION'):
+            raise NotImplementedError('Window eviction policy ' + str(self.evict_policy))
+        if self.trigger_policy not in (None, 'COUNT', 'TIME'):
+            raise NotImplementedError('Window trigger policy ' + str(self.trigger_policy))
+        if not self.tumbling and self.trigger_policy is None:
+            self.trigger_policy = 'COUNT'
+            self.trigger = 1
+
+    @property
+    def time_based(self):
+        return self.evict_policy == 'TIME'
+
+def _window_value(config, policy):
+    value = config.get(policy + 'Config')
+    if value is None:
+        return None
+    if config.get(policy + 'Policy') == 'TIME':
+        unit = config.get(policy + 'TimeUnit', 'MILLISECONDS')
+        scale = {'MILLISECONDS': 1e-3, 'SECONDS': 1.0, 'MICROSECONDS': 1e-6, 'NANOSECONDS': 1e-9}
+        return float(value) * scale.get(unit, 1e-3)
+    return int(value)
+
+
+#
+# Job
+#
+
+def _create(job, op):
+    kind = op.kind
+    if kind.startswith('$'):
+        if kind == '$Union$':
+            kind = '$Union$'
+        else:
+            kind = '$Marker$'
+    cls = _OPERATORS.get(kind)
+    if cls is None:
+        raise NotImplementedError('Operator kind {} is not supported by the local executor'.format(op.kind))
+    return cls(job, op)
+
+
+class LocalJob(object):
+    """Execution of a topology within the current process.
+
+    Args:
+        topology(Topology): Topology to execute.
+        batch_size(int): Maximum number of tuples handed off between operators as a single batch.
+        queue_size(int): Maximum number of batches queued for an operator before upstream operators are blocked.
+        app_dir(str): Application directory, relative file names for sources are resolved against it, defaults to the current working directory.
+        data_dir(str): Data directory, relative file names for sinks are resolved against it, defaults to the current working directory.
+    """
+    def __init__(self, topology, batch_size=1024, queue_size=64, app_dir=None, data_dir=None):
+        self.topology = topology
+        self.batch_size = int(batch_size)
+        self.queue_size = int(queue_size)
+        self.app_dir = app_dir if app_dir else os.getcwd()
+        self.data_dir = data_dir if data_dir else os.getcwd()
+        self._cancelled = threading.Event()
+        self._threads = []
+        self._errors = []
+        self._started = None
+        self._ended = None
+        self.operators = [_create(self, op) for op in topology.graph.operators]
+        self._connect()
+
+    def _connect(self):
+        by_op = {id(o.op): o for o in self.operators}
+        for o in self.operators:
+            # A stream is only unioned once with itself
+            union = o.op.kind == '$Union$'
+            connected = set()
+            ports = set()
+            for ip in o.op.inputPorts:
+                if not union:
+                    connected = set()
+                for oport in ip.outputPorts:
+                    if id(oport) in connected:
+                        continue
+                    connected.add(id(oport))
+                    upstream = by_op[id(oport.operator)]
+                    upstream.outputs[oport.index].connect(o.inbox, ip.index)
+                    ports.add(ip.index)
+            # Ports without a connection never receive a final marker
+            o._finals.update(set(range(len(o.inputs))) - ports)
+
+    def start(self):
+        """Start execution of the topology."""
+        self._started = time.monotonic()
+        for o in self.operators:
+            t = threading.Thread(target=self._run, args=(o,), name=o.name, daemon=True)
+            self._threads.append(t)
+        for t in self._threads:
+            t.start()
+        return self
+
+    def _run(self, operator):
+        try:
+            operator.run()
+        except _Cancelled:
+            pass
+        except BaseException as e:
+            self._errors.append(e)
+            self._cancelled.set()
+
+    def join(self, timeout=None):
+        """Wait for the topology to complete.
+
+        Args:
+            timeout(float): Maximum time to wait in seconds, `None` to wait until all operators have completed.
+
+        Returns:
+            bool: `True` if the topology completed, `False` if `timeout` expired.
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        for t in self._threads:
+            t.join(None if end is None else max(0.0, end - time.monotonic()))
+            if t.is_alive():
+                return False
+        self._ended = time.monotonic()
+        if self._errors:
+            raise self._errors[0]
+        return True
+
+    def cancel(self):
+        """Cancel execution, all operators stop as soon as possible."""
+        self._cancelled.set()
+        for t in self._threads:
+            t.join()
+        self._ended = time.monotonic()
+        if self._errors:
+            raise self._errors[0]
+
+    @property
+    def elapsed(self):
+        """Elapsed execution time in seconds."""
+        if self._started is None:
+            return 0.0
+        end = self._ended if self._ended is not None else time.monotonic()
+        return end - self._started
+
+    @property
+    def metrics(self):
+        """Per-operator metrics keyed by operator name.
+
+        Each value is a dictionary with ``tuples_in`` (tuples processed), ``tuples_out``
+        (tuples submitted across all output ports) and ``rate`` (tuples submitted per second).
+        """
+        elapsed = self.elapsed
+        m = collections.OrderedDict()
+        for o in self.operators:
+            out = sum(p.count for p in o.outputs)
+            m[o.name] = {'tuples_in': o.tuples_in, 'tuples_out': out, 'rate': out / elapsed if elapsed else 0.0}
+        return m
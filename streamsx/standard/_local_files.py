@@ -0,0 +1,1091 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+"""
+Local implementations of the operators used by :py:mod:`streamsx.standard.files`.
+"""
+
+import array
+import bz2
+import collections
+import concurrent.futures
+import csv
+import ctypes
+import ctypes.util
+import gzip
+import io
+import itertools
+import mmap
+import multiprocessing
+import os
+import re
+import select
+import shutil
+import stat
+import struct
+import sys
+import time
+import zlib
+
+try:
+    import numpy as _numpy
+except ImportError:
+    _numpy = None
+
+from streamsx.topology.schema import CommonSchema
+import streamsx.standard._sketches as _sketches
+
+from streamsx.standard._engine import _operator, _Operator, _SourceOperator, _FINAL
+from streamsx.standard._engine import _attribute_names, _attribute_types, _parser, _as_dict, _compile, _param_bool
+
+
+class _ZlibReader(io.RawIOBase):
+    """Readable stream decompressing a zlib stream."""
+    def __init__(self, raw):
+        self._raw = raw
+        self._d = zlib.decompressobj()
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            data = self._raw.read(65536)
+            if not data:
+                self._buffer = self._d.flush()
+                break
+            self._buffer = self._d.decompress(data)
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    def close(self):
+        self._raw.close()
+        super(_ZlibReader, self).close()
+
+
+class _ZlibWriter(io.RawIOBase):
+    """Writable stream compressing to a zlib stream."""
+    def __init__(self, raw, level=-1):
+        self._raw = raw
+        self._c = zlib.compressobj(level)
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._raw.write(self._c.compress(bytes(b)))
+        return len(b)
+
+    def close(self):
+        if not self.closed:
+            self._raw.write(self._c.flush())
+            self._raw.close()
+        super(_ZlibWriter, self).close()
+
+
+def _open(path, mode, compression=None, level=None):
+    """Open a file in binary `mode` with optional compression at `level`."""
+    if compression is None:
+        return open(path, mode)
+    if compression == 'gzip':
+        return gzip.open(path, mode, 9 if level is None else level)
+    if compression == 'bzip2':
+        return bz2.open(path, mode, 9 if level is None else level)
+    if compression == 'zlib':
+        if 'r' in mode:
+            return io.BufferedReader(_ZlibReader(open(path, mode)))
+        return io.BufferedWriter(_ZlibWriter(open(path, mode), -1 if level is None else level))
+    if compression == 'zstd':
+        return _open_zstd(path, mode, level)
+    if compression == 'lz4':
+        try:
+            import lz4.frame
+        except ImportError:
+            raise ImportError('lz4 compression requires the lz4 package')
+        return lz4.frame.open(path, mode, compression_level=level or 0)
+    raise ValueError('Unsupported compression: ' + str(compression))
+
+def _open_zstd(path, mode, level):
+    try:
+        # Python 3.14 standard library
+        from compression import zstd
+        return zstd.open(path, mode, level=None if 'r' in mode else level)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('zstd compression requires Python 3.14 or the zstandard package')
+    raw = open(path, mode)
+    if 'r' in mode:
+        # Files may hold multiple frames, for example when appended to.
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True))
+    return io.BufferedWriter(zstandard.ZstdCompressor(level=3 if level is None else level).stream_writer(raw, closefd=True))
+
+
+def _block_compressor(compression, level):
+    """Function compressing a block of data to a complete member of `compression`.
+
+    Files of concatenated members are valid files of the compression.
+    """
+    if compression == 'gzip':
+        return lambda b: gzip.compress(b, 9 if level is None else level)
+    if compression == 'bzip2':
+        return lambda b: bz2.compress(b, 9 if level is None else level)
+    if compression == 'zstd':
+        try:
+            from compression import zstd
+            return lambda b: zstd.compress(b, level)
+        except ImportError:
+            pass
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('zstd compression requires Python 3.14 or the zstandard package')
+        # A compressor is not thread safe, so one is created for each block.
+        return lambda b: zstandard.ZstdCompressor(level=3 if level is None else level).compress(b)
+    if compression == 'lz4':
+        try:
+            import lz4.frame
+        except ImportError:
+            raise ImportError('lz4 compression requires the lz4 package')
+        return lambda b: lz4.frame.compress(b, compression_level=level or 0)
+    raise ValueError('Compression does not support independent members: ' + str(compression))
+
+
+class _ParallelWriter(io.RawIOBase):
+    """Writable stream compressing blocks in parallel.
+
+    Data is split into blocks that are compressed to independent members
+    by the threads of `executor`, the compression libraries release the
+    GIL, and the members are written in order as they complete.
+    """
+    def __init__(self, raw, compress, executor, threads, block_size=1 << 20):
+        self._raw = raw
+        self._compress = compress
+        self._executor = executor
+        self._limit = 2 * threads
+        self._block_size = block_size
+        self._buffer = bytearray()
+        self._pending = collections.deque()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._buffer += b
+        if len(self._buffer) >= self._block_size:
+            self._submit()
+        return len(b)
+
+    def _submit(self):
+        block = bytes(self._buffer)
+        self._buffer.clear()
+        self._pending.append(self._executor.submit(self._compress, block))
+        # Bound the memory of blocks in progress.
+        while len(self._pending) > self._limit:
+            self._raw.write(self._pending.popleft().result())
+
+    def flush(self):
+        # Cutting the buffered data into a member on each flush would
+        # write many small members and wait for the threads, instead
+        # only the blocks already compressed are written.
+        if self.closed:
+            return
+        pending = self._pending
+        while pending and pending[0].done():
+            self._raw.write(pending.popleft().result())
+        self._raw.flush()
+
+    def close(self):
+        if not self.closed:
+            try:
+                if self._buffer:
+                    self._submit()
+                while self._pending:
+                    self._raw.write(self._pending.popleft().result())
+                super(_ParallelWriter, self).close()
+            finally:
+                self._raw.close()
+
+
+def _resolve(path, directory):
+    return path if os.path.isabs(path) else os.path.join(directory, path)
+
+def _file_functions(job):
+    return {'getApplicationDir': lambda: job.app_dir, 'dataDirectory': lambda: job.data_dir}
+
+
+class _Inotify(object):
+    """Linux inotify watch of a directory for files that are complete.
+
+    A file is complete when it is closed after being written or
+    moved into the directory.
+
+    Raises:
+        OSError: inotify is not available or the directory cannot be watched.
+    """
+    _IN_CLOSE_WRITE = 0x00000008
+    _IN_MOVED_TO = 0x00000080
+    _IN_Q_OVERFLOW = 0x00004000
+    _IN_NONBLOCK = 0o4000
+    _IN_CLOEXEC = 0o2000000
+    _EVENT = struct.Struct('iIII')
+
+    def __init__(self, directory):
+        if not sys.platform.startswith('linux'):
+            raise OSError('inotify requires Linux')
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(self._IN_NONBLOCK | self._IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1')
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), self._IN_CLOSE_WRITE | self._IN_MOVED_TO)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, 'inotify_add_watch', directory)
+
+    def read(self, timeout):
+        """Names of files completed within `timeout` seconds, `None` if events were lost."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        names = []
+        overflow = False
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            if mask & self._IN_Q_OVERFLOW:
+                overflow = True
+            elif length:
+                names.append(os.fsdecode(data[offset:offset+length].rstrip(b'\0')))
+            offset += length
+        return None if overflow else names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _Manifest(object):
+    """Persistent set of the identities of processed files.
+
+    A file's identity is its inode, size and modification time, so a
+    file that is rewritten, or replaced by a file of the same name, is
+    not in the set. Identities are appended to the manifest file as
+    fixed size records and the file is compacted, by replacing it with
+    one holding only the identities of files still present, once it
+    holds more than twice as many records as were present at the last
+    compaction.
+    """
+    _MAGIC = b'SXSCAN01'
+    # inode, size, modification time in nanoseconds
+    _RECORD = struct.Struct('<QQq')
+
+    def __init__(self, path):
+        self.path = path
+        self.identities = set()
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b''
+        if data[:len(self._MAGIC)] == self._MAGIC:
+            size = self._RECORD.size
+            end = len(self._MAGIC) + (len(data) - len(self._MAGIC)) // size * size
+            # A partial trailing record, from a failure during an append, is ignored.
+            self.identities.update(self._RECORD.iter_unpack(data[len(self._MAGIC):end]))
+            self.records = len(self.identities)
+            self._open(end)
+        else:
+            self.compact(())
+
+    @staticmethod
+    def identity(st):
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def _open(self, size):
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CLOEXEC)
+        os.ftruncate(self.fd, size)
+        self.live = max(self.records, 1024)
+
+    def __contains__(self, st):
+        return self.identity(st) in self.identities
+
+    def add(self, st):
+        identity = self.identity(st)
+        if identity not in self.identities:
+            self.identities.add(identity)
+            os.write(self.fd, self._RECORD.pack(*identity))
+            self.records += 1
+
+    @property
+    def needs_compaction(self):
+        return self.records > 2 * self.live
+
+    def compact(self, present):
+        """Replace the manifest with the identities in both it and `present`."""
+        if hasattr(self, 'fd'):
+            os.close(self.fd)
+        self.identities.intersection_update(present)
+        tmp = self.path + '.' + str(os.getpid()) + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(self._MAGIC)
+            for identity in self.identities:
+                f.write(self._RECORD.pack(*identity))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.records = len(self.identities)
+        self._open(len(self._MAGIC) + self._RECORD.size * self.records)
+
+    def close(self):
+        os.close(self.fd)
+
+
+_Entry = collections.namedtuple('_Entry', ['name', 'path'])
+
+
+@_operator('spl.adapter::DirectoryScan')
+class _DirectoryScan(_SourceOperator):
+    def __init__(self, job, op):
+        super(_DirectoryScan, self).__init__(job, op)
+        directory = op.params.get('directory')
+        if getattr(directory, '_type', None) == 'splexpr':
+            self.directory = _compile(directory, functions=_file_functions(job))(None)
+        else:
+            self.directory = self.param('directory')
+        pattern = self.param('pattern')
+        self.pattern = re.compile(pattern) if pattern else None
+        self.sleep_time = float(self.param('sleepTime', 5.0))
+        self.init_delay = self.param('initDelay')
+        self.sort_by = self.param('sortBy', 'date')
+        self.descending = self.param('order') == 'descending'
+        self.move_to = self.param('moveToDirectory')
+        self.ignore_dot_files = _param_bool(op.params.get('ignoreDotFiles'))
+        self.ignore_existing = _param_bool(op.params.get('ignoreExistingFilesAtStartup'))
+        options = getattr(self.invoke, '_local_options', {})
+        self.watch = options.get('watch', False)
+        self.manifest = options.get('manifest')
+        self.shard = options.get('shard')
+        self.schedule = options.get('schedule')
+        self.size_budget = options.get('size_budget', 16 * 1024 * 1024)
+        names = _attribute_names(self.outputs[0].schema)
+        if names is None:
+            self._tuple = lambda path: path
+        else:
+            self._tuple = lambda path: {names[0]: path}
+        self._seen = {}
+        self._manifest = None
+
+    def _accept(self, name):
+        if self.ignore_dot_files and name.startswith('.'):
+            return False
+        if self.shard is not None and _sketches._hash64(name) % self.shard[1] != self.shard[0]:
+            return False
+        return self.pattern is None or self.pattern.search(name)
+
+    def _candidates(self):
+        candidates = []
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return candidates
+        for entry in entries:
+            if not self._accept(entry.name):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            if self._processed(entry.path, st):
+                continue
+            candidates.append((entry, st))
+        return candidates
+
+    def _named(self, names):
+        """Candidates for files in `names` reported by a watch."""
+        candidates = []
+        for name in set(names):
+            if not self._accept(name):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if not stat.S_ISREG(st.st_mode) or self._processed(path, st):
+                continue
+            candidates.append((_Entry(name, path), st))
+        return candidates
+
+    def _order(self, candidates):
+        if self.sort_by == 'name':
+            key = lambda c: c[0].name
+        else:
+            key = lambda c: c[1].st_mtime
+        candidates.sort(key=key, reverse=self.descending)
+        return candidates
+
+    def _dispatch(self, candidates):
+        """Emit `candidates` according to the schedule, returning those deferred."""
+        candidates = self._order(candidates)
+        budget = self.size_budget
+        if self.schedule == 'largest_first':
+            candidates.sort(key=lambda c: c[1].st_size, reverse=True)
+            for entry, st in candidates:
+                self._emit(entry, st)
+                # Each file is handed off on its own so that a downstream
+                # spray passes it to the channel with the least queued work.
+                self.flush()
+        elif self.schedule == 'batch_small':
+            large = [c for c in candidates if c[1].st_size >= budget]
+            for entry, st in large:
+                self._emit(entry, st)
+                self.flush()
+            batched = 0
+            for entry, st in candidates:
+                if st.st_size < budget:
+                    if batched + st.st_size > budget:
+                        self.flush()
+                        batched = 0
+                    self._emit(entry, st)
+                    batched += st.st_size
+            self.flush()
+        elif self.schedule == 'oldest_first':
+            candidates.sort(key=lambda c: c[1].st_mtime)
+            total = 0
+            for i, (entry, st) in enumerate(candidates):
+                # At least one file is emitted so that a file
+                # larger than the budget is not deferred forever.
+                if i and total + st.st_size > budget:
+                    return candidates[i:]
+                total += st.st_size
+                self._emit(entry, st)
+        else:
+            for entry, st in candidates:
+                self._emit(entry, st)
+        return []
+
+    def _processed(self, path, st):
+        if self._manifest is not None and st in self._manifest:
+            return True
+        return self._seen.get(path) == st.st_mtime
+
+    def _mark(self, path, st):
+        self._seen[path] = st.st_mtime
+        if self._manifest is not None:
+            self._manifest.add(st)
+
+    def _present(self):
+        """Identities of the files in the directory."""
+        present = set()
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return present
+        for entry in entries:
+            try:
+                if entry.is_file():
+                    present.add(_Manifest.identity(entry.stat()))
+            except FileNotFoundError:
+                continue
+        return present
+
+    def _emit(self, entry, st):
+        # The file is recorded as processed before it is moved,
+        # as a rename retains its identity.
+        self._mark(entry.path, st)
+        path = entry.path
+        if self.move_to:
+            path = os.path.join(self.move_to, entry.name)
+            shutil.move(entry.path, path)
+        self.submit(0, self._tuple(path))
+        if self._manifest is not None and self._manifest.needs_compaction:
+            self._manifest.compact(self._present())
+
+    def _watcher(self):
+        if not self.watch:
+            return None
+        try:
+            return _Inotify(self.directory)
+        except (OSError, AttributeError):
+            # Fall back to polling, for example on a platform without
+            # inotify or when the limit of watches is reached.
+            return None
+
+    def produce(self):
+        if self.init_delay and not self.sleep(float(self.init_delay)):
+            return
+        # The watch is started before the initial scan so that no file
+        # completed between the scan and the watch starting is missed.
+        watcher = self._watcher()
+        if self.manifest:
+            self._manifest = _Manifest(self.manifest)
+        try:
+            if self.ignore_existing:
+                for entry, st in self._candidates():
+                    self._mark(entry.path, st)
+            if watcher is None:
+                while not self.cancelled:
+                    # Deferred files are found again by the next scan.
+                    self._dispatch(self._candidates())
+                    if not self.sleep(self.sleep_time):
+                        return
+            else:
+                self._watch(watcher)
+        finally:
+            if watcher is not None:
+                watcher.close()
+            if self._manifest is not None:
+                self._manifest.close()
+
+    def _watch(self, watcher):
+        candidates = self._candidates()
+        while not self.cancelled:
+            deferred = self._dispatch(candidates)
+            self.flush()
+            names = watcher.read(0.2)
+            # Rescan when events were lost due to the queue overflowing.
+            if names is None:
+                candidates = self._candidates()
+            else:
+                pending = collections.OrderedDict((c[0].path, c) for c in deferred)
+                pending.update((c[0].path, c) for c in self._named(names))
+                candidates = list(pending.values())
+
+
+@_operator('spl.adapter::FileSource')
+class _FileSource(_Operator):
+    def __init__(self, job, op):
+        super(_FileSource, self).__init__(job, op)
+        self.format = self.param('format', 'csv')
+        if self.format not in ('csv', 'line', 'block'):
+            raise NotImplementedError('FileSource format ' + self.format)
+        self.compression = self.param('compression')
+        self.encoding = self.param('encoding') or 'utf-8'
+        self.separator = self.param('separator') or ','
+        self.header = _param_bool(op.params.get('hasHeaderLine'))
+        self.ignore_extra = _param_bool(op.params.get('ignoreExtraCSVValues'))
+        block_size = self.param('blockSize')
+        self.block_size = int(block_size) if block_size else None
+        self.file = None
+        file = op.params.get('file')
+        if file is not None:
+            self.file = self.param('file')
+            if getattr(file, '_type', None) == 'splexpr':
+                self.file = _compile(file, functions=_file_functions(job))(None)
+            self.file = _resolve(self.file, job.app_dir)
+        schema = self.outputs[0].schema
+        self._types = _attribute_types(schema)
+        assigns = dict(self.assignments())
+        self._file_name = [n for n, e in assigns.items() if str(e._value).strip() == 'FileName()']
+        self._names = [n for n in self._types if n not in self._file_name] if self._types is not None else None
+        self.batch_size = getattr(self.invoke, '_batch_size', None)
+        self.processes = getattr(self.invoke, '_processes', None)
+        self.preserve_order = getattr(self.invoke, '_preserve_order', True)
+        self.memory_map = getattr(self.invoke, '_memory_map', False)
+
+    def run(self):
+        if self.file is not None:
+            # Source with no input port
+            self._read(self.file)
+            if self.job._cancelled.is_set():
+                return
+            self.close()
+            self.outputs[0].punct(_FINAL)
+        else:
+            super(_FileSource, self).run()
+
+    def process(self, port, batch):
+        for t in batch:
+            if isinstance(t, dict):
+                t = next(iter(t.values()))
+            self._read(_resolve(t, self.job.app_dir))
+            self.outputs[0].punct()
+
+    def on_punct(self, port):
+        pass
+
+    def _read(self, path):
+        if self.processes and self.format == 'csv' and self.compression is None:
+            self._read_parallel(path)
+            return
+        if self.memory_map and self.format == 'block' and self.compression is None:
+            self._read_mapped(path)
+            return
+        with _open(path, 'rb', self.compression) as f:
+            if self.format == 'block':
+                self._read_blocks(path, f)
+            elif self.format == 'line':
+                self._read_lines(path, f)
+            else:
+                self._read_csv(path, f)
+
+    def _tuple(self, path, values):
+        t = dict(zip(self._names, values))
+        for n in self._file_name:
+            t[n] = path
+        return t
+
+    def _read_blocks(self, path, f):
+        name = self._names[0]
+        submit = self.outputs[0].submit
+        if self.block_size is None:
+            submit(self._tuple(path, [f.read()]))
+            return
+        while not self.job._cancelled.is_set():
+            block = f.read(self.block_size)
+            if not block:
+                break
+            submit(self._tuple(path, [block]))
+
+    def _read_mapped(self, path):
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                if self.block_size is None:
+                    self.outputs[0].submit(self._tuple(path, [b'']))
+                return
+            # The mapping is kept open by the blocks referencing it
+            # and released when the last one is released.
+            view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        submit = self.outputs[0].submit
+        if self.block_size is None:
+            submit(self._tuple(path, [view]))
+            return
+        size = self.block_size
+        for offset in range(0, len(view), size):
+            if self.job._cancelled.is_set():
+                break
+            submit(self._tuple(path, [view[offset:offset+size]]))
+
+    def _read_lines(self, path, f):
+        submit = self.outputs[0].submit
+        text = io.TextIOWrapper(f, encoding=self.encoding, newline='')
+        structured = self._types is not None
+        for line in text:
+            line = line.rstrip('\r\n')
+            submit(self._tuple(path, [line]) if structured else line)
+
+    def _read_csv(self, path, f):
+        text = io.TextIOWrapper(f, encoding=self.encoding, newline='')
+        reader = csv.reader(text, delimiter=self.separator, skipinitialspace=False)
+        if self.header:
+            next(reader, None)
+        if self.batch_size:
+            self._read_columns(path, reader)
+            return
+        names = self._names
+        parsers = [_parser(self._types[n]) for n in names]
+        n = len(names)
+        submit = self.outputs[0].submit
+        check = self.job.batch_size
+        for i, row in enumerate(reader):
+            if not row:
+                continue
+            if len(row) < n:
+                # As for batches of columns, which have no missing values.
+                raise ValueError('{}:{}: missing CSV values'.format(path, i + 1))
+            if len(row) > n:
+                if not self.ignore_extra:
+                    raise ValueError('{}:{}: extra CSV values'.format(path, i + 1))
+                row = row[:n]
+            t = {name: p(v) for name, p, v in zip(names, parsers, row)}
+            for fn in self._file_name:
+                t[fn] = path
+            submit(t)
+            if i % check == 0 and self.job._cancelled.is_set():
+                return
+
+    def _read_columns(self, path, reader):
+        names = self._names
+        columns = [_column(self._types[n]) for n in names]
+        submit = self.outputs[0].submit
+        while not self.job._cancelled.is_set():
+            rows = list(itertools.islice(reader, self.batch_size))
+            if not rows:
+                break
+            values = _transpose(rows, len(names), self.ignore_extra, path)
+            if values:
+                submit(self._batch(path, [column(v) for column, v in zip(columns, values)]))
+
+    def _batch(self, path, values):
+        t = dict(zip(self._names, values))
+        for fn in self._file_name:
+            t[fn] = path
+        return t
+
+    def _read_parallel(self, path):
+        """Read a CSV file by parsing ranges of it in a pool of processes."""
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+            try:
+                ranges = _ranges(mm, self.header, max(1 << 20, min(64 << 20, size // (8 * self.processes))))
+            finally:
+                if size:
+                    mm.close()
+        types = [self._types[n] for n in self._names]
+        tasks = [(path, start, end, self.encoding, self.separator, types, self.ignore_extra, self.batch_size) for start, end in ranges]
+        methods = multiprocessing.get_all_start_methods()
+        # Forking a process whose other threads hold locks is unsafe.
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        submit = self.outputs[0].submit
+        names = self._names
+        processes = min(self.processes, len(tasks) or 1)
+        with context.Pool(processes) as pool:
+            for batches in _bounded_map(pool, _parse_range, tasks, 2 * processes, self.preserve_order):
+                if self.job._cancelled.is_set():
+                    return
+                for values in batches:
+                    if self.batch_size:
+                        submit(self._batch(path, values))
+                        continue
+                    file_name = self._file_name
+                    for row in zip(*values):
+                        t = dict(zip(names, row))
+                        for fn in file_name:
+                            t[fn] = path
+                        submit(t)
+
+
+def _bounded_map(pool, fn, tasks, window, ordered=True):
+    """Yield `fn` of each of `tasks` executed by `pool`, with at most `window` outstanding.
+
+    A task is only submitted once the result of an earlier one has been
+    consumed, so the memory of parsed results is bounded when the
+    consumer falls behind. Results are yielded in the order of `tasks`
+    when `ordered`, otherwise as they complete.
+    """
+    tasks = iter(tasks)
+    pending = collections.deque(pool.apply_async(fn, (task,)) for task in itertools.islice(tasks, window))
+    while pending:
+        if ordered:
+            result = pending.popleft()
+        else:
+            result = next((r for r in pending if r.ready()), None)
+            if result is None:
+                pending[0].wait(0.01)
+                continue
+            pending.remove(result)
+        yield result.get()
+        for task in itertools.islice(tasks, 1):
+            pending.append(pool.apply_async(fn, (task,)))
+
+
+def _transpose(rows, n, ignore_extra, path):
+    """Columns of the text fields of CSV `rows` of `n` values, skipping empty rows."""
+    rows = [row for row in rows if row]
+    if not rows:
+        return None
+    widths = set(map(len, rows))
+    if min(widths) < n:
+        raise ValueError('{}: missing CSV values'.format(path))
+    if max(widths) > n:
+        if not ignore_extra:
+            raise ValueError('{}: extra CSV values'.format(path))
+        rows = [row[:n] for row in rows]
+    # Transposing rows to columns and converting each column as a
+    # whole avoids creating a tuple for each row, the CSV reader
+    # still creates a list of fields for each row.
+    return list(zip(*rows))
+
+
+def _ranges(mm, header, chunk):
+    """Byte ranges of about `chunk` bytes of the CSV data `mm`, each of whole records.
+
+    A range ends after a newline that is not within a quoted value, that is
+    one preceded by an even number of quotes, quotes within quoted
+    values being escaped by doubling them.
+    """
+    size = len(mm)
+    def _quotes(start, end):
+        # Counted in slices as mmap has no count method.
+        step = 1 << 24
+        return sum(mm[i:min(end, i + step)].count(b'"') for i in range(start, end, step))
+    def _boundary(position, quotes):
+        # Position after the first newline at or after `position`
+        # outside a quoted value, given the number of quotes before it.
+        while position < size:
+            newline = mm.find(b'\n', position)
+            if newline == -1:
+                break
+            quotes += _quotes(position, newline)
+            position = newline + 1
+            if quotes % 2 == 0:
+                return position, quotes
+        return size, quotes
+    start, quotes = _boundary(0, 0) if header else (0, 0)
+    ranges = []
+    while start < size:
+        target = min(size, start + chunk)
+        end, quotes = _boundary(target, quotes + _quotes(start, target))
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def _parse_range(task):
+    """Parse a range of a CSV file, executed in a pool process.
+
+    Returns a list of batches, each a list of columns.
+    """
+    path, start, end, encoding, separator, types, ignore_extra, batch_size = task
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    reader = csv.reader(io.StringIO(data.decode(encoding), newline=''), delimiter=separator)
+    if batch_size:
+        columns = [_column(t) for t in types]
+    else:
+        parsers = [_parser(t) for t in types]
+        columns = [lambda values, p=p: list(map(p, values)) for p in parsers]
+    batches = []
+    while True:
+        rows = list(itertools.islice(reader, batch_size or 65536))
+        if not rows:
+            break
+        values = _transpose(rows, len(types), ignore_extra, path)
+        if values:
+            batches.append([column(v) for column, v in zip(columns, values)])
+    return batches
+
+
+# Array type codes of SPL numeric types.
+_TYPECODES = {'int8': 'b', 'int16': 'h', 'int32': 'i', 'int64': 'q',
+              'uint8': 'B', 'uint16': 'H', 'uint32': 'I', 'uint64': 'Q',
+              'float32': 'f', 'float64': 'd'}
+
+def _column(type_):
+    """Function converting text fields to a column of values of the SPL type `type_`.
+
+    Numeric columns are NumPy arrays when NumPy is installed,
+    otherwise ``array.array``, columns of other types are lists.
+    """
+    code = _TYPECODES.get(type_)
+    if code is None:
+        parser = _parser(type_)
+        return lambda values: list(map(parser, values))
+    convert = float if code in 'fd' else int
+    if _numpy is None:
+        return lambda values: array.array(code, map(convert, values))
+    # The array is wrapped without copying.
+    return lambda values: _numpy.frombuffer(array.array(code, map(convert, values)), dtype=code)
+
+
+@_operator('spl.adapter::FileSink')
+class _FileSink(_Operator):
+    def __init__(self, job, op):
+        super(_FileSink, self).__init__(job, op)
+        self.schema = self.inputs[0]
+        self.format = self.param('format', 'csv')
+        if self.format not in ('csv', 'line', 'block', 'txt'):
+            raise NotImplementedError('FileSink format ' + self.format)
+        self.compression = self.param('compression')
+        self.compression_level = getattr(self.invoke, '_compression_level', None)
+        self.threads = getattr(self.invoke, '_compression_threads', None)
+        self._executor = None
+        if self.threads and self.compression is not None:
+            self._compress = _block_compressor(self.compression, self.compression_level)
+            self._executor = concurrent.futures.ThreadPoolExecutor(self.threads, thread_name_prefix=self.name)
+        self.encoding = self.param('encoding') or 'utf-8'
+        self.separator = self.param('separator') or ','
+        self.eol = (self.param('eolMarker') or '\n').encode('utf-8').decode('unicode_escape')
+        self.quote_strings = _param_bool(op.params.get('quoteStrings'), True)
+        self.append = _param_bool(op.params.get('append'))
+        flush = self.param('flush')
+        self.flush_count = int(flush) if flush else None
+        self.flush_on_punctuation = _param_bool(op.params.get('flushOnPunctuation'), True)
+        self.close_mode = self.param('closeMode', 'never')
+        self.tuples_per_file = self.param('tuplesPerFile')
+        self.bytes_per_file = self.param('bytesPerFile')
+        self.time_per_file = self.param('timePerFile')
+        self.move_to = self.param('moveFileToDirectory')
+        suppress = self.param('suppress')
+        suppressed = set(s.strip() for s in suppress.split(',')) if suppress else set()
+        names = _attribute_names(self.schema)
+        self.names = [n for n in names if n not in suppressed] if names is not None else None
+        self.types = _attribute_types(self.schema)
+        file = op.params.get('file')
+        if getattr(file, '_type', None) == 'splexpr':
+            self._file = _compile(file, functions=_file_functions(job))
+        else:
+            path = self.param('file')
+            self._file = lambda t: path
+        self._file_id = 0
+        self._name = None
+        self._f = None
+        # Open files of dynamic file names, least recently used first.
+        self._pool = None
+        max_open_files = getattr(self.invoke, '_max_open_files', None)
+        if self.close_mode == 'dynamic' and max_open_files:
+            self.max_open_files = max_open_files
+            self.idle_timeout = getattr(self.invoke, '_idle_timeout', None)
+            self._pool = collections.OrderedDict()
+            self._written = set()
+        self._tuples = 0
+        self._bytes = 0
+        self._unflushed = 0
+        if self.close_mode == 'time':
+            self.deadline = time.monotonic() + float(self.time_per_file)
+
+    def _file_name(self, t):
+        name = self._file(_as_dict(self.schema, t) if t is not None else None)
+        name = name.replace('{id}', str(self._file_id))
+        name = re.sub(r'\{localtime:([^}]*)\}', lambda m: time.strftime(m.group(1), time.localtime()), name)
+        name = re.sub(r'\{gmtime:([^}]*)\}', lambda m: time.strftime(m.group(1), time.gmtime()), name)
+        return _resolve(name, self.job.data_dir)
+
+    def _open(self, name):
+        self._name = name
+        self._f = self._create(name, 'ab' if self.append else 'wb')
+        self._tuples = 0
+        self._bytes = 0
+
+    def _create(self, name, mode):
+        if self._executor is not None:
+            return _ParallelWriter(open(name, mode), self._compress, self._executor, self.threads)
+        return _open(name, mode, self.compression, self.compression_level)
+
+    def _pooled(self, name, now):
+        """Open file of `name` from the pool, opening it if necessary."""
+        pool = self._pool
+        entry = pool.pop(name, None)
+        if entry is None:
+            if len(pool) >= self.max_open_files:
+                _, (f, _) = pool.popitem(last=False)
+                f.close()
+            # A file closed by the pool is appended to when it is reopened.
+            f = self._create(name, 'ab' if self.append or name in self._written else 'wb')
+            self._written.add(name)
+        else:
+            f = entry[0]
+        pool[name] = (f, now)
+        return f
+
+    def _close_pool(self):
+        while self._pool:
+            _, (f, _) = self._pool.popitem(last=False)
+            f.close()
+        if self.move_to:
+            for name in sorted(self._written):
+                shutil.move(name, os.path.join(self.move_to, os.path.basename(name)))
+        self._written.clear()
+
+    def _close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+            if self.move_to:
+                shutil.move(self._name, os.path.join(self.move_to, os.path.basename(self._name)))
+            self._file_id += 1
+
+    def _format_value(self, v, type_):
+        if isinstance(v, bool):
+            return 'true' if v else 'false'
+        if isinstance(v, str):
+            if self.quote_strings and type_ in ('rstring', 'ustring'):
+                return '"' + v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+            return v
+        if isinstance(v, float):
+            return repr(v)
+        return str(v)
+
+    def _encode(self, t):
+        if self.format == 'block':
+            if isinstance(t, dict):
+                t = t[self.names[0]]
+            return bytes(t)
+        if self.names is None:
+            line = t if isinstance(t, str) else str(t)
+            if self.format == 'csv' and self.schema is CommonSchema.String and self.quote_strings:
+                line = self._format_value(line, 'rstring')
+        elif self.format == 'line':
+            line = str(t[self.names[0]])
+        elif self.format == 'txt':
+            line = '{' + ','.join('{}={}'.format(n, self._format_value(t[n], 'rstring' if isinstance(t[n], str) else None)) for n in self.names) + '}'
+        else:
+            line = self.separator.join(self._format_value(t[n], self.types[n]) for n in self.names)
+        return (line + self.eol).encode(self.encoding)
+
+    def _process_pooled(self, batch):
+        now = time.monotonic()
+        for t in batch:
+            self._pooled(self._file_name(t), now).write(self._encode(t))
+            if self.flush_count:
+                self._unflushed += 1
+                if self._unflushed >= self.flush_count:
+                    self._flush_pool()
+                    self._unflushed = 0
+        if self.idle_timeout and self.deadline is None:
+            self.deadline = now + self.idle_timeout
+
+    def _flush_pool(self):
+        for f, _ in self._pool.values():
+            f.flush()
+
+    def process(self, port, batch):
+        if self._pool is not None:
+            self._process_pooled(batch)
+            return
+        dynamic = self.close_mode == 'dynamic'
+        for t in batch:
+            if dynamic:
+                name = self._file_name(t)
+                if name != self._name:
+                    self._close()
+                    self._open(name)
+            elif self._f is None:
+                self._open(self._file_name(t))
+            data = self._encode(t)
+            self._f.write(data)
+            self._tuples += 1
+            self._bytes += len(data)
+            if self.flush_count:
+                self._unflushed += 1
+                if self._unflushed >= self.flush_count:
+                    self._f.flush()
+                    self._unflushed = 0
+            if self.close_mode == 'count' and self._tuples >= int(self.tuples_per_file):
+                self._close()
+            elif self.close_mode == 'size' and self._bytes >= int(self.bytes_per_file):
+                self._close()
+
+    def on_punct(self, port):
+        if self.close_mode == 'punct':
+            self._close()
+        elif self.flush_on_punctuation and self._f is not None:
+            self._f.flush()
+        elif self.flush_on_punctuation and self._pool:
+            self._flush_pool()
+
+    def on_timer(self, now):
+        if self._pool is not None:
+            # Close files idle for the timeout, the least recently used are first.
+            pool = self._pool
+            while pool:
+                name, (f, used) = next(iter(pool.items()))
+                if used + self.idle_timeout > now:
+                    self.deadline = used + self.idle_timeout
+                    break
+                del pool[name]
+                f.close()
+            return
+        self._close()
+        self.deadline = now + float(self.time_per_file)
+
+    def close(self):
+        self._close()
+        if self._pool is not None:
+            self._close_pool()
+        if self._executor is not None:
+            self._executor.shutdown()
+
@@ -0,0 +1,414 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+"""
+Local implementations of the operators used by :py:mod:`streamsx.standard.relational`.
+"""
+
+import bisect
+import collections
+import functools
+import math
+import re
+import time
+
+import streamsx.standard._aggregates as _aggregates
+from streamsx.standard._engine import _operator, _Operator, _WindowSpec
+from streamsx.standard._engine import _attribute_names, _compile, _compile_assignments, _param_names
+
+_OUTPUT_FUNCTION = re.compile(r'^\s*(\w+)\s*\(\s*([^()]*?)\s*\)\s*$')
+
+
+@_operator('spl.relational::Filter')
+class _Filter(_Operator):
+    def __init__(self, job, op):
+        super(_Filter, self).__init__(job, op)
+        f = op.params.get('filter')
+        self._filter = _compile(f) if f is not None else lambda t: True
+
+    def process(self, port, batch):
+        f = self._filter
+        matches = []
+        non_matches = []
+        for t in batch:
+            (matches if f(t) else non_matches).append(t)
+        if matches:
+            self.outputs[0].submit_batch(matches)
+        if non_matches and len(self.outputs) > 1:
+            self.outputs[1].submit_batch(non_matches)
+
+
+@_operator('spl.relational::Functor')
+class _Functor(_Operator):
+    def __init__(self, job, op):
+        super(_Functor, self).__init__(job, op)
+        f = op.params.get('filter')
+        self._filter = _compile(f) if f is not None else None
+        self._maps = []
+        for oport in self.outputs:
+            names = _attribute_names(oport.schema)
+            self._maps.append(_compile_assignments(names, dict(self.assignments(oport.index))))
+
+    def process(self, port, batch):
+        if self._filter is not None:
+            f = self._filter
+            batch = [t for t in batch if f(t)]
+        for oport, m in zip(self.outputs, self._maps):
+            oport.submit_batch([m(t) for t in batch])
+
+
+_WINDOW_FUNCTIONS = {
+    'intervalStart': lambda: None,
+    'intervalEnd': lambda: None,
+    'paneTiming': lambda: 'paneOnComplete',
+}
+
+
+@_operator('spl.relational::Aggregate')
+def _aggregate(job, op):
+    if getattr(getattr(op, '_ex_op', None), '_windows', None):
+        return _PanedAggregate(job, op)
+    return _Aggregate(job, op)
+
+
+class _Aggregate(_Operator):
+    """Aggregation maintained incrementally as tuples are inserted into and evicted from the window."""
+    def __init__(self, job, op):
+        super(_Aggregate, self).__init__(job, op)
+        self.window = _WindowSpec(op.inputPorts[0].window_config)
+        group_by = _param_names(op.params.get('groupBy'))
+        self._group = (lambda t: tuple(t[g] for g in group_by)) if group_by else lambda t: None
+        self.partition_by = self.window.partition_by
+        names = _attribute_names(self.outputs[0].schema)
+        self._names = []
+        self._functions = []
+        plain = {}
+        for name, e in self.assignments():
+            fn = _output_function(e)
+            if fn is not None:
+                self._names.append(name)
+                self._functions.append(fn)
+            else:
+                plain[name] = e
+        # Expressions that are not aggregations are evaluated
+        # against the last tuple of the group.
+        self._plain = _compile_assignments([n for n in names if n not in self._names], plain, functions=_WINDOW_FUNCTIONS)
+        self._partitions = collections.OrderedDict()
+        self._triggers = collections.Counter()
+        if self.window.trigger_policy == 'TIME' or (self.window.tumbling and self.window.evict_policy == 'TIME'):
+            self._period = self.window.trigger if self.window.trigger_policy == 'TIME' else self.window.evict
+            self.deadline = time.monotonic() + self._period
+
+    def _partition(self, t):
+        key = t[self.partition_by] if self.partition_by else None
+        part = self._partitions.get(key)
+        if part is None:
+            part = self._partitions[key] = _aggregates._Partition(self._functions, self._group, retain=not self.window.tumbling)
+        return key, part
+
+    def process(self, port, batch):
+        w = self.window
+        for t in batch:
+            key, part = self._partition(t)
+            if w.tumbling:
+                part.insert(t)
+                if w.evict_policy == 'COUNT' and len(part) >= w.evict:
+                    self._aggregate(part)
+                    part.clear()
+                continue
+            now = time.monotonic()
+            if w.evict_policy == 'COUNT':
+                while len(part) >= w.evict and part:
+                    part.evict()
+            else:
+                part.evict_before(now - w.evict)
+            part.insert(t, now)
+            if w.trigger_policy == 'COUNT':
+                self._triggers[key] += 1
+                if self._triggers[key] >= w.trigger:
+                    self._triggers[key] = 0
+                    self._aggregate(part)
+
+    def on_timer(self, now):
+        self.deadline = now + self._period
+        for part in self._partitions.values():
+            if not self.window.tumbling and self.window.time_based:
+                part.evict_before(now - self.window.evict)
+            if part:
+                self._aggregate(part)
+            if self.window.tumbling:
+                part.clear()
+
+    def on_punct(self, port):
+        if self.window.tumbling and self.window.evict_policy == 'PUNCTUATION':
+            for part in self._partitions.values():
+                if part:
+                    self._aggregate(part)
+                part.clear()
+
+    def _aggregate(self, part):
+        submit = self.outputs[0].submit
+        names = self._names
+        for last, values in part.results():
+            out = self._plain(last)
+            out.update(zip(names, values))
+            submit(out)
+        self.punct()
+
+class _PanedAggregate(_Aggregate):
+    """Aggregation of multiple sliding time windows sharing pre-aggregated panes.
+
+    The pane duration is the greatest common divisor of the window
+    sizes and the trigger period, each partition retains the panes
+    of the largest window.
+    """
+    def __init__(self, job, op):
+        super(_PanedAggregate, self).__init__(job, op)
+        windows = self.invoke._windows
+        self._attribute = self.invoke._window_attribute
+        millis = [int(round(w * 1000)) for w in windows.values()]
+        every = int(round(self.window.trigger * 1000))
+        pane = functools.reduce(math.gcd, millis, every)
+        self._labels = list(windows.keys())
+        self._sizes = [m // pane for m in millis]
+        self._every = every // pane
+        self._ticks = 0
+        self._period = pane / 1000.0
+        self._next = time.monotonic() + self._period
+        self.deadline = self._next
+
+    def _partition(self, t):
+        key = t[self.partition_by] if self.partition_by else None
+        part = self._partitions.get(key)
+        if part is None:
+            part = self._partitions[key] = _aggregates._Panes(self._functions, self._group, max(self._sizes))
+        return key, part
+
+    def process(self, port, batch):
+        for t in batch:
+            self._partition(t)[1].insert(t)
+
+    def on_timer(self, now):
+        self._next += self._period
+        self.deadline = self._next
+        self._ticks += 1
+        if self._ticks % self._every == 0:
+            for part in self._partitions.values():
+                if part:
+                    self._aggregate(part)
+        for key in list(self._partitions):
+            part = self._partitions[key]
+            part.rotate()
+            if not part:
+                del self._partitions[key]
+
+    def _aggregate(self, part):
+        submit = self.outputs[0].submit
+        names = self._names
+        attribute = self._attribute
+        for label, results in zip(self._labels, part.results(self._sizes)):
+            for last, values in results:
+                out = self._plain(last)
+                out.update(zip(names, values))
+                out[attribute] = label
+                submit(out)
+            self.punct()
+
+
+def _output_function(e):
+    """Aggregation function for an output assignment expression, `None` if it is not an aggregation."""
+    if e._type != 'splexpr':
+        return None
+    m = _OUTPUT_FUNCTION.match(str(e._value))
+    if m is None:
+        return None
+    # Additional arguments, such as the percentile, are numeric literals.
+    args = m.group(2).split(',')
+    value = _compile(args[0]) if args[0] else None
+    return _aggregates._function(m.group(1), value, tuple(float(a) for a in args[1:]))
+
+
+class _HashIndex(object):
+    """Tuples of a join window keyed by the equality attributes.
+
+    Each key maps to the tuples with that key in insertion order.
+    """
+    def __init__(self, key):
+        self.key = key
+        self.buckets = {}
+
+    def add(self, id, t):
+        key = self.key(t)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = {}
+        bucket[id] = t
+        return key
+
+    def remove(self, id, key):
+        bucket = self.buckets[key]
+        del bucket[id]
+        if not bucket:
+            del self.buckets[key]
+
+    def matches(self, key):
+        bucket = self.buckets.get(key)
+        return bucket.values() if bucket else ()
+
+
+class _SortedIndex(object):
+    """Tuples of a join window sorted by the band attribute.
+
+    Removed tuples are discarded from the sorted keys lazily, the keys
+    are compacted once more than half of them have been removed.
+    Keys of an increasing attribute, such as a timestamp, are appended.
+    """
+    def __init__(self, key):
+        self.key = key
+        self.keys = []
+        self.tuples = {}
+
+    def add(self, id, t):
+        key = self.key(t)
+        self.tuples[id] = t
+        entry = (key, id)
+        if not self.keys or entry > self.keys[-1]:
+            self.keys.append(entry)
+        else:
+            bisect.insort(self.keys, entry)
+        return key
+
+    def remove(self, id, key):
+        del self.tuples[id]
+        if len(self.keys) > 2 * len(self.tuples) + 32:
+            self.keys = [e for e in self.keys if e[1] in self.tuples]
+
+    def matches(self, low, high):
+        """Tuples with a key between `low` and `high` inclusive."""
+        keys = self.keys
+        tuples = self.tuples
+        for i in range(bisect.bisect_left(keys, (low,)), len(keys)):
+            key, id = keys[i]
+            if key > high:
+                break
+            t = tuples.get(id)
+            if t is not None:
+                yield t
+
+
+class _JoinWindow(object):
+    """Window of a join input port with an index of its tuples.
+
+    A tuple on the opposite port is matched against the tuples
+    found by the index, rather than every tuple in the window.
+    Tuples are removed from the index as they are evicted, per partition
+    for a count based window and across all partitions for a time based one.
+    """
+    def __init__(self, spec, partition, index):
+        self.spec = spec
+        self.partition = partition
+        self.index = index
+        self.partitions = {}
+        self.times = collections.deque()
+        self._id = 0
+
+    def insert(self, t, now):
+        spec = self.spec
+        if spec.evict_policy == 'COUNT':
+            if spec.evict == 0:
+                return
+            pkey = self.partition(t)
+            part = self.partitions.get(pkey)
+            if part is None:
+                part = self.partitions[pkey] = collections.deque()
+            while len(part) >= spec.evict:
+                self.index.remove(*part.popleft())
+        self._id += 1
+        key = self.index.add(self._id, t)
+        if spec.evict_policy == 'COUNT':
+            part.append((self._id, key))
+        else:
+            self.times.append((now, self._id, key))
+
+    def evict(self, now):
+        if self.spec.time_based:
+            times = self.times
+            limit = now - self.spec.evict
+            while times and times[0][0] <= limit:
+                _, id, key = times.popleft()
+                self.index.remove(id, key)
+
+
+@_operator('spl.relational::Join')
+class _Join(_Operator):
+    """Join where each tuple is matched against the tuples found by the index of the opposite window.
+
+    The index is a hash index of the equality attributes, or for a band
+    join an index sorted by the band attribute, otherwise all tuples.
+    """
+    def __init__(self, job, op):
+        super(_Join, self).__init__(job, op)
+        specs = [_WindowSpec(ip.window_config) for ip in op.inputPorts]
+        for w in specs:
+            if w.tumbling:
+                raise NotImplementedError('Join with tumbling windows')
+        aliases = {ip._alias: ip.index for ip in op.inputPorts}
+        match = op.params.get('match')
+        band = getattr(self.invoke, '_band', None)
+        if band is not None:
+            left, right, lower, upper, match = band
+            keys = (_side(left, 0, aliases), _side(right, 1, aliases))
+            indexes = [_SortedIndex(keys[0]), _SortedIndex(keys[1])]
+            # Right values within [left + lower, left + upper] of a left value and vice versa.
+            self._probes = (lambda t: (keys[0](t) + lower, keys[0](t) + upper),
+                            lambda t: (keys[1](t) - upper, keys[1](t) - lower))
+        else:
+            lhs = op.params.get('equalityLHS')
+            rhs = op.params.get('equalityRHS')
+            if lhs is not None and rhs is not None:
+                keys = (_side(lhs, 0, aliases), _side(rhs, 1, aliases))
+            else:
+                keys = (lambda t: None, lambda t: None)
+            indexes = [_HashIndex(keys[0]), _HashIndex(keys[1])]
+            self._probes = (lambda t: (keys[0](t),), lambda t: (keys[1](t),))
+        partition = [lambda t: None, lambda t: None]
+        if op.params.get('partitionByLHS') is not None:
+            partition[0] = _side(op.params.get('partitionByLHS'), 0, aliases)
+        if op.params.get('partitionByRHS') is not None:
+            partition[1] = _side(op.params.get('partitionByRHS'), 1, aliases)
+        self.windows = [_JoinWindow(specs[i], partition[i], indexes[i]) for i in range(2)]
+        self._match = _compile(match, ports=aliases) if match is not None else None
+        ports = {ip._alias: (ip.index, _attribute_names(ip.schema)) for ip in op.inputPorts}
+        names = _attribute_names(self.outputs[0].schema)
+        self._output = _compile_assignments(names, dict(self.assignments()), ports=ports)
+
+    def process(self, port, batch):
+        window = self.windows[port]
+        other = self.windows[1 - port]
+        probe = self._probes[port]
+        submit = self.outputs[0].submit
+        output = self._output
+        match = self._match
+        for t in batch:
+            now = time.monotonic()
+            other.evict(now)
+            for o in other.index.matches(*probe(t)):
+                lhs, rhs = (t, o) if port == 0 else (o, t)
+                if match is not None and not match(lhs, rhs):
+                    continue
+                submit(output(lhs, rhs))
+            window.evict(now)
+            window.insert(t, now)
+
+    def on_punct(self, port):
+        pass
+
+def _side(expression, port, aliases):
+    """Compile an expression, or list of expressions, that only references attributes of input `port`."""
+    if isinstance(expression, (list, tuple)):
+        fns = [_side(e, port, aliases) for e in expression]
+        return lambda t: tuple(fn(t) for fn in fns)
+    fn = _compile(expression, ports=aliases)
+    if port == 0:
+        return lambda t: fn(t, None)
+    return lambda t: fn(None, t)
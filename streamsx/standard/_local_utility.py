@@ -0,0 +1,804 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+"""
+Local implementations of Python functional operators and the
+operators used by :py:mod:`streamsx.standard.utility`.
+"""
+
+import collections
+import multiprocessing
+import pickle
+import time
+
+import streamsx.standard._rings as _rings
+
+from streamsx.standard._engine import _operator, _Operator, _SourceOperator, _WINDOW, _Cancelled
+from streamsx.standard._engine import _attribute_names, _attribute_types, _default_value, _compile, _compile_assignments, _hash_code
+
+_PY = 'com.ibm.streamsx.topology.functional.python::'
+
+
+class _Functional(_Operator):
+    """Python callable declared by ``Stream.map``, ``Stream.for_each`` etc."""
+    def __init__(self, job, op):
+        super(_Functional, self).__init__(job, op)
+        self.function = op.function
+        self._entered = False
+        if self.inputs:
+            self.argument = _argument(self.inputs[0], op.params.get('pyStyle'))
+
+    def start(self):
+        # Wrappers created by streamsx itself require the Streams runtime
+        if type(self.function).__module__.startswith('streamsx.'):
+            return
+        if hasattr(self.function, '__enter__') and hasattr(self.function, '__exit__'):
+            self.function.__enter__()
+            self._entered = True
+
+    def close(self):
+        if self._entered:
+            self.function.__exit__(None, None, None)
+
+def _argument(schema, style):
+    """Function converting a local tuple to the argument passed to a Python callable."""
+    names = _attribute_names(schema)
+    if names is not None and style == 'tuple':
+        return lambda t: tuple(t[n] for n in names)
+    return None
+
+
+@_operator(_PY + 'Source')
+class _PySource(_Functional, _SourceOperator):
+    def produce(self):
+        iterable = self.function()
+        if iterable is None:
+            return
+        submit = self.outputs[0].submit
+        convert = self.outputs[0].convert
+        check = self.job.batch_size
+        n = 0
+        for v in iterable:
+            if v is not None:
+                submit(convert(v))
+            n += 1
+            if n == check:
+                n = 0
+                if self.cancelled:
+                    return
+
+
+@_operator(_PY + 'Map')
+def _py_map(job, op):
+    if getattr(op, '_local_processes', None):
+        return _ProcessMap(job, op)
+    return _PyMap(job, op)
+
+class _PyMap(_Functional):
+    def process(self, port, batch):
+        fn = self.function
+        arg = self.argument
+        convert = self.outputs[0].convert
+        out = []
+        append = out.append
+        if arg is None:
+            for t in batch:
+                r = fn(t)
+                if r is not None:
+                    append(convert(r))
+        else:
+            for t in batch:
+                r = fn(arg(t))
+                if r is not None:
+                    append(convert(r))
+        if out:
+            self.outputs[0].submit_batch(out)
+
+
+class _ProcessMap(_Functional):
+    """Python callable applied by a pool of worker processes.
+
+    Each input batch is split into a chunk for each worker, chunks are
+    passed to the workers in turn through shared memory rings and the
+    results are collected from the workers in the same turn, so tuples
+    are submitted in the order they arrived. Up to two chunks for each
+    worker are in progress while input is queued.
+    """
+    def __init__(self, job, op):
+        super(_ProcessMap, self).__init__(job, op)
+        self.processes = op._local_processes
+        self._workers = []
+        self._pending = collections.deque()
+        self._next = 0
+        self._stop = None
+
+    def start(self):
+        try:
+            function = pickle.dumps(self.function)
+        except (pickle.PicklingError, AttributeError, TypeError) as e:
+            raise TypeError('Callable of a process map must be picklable, for example a module level function: ' + str(e))
+        methods = multiprocessing.get_all_start_methods()
+        # Forking a process whose other threads hold locks is unsafe.
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        self._stop = context.Event()
+        for _ in range(self.processes):
+            requests = _rings._Ring(context)
+            responses = _rings._Ring(context)
+            process = context.Process(target=_map_worker, args=(function, requests, responses, self._stop), daemon=True)
+            process.start()
+            self._workers.append((process, requests, responses))
+
+    def process(self, port, batch):
+        arg = self.argument
+        if arg is not None:
+            batch = [arg(t) for t in batch]
+        size = -(-len(batch) // self.processes)
+        for i in range(0, len(batch), size):
+            self._send(batch[i:i+size])
+
+    def _send(self, chunk):
+        data = pickle.dumps(chunk, pickle.HIGHEST_PROTOCOL)
+        worker = self._workers[self._next]
+        if len(data) + 8 > worker[1].capacity and len(chunk) > 1:
+            half = len(chunk) // 2
+            self._send(chunk[:half])
+            self._send(chunk[half:])
+            return
+        self._next = (self._next + 1) % len(self._workers)
+        if worker[1].put(data, self.job._cancelled.is_set):
+            self._pending.append(worker)
+        # Chunks split to fit the ring count as chunks of their own.
+        while len(self._pending) > 2 * self.processes:
+            self._receive()
+
+    def _receive(self):
+        process, _, responses = self._pending.popleft()
+        while True:
+            data = responses.get(timeout=0.1)
+            if data is not None:
+                break
+            if self.job._cancelled.is_set():
+                raise _Cancelled()
+            if not process.is_alive():
+                raise RuntimeError('Process map worker exited with code ' + str(process.exitcode))
+        ok, result = pickle.loads(data)
+        if not ok:
+            raise result
+        if result:
+            convert = self.outputs[0].convert
+            self.outputs[0].submit_batch([convert(r) for r in result])
+
+    def flush(self):
+        while self._pending:
+            self._receive()
+        super(_ProcessMap, self).flush()
+
+    def on_punct(self, port):
+        self.flush()
+        super(_ProcessMap, self).on_punct(port)
+
+    def run(self):
+        try:
+            super(_ProcessMap, self).run()
+        finally:
+            # Also when the job is cancelled, which does not close operators.
+            self._stop_workers()
+
+    def close(self):
+        try:
+            if not self.job._cancelled.is_set():
+                self.flush()
+        finally:
+            self._stop_workers()
+
+    def _stop_workers(self):
+        workers, self._workers = self._workers, []
+        if not workers:
+            return
+        try:
+            self._stop.set()
+            for process, _, _ in workers:
+                process.join(1.0)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+        finally:
+            for _, requests, responses in workers:
+                requests.close()
+                responses.close()
+
+def _map_worker(function, requests, responses, stop):
+    """Main function of a process map worker process, exiting once `stop` is set."""
+    function = pickle.loads(function)
+    entered = hasattr(function, '__enter__') and hasattr(function, '__exit__')
+    if entered:
+        function.__enter__()
+    try:
+        while not stop.is_set():
+            data = requests.get(timeout=0.1)
+            if data is None:
+                continue
+            try:
+                result = (True, [r for r in map(function, pickle.loads(data)) if r is not None])
+                out = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+                if len(out) + 8 > responses.capacity:
+                    raise ValueError('Results of {} bytes exceed ring capacity'.format(len(out)))
+            except Exception as e:
+                try:
+                    out = pickle.dumps((False, e))
+                except Exception:
+                    out = pickle.dumps((False, RuntimeError(repr(e))))
+            if not responses.put(out, stop.is_set):
+                break
+    finally:
+        if entered:
+            function.__exit__(None, None, None)
+        requests.close()
+        responses.close()
+
+
+@_operator(_PY + 'FlatMap')
+class _PyFlatMap(_Functional):
+    def process(self, port, batch):
+        fn = self.function
+        arg = self.argument
+        convert = self.outputs[0].convert
+        out = []
+        append = out.append
+        for t in batch:
+            rs = fn(t if arg is None else arg(t))
+            if rs is not None:
+                for r in rs:
+                    if r is not None:
+                        append(convert(r))
+        if out:
+            self.outputs[0].submit_batch(out)
+
+
+@_operator(_PY + 'Filter')
+class _PyFilter(_Functional):
+    def process(self, port, batch):
+        fn = self.function
+        arg = self.argument
+        if arg is None:
+            out = [t for t in batch if fn(t)]
+        else:
+            out = [t for t in batch if fn(arg(t))]
+        if out:
+            self.outputs[0].submit_batch(out)
+
+
+@_operator(_PY + 'ForEach')
+class _PyForEach(_Functional):
+    def process(self, port, batch):
+        fn = self.function
+        arg = self.argument
+        if arg is None:
+            for t in batch:
+                fn(t)
+        else:
+            for t in batch:
+                fn(arg(t))
+
+
+@_operator('$Marker$')
+class _PassThrough(_Operator):
+    """Virtual markers such as isolation or low latency regions."""
+    def process(self, port, batch):
+        for oport in self.outputs:
+            oport.submit_batch(batch)
+
+
+@_operator('$Union$', 'spl.utility::Union')
+class _Union(_Operator):
+    def __init__(self, job, op):
+        super(_Union, self).__init__(job, op)
+        names = _attribute_names(self.outputs[0].schema)
+        self._project = None
+        if op.kind == 'spl.utility::Union' and names is not None:
+            self._project = lambda t: {n: t[n] for n in names}
+
+    def process(self, port, batch):
+        if self._project is not None:
+            batch = [self._project(t) for t in batch]
+        self.outputs[0].submit_batch(batch)
+
+
+@_operator('spl.utility::Beacon')
+class _Beacon(_SourceOperator):
+    def __init__(self, job, op):
+        super(_Beacon, self).__init__(job, op)
+        self._iteration = 0
+        types = _attribute_types(self.outputs[0].schema)
+        self._defaults = {n: _default_value(t) for n, t in types.items()}
+        assigns = dict(self.assignments())
+        self._tuple = _compile_assignments(list(types), assigns,
+            functions={'IterationCount': lambda: self._iteration})
+
+    def produce(self):
+        period = self.param('period')
+        iterations = self.param('iterations')
+        delay = self.param('initDelay')
+        if delay and not self.sleep(float(delay)):
+            return
+        make = self._tuple
+        defaults = self._defaults
+        submit = self.outputs[0].submit
+        check = self.job.batch_size
+        i = 0
+        next_time = time.monotonic()
+        while iterations is None or i < int(iterations):
+            self._iteration = i
+            submit(make(defaults))
+            i += 1
+            if period:
+                next_time += float(period)
+                wait = next_time - time.monotonic()
+                if wait > 0 and not self.sleep(wait):
+                    return
+            elif i % check == 0 and self.cancelled:
+                return
+
+
+class _Spray(_Operator):
+    """Base class of spray operators.
+
+    When the spray has a batch size tuples are handed off to the outputs
+    in micro-batches of that size, a partial micro-batch is handed off
+    after the maximum linger time or, without one, when no more input
+    is queued.
+    """
+    def __init__(self, job, op):
+        super(_Spray, self).__init__(job, op)
+        self.batch_size = getattr(self.invoke, '_batch_size', None)
+        self.linger = getattr(self.invoke, '_linger', None)
+        self._pending = [[] for _ in self.outputs]
+
+    def _hand_off(self, i, batch):
+        """Hand off `batch` to output `i`."""
+        oport = self.outputs[i]
+        oport.submit_batch(batch)
+        oport.flush()
+
+    def _add(self, i, tuples):
+        pending = self._pending[i]
+        pending.extend(tuples)
+        size = self.batch_size
+        if len(pending) >= size:
+            n = len(pending) - len(pending) % size
+            for j in range(0, n, size):
+                self._hand_off(i, pending[j:j+size])
+            del pending[:n]
+        if pending and self.linger is not None and self.deadline is None:
+            self.deadline = time.monotonic() + self.linger
+
+    def _drain(self):
+        for i, pending in enumerate(self._pending):
+            if pending:
+                self._hand_off(i, pending)
+                self._pending[i] = []
+
+    def flush(self):
+        if self.linger is None:
+            self._drain()
+        super(_Spray, self).flush()
+
+    def on_timer(self, now):
+        self._drain()
+
+    def on_punct(self, port):
+        self._drain()
+        super(_Spray, self).on_punct(port)
+
+    def close(self):
+        self._drain()
+
+
+@_operator('spl.utility::ThreadedSplit')
+class _ThreadedSplit(_Spray):
+    """Each output stream has its own operator thread downstream, batches
+    are handed to the output with the least work queued or being processed,
+    ties are broken round-robin."""
+    def __init__(self, job, op):
+        super(_ThreadedSplit, self).__init__(job, op)
+        self._next = 0
+
+    def process(self, port, batch):
+        if self.batch_size:
+            self._add(0, batch)
+        else:
+            self._hand_off(0, batch)
+
+    def _hand_off(self, i, batch):
+        # All batches are added to output 0 and handed off
+        # to the chosen output.
+        outputs = self.outputs
+        n = len(outputs)
+        order = [(self._next + j) % n for j in range(n)]
+        i = min(order, key=lambda j: _unfinished(outputs[j]))
+        self._next = (i + 1) % n
+        super(_ThreadedSplit, self)._hand_off(i, batch)
+
+def _unfinished(oport):
+    return sum(inbox.unfinished for inbox, _ in oport.targets)
+
+
+@_operator('spl.utility::Split')
+class _Split(_Spray):
+    """Tuples are submitted to the output given by the index modulo the
+    number of outputs, tuples with a negative index are dropped."""
+    def __init__(self, job, op):
+        super(_Split, self).__init__(job, op)
+        key = getattr(self.invoke, '_key', None)
+        if key is not None:
+            # Index of a keyed spray, hashing the attribute directly
+            # rather than evaluating the index expression.
+            self.index = lambda t: _hash_code(t[key])
+        else:
+            self.index = _compile(op.params['index'])
+
+    def process(self, port, batch):
+        n = len(self.outputs)
+        index = self.index
+        batches = [[] for _ in range(n)]
+        for t in batch:
+            i = index(t)
+            if i >= 0:
+                batches[i % n].append(t)
+        for i, b in enumerate(batches):
+            if not b:
+                continue
+            if self.batch_size:
+                self._add(i, b)
+            else:
+                self._hand_off(i, b)
+
+
+@_operator('spl.utility::Throttle')
+def _throttle(job, op):
+    if len(op.inputPorts) > 1:
+        return _ControlledThrottle(job, op)
+    return _Throttle(job, op)
+
+class _Pacer(object):
+    """Hybrid sleep-then-spin wait for a deadline.
+
+    Sleeping wakes up late by a varying amount, so a wait sleeps
+    until the expected lateness before the deadline and spins for
+    the remainder. Spinning is limited to `budget`, a fraction of
+    the elapsed time, once it is spent waits only sleep.
+    """
+    def __init__(self, cancelled, budget):
+        self.cancelled = cancelled
+        self.budget = budget
+        self.lateness = 0.0
+        self.spun = 0.0
+        self.start = time.monotonic()
+
+    def wait(self, deadline):
+        """Wait until `deadline`, returns the current time."""
+        now = time.monotonic()
+        sleep = deadline - now - self.lateness
+        if sleep > 0:
+            self.cancelled.wait(sleep)
+            woke = time.monotonic()
+            self.lateness += 0.1 * (woke - now - sleep - self.lateness)
+            now = woke
+        if now >= deadline:
+            return now
+        if self.spun < self.budget * (now - self.start):
+            spin = now
+            while now < deadline and not self.cancelled.is_set():
+                now = time.monotonic()
+            self.spun += now - spin
+            return now
+        self.cancelled.wait(deadline - now)
+        return time.monotonic()
+
+
+class _Throttle(_Operator):
+    def __init__(self, job, op):
+        super(_Throttle, self).__init__(job, op)
+        self.rate = float(self.param('rate'))
+        self.interval = 1.0 / self.rate
+        period = self.param('period')
+        self.period = float(period) if period is not None else 10.0 / self.rate
+        self.include_punctuations = self.param('includePunctuations', False) is True
+        self._next = None
+        self._pacer = None
+        if self.param('precise', False) is True:
+            time_slice = getattr(self.invoke, '_time_slice', None) or 0.001
+            budget = getattr(self.invoke, '_cpu_budget', None)
+            self._pacer = _Pacer(job._cancelled, 0.1 if budget is None else budget)
+            self.period = 0.0
+            self._slice = max(1, int(round(time_slice * self.rate)))
+            self._released = 0
+
+    def _pace(self):
+        if self._pacer is not None:
+            return self._pace_slice()
+        now = time.monotonic()
+        if self._next is None:
+            # The bucket starts full.
+            self._next = self._full(now)
+        elif now < self._next:
+            self.flush()
+            self.job._cancelled.wait(self._next - now)
+            now = time.monotonic()
+        self._next = max(self._next, self._full(now)) + self.interval
+
+    def _full(self, now):
+        """Release time of the next tuple when the bucket is full.
+
+        A full bucket holds the tuples of a period, which pass
+        without delay.
+        """
+        return now - max(0.0, self.period - self.interval)
+
+    def _pace_slice(self):
+        if self._released:
+            self._released -= 1
+            return
+        # Slices are scheduled from the previous one, rather than
+        # from when the wait returned, so waking late is made up
+        # by the next slice. Falling further behind, up to a slice
+        # is made up.
+        now = time.monotonic()
+        period = self._slice * self.interval
+        if self._next is None:
+            self._next = now
+        elif now < self._next:
+            self.flush()
+            self._pacer.wait(self._next)
+        else:
+            self._next = max(self._next, now - period)
+        self._next += period
+        self._released = self._slice - 1
+
+    def process(self, port, batch):
+        submit = self.outputs[0].submit
+        for t in batch:
+            self._pace()
+            submit(t)
+
+    def on_punct(self, port):
+        if self.include_punctuations:
+            self._pace()
+        self.punct()
+
+class _ControlledThrottle(_Throttle):
+    """Throttle whose rate is set by tuples on its control port.
+
+    Tuples are queued and released by the timer, rather than
+    pacing the processing thread, so that the control port is
+    read while tuples are held back. Upstream is only blocked
+    while the queue is full.
+    """
+    final_ports = [0]
+
+    def __init__(self, job, op):
+        super(_ControlledThrottle, self).__init__(job, op)
+        # Burst is kept as a number of tuples across rate changes.
+        self.burst = self.period * self.rate
+        self.buffer_size = job.queue_size * job.batch_size
+        self._pending = collections.deque()
+
+    def _set_rate(self, rate):
+        self.rate = rate
+        self.interval = 1.0 / rate
+        self.period = self.burst / rate
+
+    def _release(self):
+        pending = self._pending
+        oport = self.outputs[0]
+        now = time.monotonic()
+        if self._next is None:
+            self._next = self._full(now)
+        while pending and self._next <= now:
+            item = pending.popleft()
+            if item is _WINDOW:
+                oport.punct(_WINDOW)
+                if not self.include_punctuations:
+                    continue
+            else:
+                oport.submit(item)
+            self._next = max(self._next, self._full(now)) + self.interval
+        oport.flush()
+        self.deadline = self._next if pending else None
+
+    def process(self, port, batch):
+        if port == 0:
+            for t in batch:
+                if len(self._pending) >= self.buffer_size:
+                    # Block upstream until the next tuple is due
+                    wait = self._next - time.monotonic()
+                    if wait > 0:
+                        self.job._cancelled.wait(wait)
+                    self._release()
+                self._pending.append(t)
+        else:
+            for t in batch:
+                rate = float(t['rate'] if isinstance(t, dict) else t)
+                if rate > 0:
+                    self._set_rate(rate)
+        self._release()
+
+    def on_punct(self, port):
+        if port == 0:
+            self._pending.append(_WINDOW)
+            self._release()
+
+    def on_timer(self, now):
+        self._release()
+
+    def completed(self):
+        return 0 in self._finals and not self._pending
+
+
+@_operator('spl.utility::DeDuplicate')
+class _DeDuplicate(_Operator):
+    def __init__(self, job, op):
+        super(_DeDuplicate, self).__init__(job, op)
+        key = op.params.get('key')
+        self._key = _compile(key) if key is not None else _whole_tuple
+        self.count = self.param('count')
+        self.timeout = self.param('timeOut')
+        self.flush_on_punctuation = self.param('flushOnPunctuation', False) is True
+        self._seen = {}
+        self._order = collections.deque()
+        self._n = 0
+
+    def _expire(self, position):
+        seen = self._seen
+        order = self._order
+        while order and order[0][0] <= position:
+            p, key = order.popleft()
+            if seen.get(key) == p:
+                del seen[key]
+
+    def process(self, port, batch):
+        out = []
+        seen = self._seen
+        for t in batch:
+            if self.timeout is not None:
+                position = time.monotonic()
+                self._expire(position - float(self.timeout))
+            else:
+                self._n += 1
+                position = self._n
+                if self.count is not None:
+                    self._expire(position - int(self.count) - 1)
+            key = self._key(t)
+            if key not in seen:
+                out.append(t)
+            seen[key] = position
+            self._order.append((position, key))
+        if out:
+            self.outputs[0].submit_batch(out)
+
+    def on_punct(self, port):
+        if self.flush_on_punctuation:
+            self._seen.clear()
+            self._order.clear()
+        self.punct()
+
+def _whole_tuple(t):
+    if isinstance(t, dict):
+        try:
+            return tuple(t.values())
+        except TypeError:
+            return repr(t)
+    return t if isinstance(t, (str, int, float, bytes)) else repr(t)
+
+
+@_operator('spl.utility::Delay')
+class _Delay(_Operator):
+    def __init__(self, job, op):
+        super(_Delay, self).__init__(job, op)
+        self.delay = float(self.param('delay'))
+        self.buffer_size = int(self.param('bufferSize', 1000))
+        self._held = collections.deque()
+        self._final = False
+
+    def _hold(self, item):
+        if len(self._held) >= self.buffer_size:
+            # Block upstream until the oldest item is due
+            wait = self._held[0][0] - time.monotonic()
+            if wait > 0:
+                self.job._cancelled.wait(wait)
+            self._release(time.monotonic())
+        self._held.append((time.monotonic() + self.delay, item))
+        if self.deadline is None:
+            self.deadline = self._held[0][0]
+
+    def process(self, port, batch):
+        for t in batch:
+            self._hold(t)
+
+    def on_punct(self, port):
+        self._hold(_WINDOW)
+
+    def on_final(self, port):
+        self._final = True
+        if self._held:
+            self.deadline = self._held[0][0]
+
+    def _release(self, now):
+        held = self._held
+        oport = self.outputs[0]
+        while held and held[0][0] <= now:
+            _, item = held.popleft()
+            if item is _WINDOW:
+                oport.punct(_WINDOW)
+            else:
+                oport.submit(item)
+        oport.flush()
+
+    def on_timer(self, now):
+        self._release(now)
+        if self._held:
+            self.deadline = self._held[0][0]
+
+    def completed(self):
+        return self._final and not self._held
+
+
+@_operator('spl.utility::Pair')
+class _Pair(_Operator):
+    def __init__(self, job, op):
+        super(_Pair, self).__init__(job, op)
+        n = len(self.inputs)
+        self._keys = []
+        for i in range(n):
+            key = op.params.get('partitionBy' + str(i))
+            self._keys.append(_compile(str(key).split('.')[-1]) if key is not None else None)
+        self._pending = collections.defaultdict(lambda: [collections.deque() for _ in range(n)])
+
+    def process(self, port, batch):
+        key = self._keys[port]
+        submit = self.outputs[0].submit
+        for t in batch:
+            k = key(t) if key is not None else None
+            queues = self._pending[k]
+            queues[port].append(t)
+            if all(queues):
+                for q in queues:
+                    submit(q.popleft())
+                if not any(queues):
+                    del self._pending[k]
+
+    def on_punct(self, port):
+        pass
+
+
+@_operator('spl.utility::Gate')
+class _Gate(_Operator):
+    final_ports = [0]
+
+    def __init__(self, job, op):
+        super(_Gate, self).__init__(job, op)
+        self.max_unacked = int(self.param('maxUnackedTupleCount', 1))
+        self.ack_count = int(self.param('numTuplesToAck', 1))
+        self._unacked = 0
+        self._pending = collections.deque()
+
+    def _open(self):
+        submit = self.outputs[0].submit
+        while self._pending and self._unacked < self.max_unacked:
+            submit(self._pending.popleft())
+            self._unacked += 1
+        self.flush()
+
+    def process(self, port, batch):
+        if port == 0:
+            self._pending.extend(batch)
+        else:
+            self._unacked = max(0, self._unacked - self.ack_count * len(batch))
+        self._open()
+
+    def on_punct(self, port):
+        if port == 0:
+            self.punct()
+
+    def completed(self):
+        return 0 in self._finals and not self._pending
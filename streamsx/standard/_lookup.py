@@ -0,0 +1,294 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+"""
+Memory-mapped, hash-indexed CSV lookup tables.
+
+The index of a CSV file is an open addressing hash table stored in a file
+next to it. Each slot holds the 64-bit hash of a record's key and the
+offset of the record in the CSV file, so neither the records nor the
+index are read into memory, both are memory mapped and a lookup reads
+the slots probed and the matching record.
+
+An index is written to a temporary file and renamed, so a complete index
+is always seen, and it records the size and modification time of the
+CSV file it was built from so that a stale index is rebuilt.
+"""
+
+import csv
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+
+import streamsx.standard._sketches as _sketches
+from streamsx.standard._engine import _attribute_names, _attribute_types, _parser
+
+_MAGIC = b'SXLKUP01'
+# magic, capacity, record count, CSV size, CSV modification time, key column
+_HEADER = struct.Struct('<8sQQQqQ')
+# key hash, record offset + 1 (0 is an empty slot)
+_SLOT = struct.Struct('<QQ')
+
+
+def _records(mm, separator, offset=0):
+    """Yield ``(offset, fields)`` for each CSV record of `mm` starting at `offset`."""
+    size = len(mm)
+    position = [offset]
+    def _lines():
+        while position[0] < size:
+            end = mm.find(b'\n', position[0])
+            end = size if end == -1 else end + 1
+            line = mm[position[0]:end].decode('utf-8')
+            position[0] = end
+            yield line
+    start = offset
+    for fields in csv.reader(_lines(), delimiter=separator):
+        yield start, fields
+        start = position[0]
+
+
+def _line_count(mm):
+    """Number of lines of `mm`, an upper bound of its number of CSV records."""
+    size = len(mm)
+    step = 1 << 24
+    # Counted in slices as mmap has no count method.
+    return sum(mm[i:min(size, i + step)].count(b'\n') for i in range(0, size, step)) + 1
+
+
+def _insert(table, mask, records, key_column, key_parser):
+    """Insert the `records` into the open addressing `table`, returns their number."""
+    count = 0
+    for offset, fields in records:
+        if len(fields) <= key_column:
+            continue
+        h = _sketches._hash64(key_parser(fields[key_column]))
+        i = h & mask
+        # Later records of a key replace earlier ones, hashes are
+        # 64-bit so equal hashes are treated as equal keys.
+        while table[2*i+1] and table[2*i] != h:
+            i = (i + 1) & mask
+        table[2*i] = h
+        table[2*i+1] = offset + 1
+        count += 1
+    return count
+
+
+def _build(path, index_path, key_column, key_parser, separator, header):
+    """Build the index of the CSV file `path` keyed by `key_column`.
+
+    The index file is sized for the number of lines of the CSV file,
+    memory mapped and filled in a single pass over the records, so
+    neither the records nor the index are held in memory.
+    """
+    st = os.stat(path)
+    tmp = index_path + '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.tmp'
+    try:
+        _fill(path, tmp, st, key_column, key_parser, separator, header)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, index_path)
+
+
+def _fill(path, tmp, st, key_column, key_parser, separator, header):
+    """Write the index of the CSV file `path` to `tmp`."""
+    with open(path, 'rb') as f, open(tmp, 'w+b') as out:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if st.st_size else b''
+        try:
+            lines = _line_count(mm)
+            capacity = 16
+            while capacity < 2 * lines:
+                capacity *= 2
+            mask = capacity - 1
+            out.truncate(_HEADER.size + _SLOT.size * capacity)
+            index = mmap.mmap(out.fileno(), 0)
+            try:
+                records = _records(mm, separator)
+                if header:
+                    next(records, None)
+                with memoryview(index)[_HEADER.size:] as view, view.cast('Q') as table:
+                    count = _insert(table, mask, records, key_column, key_parser)
+                _HEADER.pack_into(index, 0, _MAGIC, capacity, count, st.st_size, st.st_mtime_ns, key_column)
+                index.flush()
+            finally:
+                index.close()
+        finally:
+            if st.st_size:
+                mm.close()
+
+
+class _Table(object):
+    """Memory-mapped CSV file and its index."""
+    def __init__(self, path, index_path, key_column, parsers, separator):
+        self.key_column = key_column
+        self.parsers = parsers
+        self.separator = separator
+        self._files = []
+        self.data = self._map(path)
+        self.index = self._map(index_path)
+        _, self.capacity, self.count, _, _, _ = _HEADER.unpack_from(self.index, 0)
+
+    def _map(self, path):
+        f = open(path, 'rb')
+        self._files.append(f)
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def valid(path, index_path, key_column):
+        """Is the index at `index_path` complete and current for the CSV file `path`."""
+        try:
+            st = os.stat(path)
+            with open(index_path, 'rb') as f:
+                magic, capacity, _, size, mtime, column = _HEADER.unpack(f.read(_HEADER.size))
+                complete = os.fstat(f.fileno()).st_size == _HEADER.size + _SLOT.size * capacity
+        except (OSError, struct.error):
+            return False
+        return magic == _MAGIC and complete and size == st.st_size and mtime == st.st_mtime_ns and column == key_column
+
+    def get(self, key):
+        """Parsed fields of the record with `key`, `None` if there is none."""
+        h = _sketches._hash64(key)
+        mask = self.capacity - 1
+        i = h & mask
+        index = self.index
+        while True:
+            sh, offset = _SLOT.unpack_from(index, _HEADER.size + _SLOT.size * i)
+            if offset == 0:
+                return None
+            if sh == h:
+                _, fields = next(_records(self.data, self.separator, offset - 1))
+                values = [p(v) for p, v in zip(self.parsers, fields)]
+                if values[self.key_column] == key:
+                    return values
+            i = (i + 1) & mask
+
+    def close(self):
+        for m in (self.data, self.index):
+            if isinstance(m, mmap.mmap):
+                m.close()
+        for f in self._files:
+            f.close()
+
+
+class _CSVLookup(object):
+    """Callable enriching tuples with the record of a CSV file matching a key.
+
+    The table is opened on the first call and the CSV file (or the newest
+    file in the directory matching the pattern) is checked for a new version
+    every `interval` seconds. A new version is indexed on a background
+    thread and swapped in once its index is complete, tuples are looked up
+    against the previous version meanwhile.
+    """
+    def __init__(self, file, directory, pattern, schema, key, lookup_key, header, separator, index_directory, interval):
+        self.file = file
+        self.directory = directory
+        self.pattern = pattern
+        self.names = _attribute_names(schema)
+        self.types = list(_attribute_types(schema).values())
+        self.key = key
+        self.lookup_key = lookup_key
+        self.header = header
+        self.separator = separator
+        self.index_directory = index_directory
+        self.interval = interval
+        self._table = None
+        self._version = None
+        self._checked = 0.0
+        self._building = None
+        self._lock = None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        for name in ('_table', '_version', '_building', '_lock'):
+            state[name] = None
+        state['_checked'] = 0.0
+        return state
+
+    def __enter__(self):
+        self._lock = threading.Lock()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._table is not None:
+            self._table.close()
+            self._table = None
+
+    def _current(self):
+        """Path and version of the current CSV file, `None` if there is none."""
+        if self.file is not None:
+            path = self.file
+        else:
+            pattern = re.compile(self.pattern) if self.pattern else None
+            path = None
+            newest = None
+            for entry in os.scandir(self.directory):
+                if pattern is not None and not pattern.search(entry.name):
+                    continue
+                if not entry.is_file() or entry.name.endswith(('.idx', '.tmp')):
+                    continue
+                mtime = entry.stat().st_mtime_ns
+                if newest is None or mtime > newest:
+                    path, newest = entry.path, mtime
+            if path is None:
+                return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return path, (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def _index_path(self, path):
+        directory = self.index_directory or os.path.dirname(path)
+        return os.path.join(directory, os.path.basename(path) + '.idx')
+
+    def _open(self, path):
+        column = self.names.index(self.key)
+        index_path = self._index_path(path)
+        if not _Table.valid(path, index_path, column):
+            _build(path, index_path, column, _parser(self.types[column]), self.separator, self.header)
+        return _Table(path, index_path, column, [_parser(t) for t in self.types], self.separator)
+
+    def _swap(self, path, version):
+        try:
+            table = self._open(path)
+        except (OSError, ValueError):
+            # Retry on the next check, the file may be incomplete.
+            table = None
+        with self._lock:
+            if table is not None:
+                old, self._table = self._table, table
+                self._version = version
+                if old is not None:
+                    old.close()
+            self._building = None
+
+    def _check(self, now):
+        self._checked = now
+        current = self._current()
+        if current is None or current[1] == self._version or self._building is not None:
+            return
+        if self._table is None:
+            self._swap(*current)
+        else:
+            self._building = threading.Thread(target=self._swap, args=current, daemon=True)
+            self._building.start()
+
+    def __call__(self, t):
+        if self._lock is None:
+            self.__enter__()
+        now = time.monotonic()
+        if self._table is None or now - self._checked >= self.interval:
+            self._check(now)
+        with self._lock:
+            table = self._table
+            values = table.get(t[self.lookup_key]) if table is not None else None
+        if values is None:
+            return None
+        out = dict(t)
+        out.update(zip(self.names, values))
+        return out
@@ -0,0 +1,106 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+"""
+Shared memory ring buffers passing records between processes.
+
+A ring has a single producer and a single consumer. Records are
+copied into a circular buffer in shared memory, prefixed by their
+length and wrapping around its end, so a record is copied once
+by the producer and once by the consumer and never passes through
+a pipe. A semaphore counts the records in the ring so that the
+consumer blocks while it is empty. The producer waits, polling the
+consumer's position, while the ring is full, which only happens
+when the consumer falls behind.
+"""
+
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+# bytes written, bytes read
+_HEADER = struct.Struct('<QQ')
+_LENGTH = struct.Struct('<Q')
+
+
+class _Ring(object):
+    """Single-producer single-consumer ring buffer of byte records.
+
+    Rings are passed to the consumer or producer process as
+    arguments of the process, attaching to the same shared memory.
+
+    Args:
+        context: Multiprocessing context of the processes.
+        capacity(int): Size of the buffer in bytes.
+    """
+    def __init__(self, context, capacity=1 << 24):
+        self.capacity = capacity
+        self.shm = shared_memory.SharedMemory(create=True, size=_HEADER.size + capacity)
+        _HEADER.pack_into(self.shm.buf, 0, 0, 0)
+        self.items = context.Semaphore(0)
+        self._owner = True
+
+    def __getstate__(self):
+        return {'name': self.shm.name, 'capacity': self.capacity, 'items': self.items}
+
+    def __setstate__(self, state):
+        self.capacity = state['capacity']
+        self.shm = shared_memory.SharedMemory(name=state['name'])
+        # Attaching registers the memory to be unlinked on exit,
+        # it is unlinked by the process that created it.
+        resource_tracker.unregister(self.shm._name, 'shared_memory')
+        self.items = state['items']
+        self._owner = False
+
+    def _copy_in(self, position, data):
+        buf = self.shm.buf
+        start = _HEADER.size + position % self.capacity
+        first = min(len(data), _HEADER.size + self.capacity - start)
+        buf[start:start+first] = data[:first]
+        if first < len(data):
+            buf[_HEADER.size:_HEADER.size+len(data)-first] = data[first:]
+
+    def _copy_out(self, position, n):
+        buf = self.shm.buf
+        start = _HEADER.size + position % self.capacity
+        first = min(n, _HEADER.size + self.capacity - start)
+        if first == n:
+            return bytes(buf[start:start+n])
+        return bytes(buf[start:start+first]) + bytes(buf[_HEADER.size:_HEADER.size+n-first])
+
+    def put(self, data, cancelled=None):
+        """Append the record `data`, waiting while the ring is full.
+
+        Returns `False` if `cancelled` returned true while waiting.
+        """
+        need = _LENGTH.size + len(data)
+        if need > self.capacity:
+            raise ValueError('Record of {} bytes exceeds ring capacity of {} bytes'.format(len(data), self.capacity))
+        buf = self.shm.buf
+        written, read = _HEADER.unpack_from(buf, 0)
+        while self.capacity - (written - read) < need:
+            if cancelled is not None and cancelled():
+                return False
+            time.sleep(0.0005)
+            read = _HEADER.unpack_from(buf, 0)[1]
+        self._copy_in(written, _LENGTH.pack(len(data)))
+        self._copy_in(written + _LENGTH.size, data)
+        struct.pack_into('<Q', buf, 0, written + need)
+        self.items.release()
+        return True
+
+    def get(self, timeout=None):
+        """Remove and return the next record, `None` when `timeout` expires."""
+        if not self.items.acquire(timeout=timeout):
+            return None
+        buf = self.shm.buf
+        read = _HEADER.unpack_from(buf, 0)[1]
+        n = _LENGTH.unpack(self._copy_out(read, _LENGTH.size))[0]
+        data = self._copy_out(read + _LENGTH.size, n)
+        struct.pack_into('<Q', buf, 8, read + _LENGTH.size + n)
+        return data
+
+    def close(self):
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
@@ -0,0 +1,327 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+"""
+Mergeable summaries used by local aggregation.
+
+Each summary supports ``insert`` and ``value`` and ``merge`` of another
+summary of the same kind, so that partial aggregations, for example
+of panes of a window or of parallel channels, can be combined.
+"""
+
+import hashlib
+import heapq
+import math
+
+
+class _Moments(object):
+    """Count, mean and sum of squared deviations of values.
+
+    Values are inserted and removed using Welford's algorithm and
+    summaries are merged using the pairwise update of Chan et al.
+    Neither computes a difference of large sums of squares, so
+    precision is retained for values with a large mean and small
+    variance.
+    """
+    __slots__ = ['n', 'mean', 'm2']
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def insert(self, v):
+        self.n += 1
+        d = v - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (v - self.mean)
+
+    def remove(self, v):
+        if self.n <= 1:
+            self.__init__()
+            return
+        d = v - self.mean
+        self.n -= 1
+        self.mean -= d / self.n
+        self.m2 = max(0.0, self.m2 - d * (v - self.mean))
+
+    def merge(self, other):
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        d = other.mean - self.mean
+        self.mean += d * other.n / n
+        self.m2 += other.m2 + d * d * self.n * other.n / n
+        self.n = n
+
+    def variance(self, sample=False):
+        n = self.n - 1 if sample else self.n
+        return self.m2 / n if n > 0 else 0.0
+
+    def stddev(self, sample=False):
+        return math.sqrt(self.variance(sample))
+
+
+class _TDigest(object):
+    """Merging t-digest for approximate quantiles.
+
+    Values are buffered and periodically merged into centroids whose
+    sizes are bounded by the arcsine scale function, so the number of
+    centroids is bounded by `compression` regardless of the number of
+    values while quantiles near the tails remain accurate.
+
+    Args:
+        compression(float): Maximum number of centroids is approximately `compression`.
+    """
+    __slots__ = ['compression', 'means', 'weights', 'buffer', 'n', 'min', 'max']
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.means = []
+        self.weights = []
+        self.buffer = []
+        self.n = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def insert(self, v, w=1.0):
+        self.buffer.append((v, w))
+        self.n += w
+        if v < self.min:
+            self.min = v
+        if v > self.max:
+            self.max = v
+        if len(self.buffer) >= 4 * self.compression:
+            self._compress()
+
+    def merge(self, other, weight=1.0):
+        """Merge `other`, scaling its weights by `weight`."""
+        if weight <= 0.0 or other.n == 0:
+            return
+        other._compress()
+        self.buffer.extend((m, w * weight) for m, w in zip(other.means, other.weights))
+        self.n += other.n * weight
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if len(self.buffer) >= 4 * self.compression:
+            self._compress()
+
+    def _k_limit(self, q):
+        # Quantile limit of a centroid starting at q, from the
+        # scale function k(q) = delta / 2pi * asin(2q - 1).
+        delta = self.compression
+        k = delta / (2 * math.pi) * math.asin(2 * q - 1) + 1
+        if k >= delta / 4:
+            return 1.0
+        return (math.sin(2 * math.pi * k / delta) + 1) / 2
+
+    def _compress(self):
+        if not self.buffer:
+            return
+        items = sorted(list(zip(self.means, self.weights)) + self.buffer)
+        self.buffer = []
+        total = self.n
+        means = []
+        weights = []
+        m, w = items[0]
+        so_far = 0.0
+        limit = total * self._k_limit(0.0)
+        for im, iw in items[1:]:
+            if so_far + w + iw <= limit:
+                w += iw
+                m += (im - m) * iw / w
+            else:
+                means.append(m)
+                weights.append(w)
+                so_far += w
+                limit = total * self._k_limit(min(1.0, so_far / total))
+                m, w = im, iw
+        means.append(m)
+        weights.append(w)
+        self.means = means
+        self.weights = weights
+
+    def quantile(self, q):
+        """Approximate value at quantile `q` (0 to 1), ``0.0`` if empty."""
+        self._compress()
+        if not self.means:
+            return 0.0
+        means = self.means
+        weights = self.weights
+        if len(means) == 1:
+            return means[0]
+        index = q * self.n
+        if index < weights[0] / 2:
+            return self.min + (means[0] - self.min) * index / (weights[0] / 2)
+        cumulative = weights[0] / 2
+        for i in range(len(means) - 1):
+            step = (weights[i] + weights[i+1]) / 2
+            if index < cumulative + step:
+                return means[i] + (means[i+1] - means[i]) * (index - cumulative) / step
+            cumulative += step
+        tail = self.n - cumulative
+        if tail <= 0:
+            return self.max
+        return means[-1] + (self.max - means[-1]) * min(1.0, (index - cumulative) / tail)
+
+
+_MASK64 = (1 << 64) - 1
+
+def _hash64(v):
+    """Stable 64-bit hash of a value, independent of the process hash seed."""
+    if isinstance(v, int):
+        # splitmix64 finalizer
+        z = (v + 0x9E3779B97F4A7C15) & _MASK64
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+        return z ^ (z >> 31)
+    if isinstance(v, str):
+        v = v.encode('utf-8')
+    elif not isinstance(v, (bytes, bytearray)):
+        v = repr(v).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(v, digest_size=8).digest(), 'little')
+
+
+class _HyperLogLog(object):
+    """HyperLogLog sketch for approximate distinct counts.
+
+    The number of registers is chosen for a relative standard error
+    of `error`. Registers are held sparsely until a sixteenth of them
+    are set so that sketches of few values, such as blocks of a
+    sliding window, are small. Merging takes the maximum of each register.
+
+    Args:
+        error(float): Relative standard error of the cardinality estimate.
+    """
+    __slots__ = ['p', 'm', 'sparse', 'registers']
+    def __init__(self, error=0.01):
+        m = (1.04 / error) ** 2
+        self.p = min(18, max(4, int(math.ceil(math.log2(m)))))
+        self.m = 1 << self.p
+        self.sparse = {}
+        self.registers = None
+
+    def insert(self, v):
+        h = _hash64(v)
+        bits = 64 - self.p
+        w = h & ((1 << bits) - 1)
+        self._update(h >> bits, bits - w.bit_length() + 1)
+
+    def _update(self, index, rank):
+        if self.registers is not None:
+            if rank > self.registers[index]:
+                self.registers[index] = rank
+            return
+        if rank > self.sparse.get(index, 0):
+            self.sparse[index] = rank
+            if len(self.sparse) > self.m >> 4:
+                self.registers = bytearray(self.m)
+                for i, r in self.sparse.items():
+                    self.registers[i] = r
+                self.sparse = None
+
+    def merge(self, other, weight=1.0):
+        """Merge `other` when `weight` is at least a half.
+
+        Registers cannot be scaled, so a partially evicted block of a
+        sliding window is either counted in full or not at all, which
+        bounds the error it adds to half of its values either way.
+        """
+        if other.p != self.p:
+            raise ValueError("HyperLogLog sketches of different precision")
+        if weight < 0.5:
+            return
+        if other.registers is None:
+            for i, r in other.sparse.items():
+                self._update(i, r)
+        elif self.registers is None:
+            sparse = self.sparse
+            self.registers = bytearray(other.registers)
+            self.sparse = None
+            for i, r in sparse.items():
+                self._update(i, r)
+        else:
+            self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def cardinality(self):
+        m = self.m
+        if self.registers is None:
+            ranks = self.sparse.values()
+            zeros = m - len(self.sparse)
+            total = zeros + math.fsum(2.0 ** -r for r in ranks)
+        else:
+            counts = self.registers.count
+            zeros = counts(0)
+            total = math.fsum(counts(r) * 2.0 ** -r for r in range(66 - self.p))
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        estimate = alpha * m * m / total
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting for small cardinalities.
+            return m * math.log(m / zeros)
+        return estimate
+
+
+class _SpaceSaving(object):
+    """Space-Saving summary of the most frequent values.
+
+    At most `capacity` values are counted. When a value that is not
+    counted arrives and the summary is full, the value with the minimum
+    count is replaced and the new value inherits its count, so counts
+    overestimate by at most ``n / capacity`` and every value occurring
+    more often than that is guaranteed to be counted.
+
+    The minimum is found using a heap of ``(count, value)`` entries
+    where entries whose count is out of date are discarded lazily.
+
+    Args:
+        capacity(int): Maximum number of values counted.
+    """
+    __slots__ = ['capacity', 'counts', 'heap', 'seq']
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.heap = []
+        # Tie breaker so that values are never compared by the heap.
+        self.seq = 0
+
+    def _push(self, v, c):
+        self.seq += 1
+        heapq.heappush(self.heap, (c, self.seq, v))
+        if len(self.heap) > 4 * self.capacity:
+            self._rebuild()
+
+    def _rebuild(self):
+        seq = self.seq
+        self.heap = [(c, seq + i, v) for i, (v, c) in enumerate(self.counts.items(), 1)]
+        self.seq = seq + len(self.heap)
+        heapq.heapify(self.heap)
+
+    def insert(self, v, w=1):
+        counts = self.counts
+        c = counts.get(v)
+        if c is None and len(counts) >= self.capacity:
+            heap = self.heap
+            while True:
+                mc, _, mv = heapq.heappop(heap)
+                if counts.get(mv) == mc:
+                    break
+            del counts[mv]
+            c = mc
+        c = (c or 0) + w
+        counts[v] = c
+        self._push(v, c)
+
+    def merge(self, other, weight=1.0):
+        """Merge `other`, scaling its counts by `weight`."""
+        if weight <= 0.0:
+            return
+        counts = self.counts
+        for v, c in other.counts.items():
+            counts[v] = counts.get(v, 0) + c * weight
+        if len(counts) > self.capacity:
+            top = heapq.nlargest(self.capacity + 1, counts.items(), key=lambda vc: vc[1])
+            floor = top[-1][1]
+            self.counts = {v: c - floor for v, c in top[:-1]}
+        self._rebuild()
+
+    def top(self, k):
+        """The `k` most frequent values, most frequent first."""
+        return [v for v, _ in heapq.nlargest(k, self.counts.items(), key=lambda vc: vc[1])]
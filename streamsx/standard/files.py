@@ -9,8 +9,9 @@ import os
 import enum
 import streamsx.spl.op
 from streamsx.topology.schema import CommonSchema, StreamSchema
-from streamsx.standard import CloseMode, Format, Compression, WriteFailureAction, SortOrder, SortByType
+from streamsx.standard import CloseMode, Format, Compression, WriteFailureAction, SortOrder, SortByType, Schedule
 import streamsx.topology.composite
+import streamsx.standard._lookup as _lookup
 
 import streamsx.standard._version
 __version__ = streamsx.standard._version.__version__
@@ -55,6 +56,11 @@ class DirectoryScan(streamsx.topology.composite.Source):
         self.move_to_directory = None
         self.ignore_dot_files = None
         self.ignore_existing_files_at_startup = None
+        self.watch = False
+        self.manifest = None
+        self.shard = None
+        self.schedule = None
+        self.size_budget = None
         if 'sleep_time' in options:
             self.sleep_time = options.get('sleep_time')
         if 'init_delay' in options:
@@ -69,6 +75,16 @@ class DirectoryScan(streamsx.topology.composite.Source):
             self.ignore_dot_files = options.get('ignore_dot_files')
         if 'ignore_existing_files_at_startup' in options:
             self.ignore_existing_files_at_startup = options.get('ignore_existing_files_at_startup')
+        if 'watch' in options:
+            self.watch = options.get('watch')
+        if 'manifest' in options:
+            self.manifest = options.get('manifest')
+        if 'shard' in options:
+            self.shard = options.get('shard')
+        if 'schedule' in options:
+            self.schedule = options.get('schedule')
+        if 'size_budget' in options:
+            self.size_budget = options.get('size_budget')
        
 
     @property
@@ -148,6 +164,87 @@ class DirectoryScan(streamsx.topology.composite.Source):
     def ignore_existing_files_at_startup(self, value):
         self._ignore_existing_files_at_startup = value
 
+    @property
+    def watch(self):
+        """
+            bool: Specifies whether file names are generated as soon as files are written to or moved into the directory, instead of at the next scan. Files are detected when they are closed after writing or renamed into the directory using Linux inotify, where inotify is not available the directory is scanned every ``sleep_time`` seconds. Applies to local execution, the SPL operator always scans. By default, the value is set to false.
+
+            .. versionadded:: 1.6
+        """
+        return self._watch
+
+    @watch.setter
+    def watch(self, value):
+        self._watch = value
+
+    @property
+    def manifest(self):
+        """
+            str: Specifies the path of a file recording the files that have been processed, so that after a restart only files that were not processed before are submitted. Files are identified by their inode, size and modification time, so a file that is modified is processed again. A file is recorded when its name is submitted, not once downstream operators have processed it, so files are processed at most once: a file whose processing was interrupted by a failure or by the job being cancelled is not submitted again after a restart. Applies to local execution, the SPL operator does not record processed files. By default, no manifest is used.
+
+            .. versionadded:: 1.6
+        """
+        return self._manifest
+
+    @manifest.setter
+    def manifest(self, value):
+        self._manifest = value
+
+    @property
+    def shard(self):
+        """
+            tuple: Specifies the partition of file names that is scanned as a ``(index, count)`` tuple, for example ``(1, 4)`` for the second of four partitions. A stable hash of each file name determines its partition, so `count` operators scanning the same directory, one for each index, each generate a disjoint subset of the files and every file is generated by exactly one of them. Only supported by local execution. By default, all files are scanned.
+
+            Example, scanning a directory with four operators, each feeding its own reader::
+
+                for i in range(4):
+                    s = topo.source(files.DirectoryScan(directory='/data/in', shard=(i, 4)))
+                    s.map(files.CSVFilesReader(), schema=StreamSchema('tuple<rstring a, int32 b>'))
+
+            .. versionadded:: 1.6
+        """
+        return self._shard
+
+    @shard.setter
+    def shard(self, value):
+        if value is not None:
+            index, count = value
+            if count < 1 or not 0 <= index < count:
+                raise ValueError("Shard index must be between 0 and count - 1: " + str(value))
+        self._shard = value
+
+    @property
+    def schedule(self):
+        """
+            Schedule: Specifies the scheduling policy of the files found, taking precedence over ``sort_by`` and ``order``, which then only order files the policy considers equal. Applies to local execution, the SPL operator ignores it. By default, files are generated in the order given by ``sort_by`` and ``order``.
+
+            Example, starting large files first on the least loaded of four readers::
+
+                s = topo.source(files.DirectoryScan(directory='/data/in', schedule=Schedule.largest_first))
+                for c in U.spray(s, count=4):
+                    c.map(files.BlockFilesReader(block_size=1048576), schema=StreamSchema('tuple<blob block>'))
+
+            .. versionadded:: 1.6
+        """
+        return self._schedule
+
+    @schedule.setter
+    def schedule(self, value):
+        self._schedule = value
+
+    @property
+    def size_budget(self):
+        """
+            int: Specifies the size budget in bytes of the scheduling policy, if this parameter is not specified, the default is 16MB.
+
+            .. versionadded:: 1.6
+        """
+        return self._size_budget
+
+    @size_budget.setter
+    def size_budget(self, value):
+        self._size_budget = value
+
 
     def populate(self, topology, name, **options):
 
@@ -178,6 +275,11 @@ class DirectoryScan(streamsx.topology.composite.Source):
                         ignoreDotFiles=self.ignore_dot_files, \
                         ignoreExistingFilesAtStartup=self.ignore_existing_files_at_startup, \
                         name=name)
+        _op._local_options = {'watch': bool(self.watch), 'manifest': self.manifest, 'shard': self.shard}
+        if self.schedule is not None:
+            _op._local_options['schedule'] = Schedule[self.schedule].name if isinstance(self.schedule, str) else self.schedule.name
+        if self.size_budget is not None:
+            _op._local_options['size_budget'] = int(self.size_budget)
 
         return _op.stream
 
@@ -224,12 +326,16 @@ class FileSink(streamsx.topology.composite.ForEach):
         self.bytes_per_file = None
         self.close_mode = None
         self.compression = None
+        self.compression_level = None
+        self.compression_threads = None
         self.encoding = None
         self.eol_marker = None
         self.flush = None
         self.flush_on_punctuation = None
         self.format = None
         self.has_delay_field = None
+        self.idle_timeout = None
+        self.max_open_files = None
         self.move_file_to_directory = None
         self.quote_strings = None
         self.separator = None
@@ -248,6 +354,10 @@ class FileSink(streamsx.topology.composite.ForEach):
             self.close_mode = options.get('close_mode')
         if 'compression' in options:
             self.compression = options.get('compression')
+        if 'compression_level' in options:
+            self.compression_level = options.get('compression_level')
+        if 'compression_threads' in options:
+            self.compression_threads = options.get('compression_threads')
         if 'encoding' in options:
             self.encoding = options.get('encoding')
         if 'eol_marker' in options:
@@ -260,6 +370,10 @@ class FileSink(streamsx.topology.composite.ForEach):
             self.format = options.get('format')
         if 'has_delay_field' in options:
             self.has_delay_field = options.get('has_delay_field')
+        if 'idle_timeout' in options:
+            self.idle_timeout = options.get('idle_timeout')
+        if 'max_open_files' in options:
+            self.max_open_files = options.get('max_open_files')
         if 'move_file_to_directory' in options:
             self.move_file_to_directory = options.get('move_file_to_directory')
         if 'quote_strings' in options:
@@ -337,6 +451,32 @@ The modifiers can be repeated in the string, and are all replaced with their val
     def compression(self, value):
         self._compression = value
 
+    @property
+    def compression_level(self):
+        """
+             int: Specifies the compression level, trading compression speed for size. The valid values depend on the compression algorithm, for example 1 to 9 for gzip and 1 to 22 for zstd. If this parameter is not specified, the default level of the algorithm is used. Applies to local execution, the SPL operator uses the default level.
+
+             .. versionadded:: 1.6
+        """
+        return self._compression_level
+
+    @compression_level.setter
+    def compression_level(self, value):
+        self._compression_level = value
+
+    @property
+    def compression_threads(self):
+        """
+             int: Specifies the number of threads compressing the output file in parallel. The data is split into blocks of 1MB that are compressed independently, as by ``pigz``, and written in order as concatenated gzip or bzip2 members or zstd or lz4 frames, so the output file is a single valid file of the compression algorithm. zlib compression does not support independent blocks. A flush, from :py:meth:`~streamsx.standard.files.FileSink.flush` or :py:meth:`~streamsx.standard.files.FileSink.flush_on_punctuation`, writes the blocks compressed so far without waiting for the threads and does not end the current block, so the data of a partial block is only written once the block is full or the file is closed. Applies to local execution, the SPL operator compresses on its own thread.
+
+             .. versionadded:: 1.6
+        """
+        return self._compression_threads
+
+    @compression_threads.setter
+    def compression_threads(self, value):
+        self._compression_threads = value
+
     @property
     def encoding(self):
         """
@@ -403,6 +543,36 @@ The modifiers can be repeated in the string, and are all replaced with their val
     def has_delay_field(self, value):
         self._has_delay_field = value
 
+    @property
+    def idle_timeout(self):
+        """
+            float: Specifies the time in seconds after which a file of the pool of open files that has not been written to is closed. Only applies when :py:meth:`~streamsx.standard.files.FileSink.max_open_files` is set. By default, files are only closed when the pool is full.
+
+            .. versionadded:: 1.6
+        """
+        return self._idle_timeout
+
+    @idle_timeout.setter
+    def idle_timeout(self, value):
+        self._idle_timeout = value
+
+    @property
+    def max_open_files(self):
+        """
+            int: Specifies the maximum number of files kept open when :py:meth:`~streamsx.standard.files.FileSink.close_mode` is dynamic. Instead of closing the current file when the file name changes, a pool of open files is kept and the least recently written file is closed when the pool is full, so tuples with interleaved file names are each written to an open file. A file that was closed by the pool is appended to when it is written to again, as a new gzip or bzip2 member or zstd or lz4 frame when compressed, zlib compression cannot be appended to and is not supported. Files are moved to :py:meth:`~streamsx.standard.files.FileSink.move_file_to_directory` when the operator completes. Applies to local execution, the SPL operator closes the file whenever the file name changes.
+
+            Example, writing a file for each customer::
+
+                s.for_each(files.FileSink(file=streamsx.spl.op.Expression.expression('"/out/" + customer + ".csv"'), close_mode=CloseMode.dynamic.name, max_open_files=256, idle_timeout=60.0))
+
+            .. versionadded:: 1.6
+        """
+        return self._max_open_files
+
+    @max_open_files.setter
+    def max_open_files(self, value):
+        self._max_open_files = value
+
     @property
     def move_file_to_directory(self):
         """
@@ -590,6 +760,16 @@ The modifiers can be repeated in the string, and are all replaced with their val
                         writePunctuations=self.write_punctuations, \
                         writeStateHandlerCallbacks=self.write_state_handler_callbacks, \
                         name=name)
+        _op._compression_level = self.compression_level
+        if self.max_open_files and self.compression is not None:
+            if str(self.compression._value) == Compression.zlib.name:
+                raise ValueError("zlib compression cannot be appended to a file closed by the pool of open files.")
+        _op._max_open_files = self.max_open_files
+        _op._idle_timeout = self.idle_timeout
+        if self.compression_threads and self.compression is not None:
+            if str(self.compression._value) == Compression.zlib.name:
+                raise ValueError("zlib compression cannot be split into independent blocks.")
+            _op._compression_threads = self.compression_threads
 
         return streamsx.topology.topology.Sink(_op)
 
@@ -635,14 +815,24 @@ class CSVReader(streamsx.topology.composite.Source):
             fields than `schema` has attributes they will be ignored.
             Otherwise if there are extra fields an error is raised.
         hot(bool): Specifies whether the input file is hot, which means it is appended continuously.
-        compression(str): Specifies that the source file is compressed. There are three valid values, representing available compression algorithms. These values are: zlib, gzip, and bzip2. For example, use `Compression.gzip.name` for gzip.
+        compression(str): Specifies that the source file is compressed. There are five valid values, representing available compression algorithms. These values are: zlib, gzip, bzip2, zstd and lz4 (zstd and lz4 are only supported by local execution). For example, use `Compression.gzip.name` for gzip.
             
             .. versionadded:: 1.1
+        batch_size(int): Specifies the number of rows of each output tuple. When set, each output tuple holds a batch of rows as columns, each attribute holds the column of values of its type, a NumPy array for numeric types when NumPy is installed (otherwise an ``array.array``) and a list for other types. Fields are converted column by column, avoiding the creation of a tuple for each row, each row is still read as a list of fields. As without `batch_size`, a row with fewer values than the schema is an error. Only supported by local execution, see :py:mod:`streamsx.standard.local`.
+
+            .. versionadded:: 1.6
+
+        processes(int): Specifies the number of processes parsing the file in parallel. The file is split into ranges of whole records, a newline within a quoted value does not end a record, that are parsed in a pool of processes. Only applies to uncompressed files read by local execution, the SPL operator reads the file serially.
+
+            .. versionadded:: 1.6
+        preserve_order(bool): Specifies whether records read by multiple `processes` are submitted in the order of the file. When `False`, records of a range are submitted as soon as the range is parsed. Defaults to `True`.
+
+            .. versionadded:: 1.6
 
     Return:
         (Stream): Stream containing records from the file.
     """
-    def __init__(self, schema, file, header=False, encoding=None, separator=None, ignoreExtraFields=False, hot=False, compression=None):
+    def __init__(self, schema, file, header=False, encoding=None, separator=None, ignoreExtraFields=False, hot=False, compression=None, batch_size=None, processes=None, preserve_order=True):
         self.schema = schema
         self.file = file
         self.header = header
@@ -651,6 +841,9 @@ class CSVReader(streamsx.topology.composite.Source):
         self.ignoreExtraFields = ignoreExtraFields
         self.hot = hot
         self.compression = compression
+        self.batch_size = batch_size
+        self.processes = processes
+        self.preserve_order = preserve_order
 
     def populate(self, topology, name, **options):
         fe = streamsx.spl.op.Expression.expression(Format.csv.name)
@@ -666,6 +859,12 @@ class CSVReader(streamsx.topology.composite.Source):
         if self.compression is not None:
             self.compression = streamsx.spl.op.Expression.expression(self.compression)
         _op = _FileSource(topology, schemas=self.schema, file=self.file, format=fe, hotFile=self.hot, encoding=self.encoding, separator=self.separator, hasHeaderLine=self.header, ignoreExtraCSVValues=self.ignoreExtraFields, compression=self.compression)
+        _op._batch_size = self.batch_size
+        if self.processes is not None and self.processes > 1:
+            if self.hot:
+                raise ValueError("A hot file cannot be read by multiple processes.")
+            _op._processes = self.processes
+            _op._preserve_order = self.preserve_order
         return _op.outputs[0]
 
 
@@ -695,13 +894,17 @@ class BlockFilesReader(streamsx.topology.composite.Map):
 
     Args:
         block_size(int): Specifies the block size. If the block_size parameter is not specified, the entire file is read into a single tuple.
-        compression(str): Specifies that the source file is compressed. There are three valid values, representing available compression algorithms. These values are: zlib, gzip, and bzip2. For example, use `Compression.gzip.name` for gzip.
+        compression(str): Specifies that the source file is compressed. There are five valid values, representing available compression algorithms. These values are: zlib, gzip, bzip2, zstd and lz4 (zstd and lz4 are only supported by local execution). For example, use `Compression.gzip.name` for gzip.
         file_name(str): Each output tuple contains the name of the file that the tuple is read from. Ensure that the name given with this parameter is part of the output schema.
+        memory_map(bool): Specifies whether the file is memory mapped and each block is a read-only ``memoryview`` of the mapping rather than a copy of the data. The mapping is released once no block of the file is referenced, the file must not be truncated while blocks are referenced. Only applies to uncompressed files read by local execution, the SPL operator reads blocks into blobs.
+
+            .. versionadded:: 1.6
     """
-    def __init__(self, block_size=None, compression=None, file_name=None):
+    def __init__(self, block_size=None, compression=None, file_name=None, memory_map=False):
         self.block_size = block_size
         self.compression = compression
         self.file_name = file_name
+        self.memory_map = memory_map
 
     def populate(self, topology, stream, schema, name, **options):
         fe = streamsx.spl.op.Expression.expression(Format.block.name)
@@ -709,7 +912,10 @@ class BlockFilesReader(streamsx.topology.composite.Map):
             self.block_size = streamsx.spl.types.uint32(self.block_size)
         if self.compression is not None:
             self.compression = streamsx.spl.op.Expression.expression(self.compression)
+        if self.memory_map and self.compression is not None:
+            raise ValueError("A compressed file cannot be memory mapped.")
         _op = _FileSource(topology, schemas=schema, stream=stream, format=fe, blockSize=self.block_size, compression=self.compression)
+        _op._memory_map = self.memory_map
         if self.file_name is not None:
             setattr(_op, self.file_name, _op.output(_op.outputs[0], _op.expression('FileName()')))
         return _op.outputs[0]
@@ -739,29 +945,101 @@ class CSVFilesReader(streamsx.topology.composite.Map):
             fields than `schema` has attributes they will be ignored.
             Otherwise if there are extra fields an error is raised.
         file_name(str): Each output tuple contains the name of the file that the tuple is read from. Ensure that the name given with this parameter is part of the output schema.
-        compression(str): Specifies that the source file is compressed. There are three valid values, representing available compression algorithms. These values are: zlib, gzip, and bzip2. For example, use `Compression.gzip.name` for gzip.
+        compression(str): Specifies that the source file is compressed. There are five valid values, representing available compression algorithms. These values are: zlib, gzip, bzip2, zstd and lz4 (zstd and lz4 are only supported by local execution). For example, use `Compression.gzip.name` for gzip.
             
             .. versionadded:: 1.1
 
+        batch_size(int): Specifies the number of rows of each output tuple. When set, each output tuple holds a batch of rows as columns, each attribute holds the column of values of its type, a NumPy array for numeric types when NumPy is installed (otherwise an ``array.array``) and a list for other types. Fields are converted column by column, avoiding the creation of a tuple for each row, each row is still read as a list of fields. As without `batch_size`, a row with fewer values than the schema is an error. Only supported by local execution, see :py:mod:`streamsx.standard.local`.
+
+            .. versionadded:: 1.6
+
     """
-    def __init__(self, header=False, encoding=None, separator=None, ignoreExtraFields=False, file_name=None, compression=None):
+    def __init__(self, header=False, encoding=None, separator=None, ignoreExtraFields=False, file_name=None, compression=None, batch_size=None):
         self.header = header
         self.encoding = encoding
         self.separator = separator
         self.ignoreExtraFields = ignoreExtraFields
         self.file_name = file_name
         self.compression = compression
+        self.batch_size = batch_size
 
     def populate(self, topology, stream, schema, name, **options):
         fe = streamsx.spl.op.Expression.expression(Format.csv.name)
         if self.compression is not None:
             self.compression = streamsx.spl.op.Expression.expression(self.compression)
         _op = _FileSource(topology, schemas=schema, stream=stream, format=fe, encoding=self.encoding, separator=self.separator, hasHeaderLine=self.header, ignoreExtraCSVValues=self.ignoreExtraFields, compression=self.compression)
+        _op._batch_size = self.batch_size
         if self.file_name is not None:
             setattr(_op, self.file_name, _op.output(_op.outputs[0], _op.expression('FileName()')))
         return _op.outputs[0]
 
 
+class CSVLookup(streamsx.topology.composite.Map):
+    """Enriches tuples with the record of a CSV file that matches a key.
+
+    Each input tuple is looked up against the records of a CSV file
+    using the value of its `lookup_key` attribute. When a record with
+    an equal `key` exists the output tuple contains the attributes of
+    the input tuple and the record, otherwise no tuple is submitted.
+
+    The CSV file is served through a hash index built on disk next to
+    the file (or in `index_directory`) and both are memory mapped, so
+    reference data much larger than memory can be used for enrichment
+    without being read into a window, as with
+    :py:meth:`~streamsx.standard.relational.Join.lookup`.
+    An existing index is reused when it is current for the file.
+    When a key occurs in multiple records the last record is used.
+
+    The file is checked every `interval` seconds for a new version.
+    A new version is indexed in the background and swapped in once
+    its index is complete. With `directory` the newest file matching
+    `pattern` is used, so new versions of reference data delivered
+    to a directory, for example by :py:class:`DirectoryScan` moving
+    files into `directory`, replace the previous version.
+
+    Example enriching orders with customer details::
+
+        import streamsx.standard.files as files
+
+        customers = 'tuple<int64 customer_id, rstring name, rstring country>'
+        schema = 'tuple<int64 order_id, int64 customer_id, rstring name, rstring country>'
+
+        enriched = orders.map(files.CSVLookup(customers, key='customer_id', file='/data/customers.csv'), schema=schema)
+
+    Args:
+        schema(str,StreamSchema): Schema of the records of the CSV file.
+        key(str): Attribute of `schema` that is the key of the records.
+        lookup_key(str): Attribute of the input tuples looked up, defaults to `key`.
+        file(str): Absolute path of the CSV file.
+        directory(str): Absolute path of the directory containing versions of the CSV file, used when `file` is not set.
+        pattern(str): Regular expression that file names in `directory` must match.
+        header(bool): Does the file contain a header line.
+        separator(str): Separator between fields (defaults to comma ``,``).
+        index_directory(str): Directory for the index file, defaults to the directory of the CSV file.
+        interval(float): Seconds between checks for a new version of the file.
+
+    .. versionadded:: 1.6
+    """
+    def __init__(self, schema, key, lookup_key=None, file=None, directory=None, pattern=None, header=False, separator=None, index_directory=None, interval=5.0):
+        if (file is None) == (directory is None):
+            raise ValueError("One of file or directory is required.")
+        self.schema = StreamSchema(schema) if isinstance(schema, str) else schema
+        self.key = key
+        self.lookup_key = lookup_key
+        self.file = file
+        self.directory = directory
+        self.pattern = pattern
+        self.header = header
+        self.separator = separator
+        self.index_directory = index_directory
+        self.interval = interval
+
+    def populate(self, topology, stream, schema, name, **options):
+        fn = _lookup._CSVLookup(self.file, self.directory, self.pattern, self.schema, self.key,
+            self.lookup_key or self.key, self.header, self.separator or ',', self.index_directory, self.interval)
+        return stream.map(fn, schema=schema, name=name)
+
+
 class LineFilesReader(streamsx.topology.composite.Map):
     """Reads files line by line given by input stream and generates tuples with the file content on the output stream.
 
@@ -778,7 +1056,7 @@ class LineFilesReader(streamsx.topology.composite.Map):
 
     Args:
         file_name(str): Each output tuple contains the name of the file that the tuple is read from. Ensure that the name given with this parameter is part of the output schema.
-        compression(str): Specifies that the source file is compressed. There are three valid values, representing available compression algorithms. These values are: zlib, gzip, and bzip2. For example, use `Compression.gzip.name` for gzip.
+        compression(str): Specifies that the source file is compressed. There are five valid values, representing available compression algorithms. These values are: zlib, gzip, bzip2, zstd and lz4 (zstd and lz4 are only supported by local execution). For example, use `Compression.gzip.name` for gzip.
             
     .. versionadded:: 1.5
 
@@ -862,6 +1140,20 @@ class _DirectoryScan(streamsx.spl.op.Source):
             params['ignoreExistingFilesAtStartup'] = ignoreExistingFilesAtStartup
         super(_DirectoryScan, self).__init__(topology,kind,schemas,params,name)
 
+    def _generate(self, opjson):
+        if getattr(self, '_local_options', {}).get('shard') is not None:
+            # Each sharded operator would scan every file.
+            raise ValueError("Sharding a directory scan is only supported by local execution.")
+        super(_DirectoryScan, self)._generate(opjson)
+
+
+# Compression algorithms implemented only by local execution.
+_LOCAL_COMPRESSIONS = (Compression.zstd.name, Compression.lz4.name)
+
+def _check_compression(compression):
+    value = str(getattr(compression, '_value', compression))
+    if value in _LOCAL_COMPRESSIONS:
+        raise ValueError("Compression " + value + " is only supported by local execution.")
 
 class _FileSource(streamsx.spl.op.Invoke):
     
@@ -906,6 +1198,12 @@ class _FileSource(streamsx.spl.op.Invoke):
         if ignoreExtraCSVValues is not None:
             params['ignoreExtraCSVValues'] = ignoreExtraCSVValues
         super(_FileSource, self).__init__(topology,kind,inputs,schemas,params,name)
+
+    def _generate(self, opjson):
+        if getattr(self, '_batch_size', None):
+            raise ValueError("Reading CSV files as batches of columns is only supported by local execution.")
+        _check_compression(self.params.get('compression'))
+        super(_FileSource, self)._generate(opjson)
    
 
 class _FileSink(streamsx.spl.op.Invoke):
@@ -957,3 +1255,7 @@ class _FileSink(streamsx.spl.op.Invoke):
         if writeStateHandlerCallbacks is not None:
             params['writeStateHandlerCallbacks'] = writeStateHandlerCallbacks
         super(_FileSink, self).__init__(topology,kind,inputs,schema,params,name)
+
+    def _generate(self, opjson):
+        _check_compression(self.params.get('compression'))
+        super(_FileSink, self)._generate(opjson)
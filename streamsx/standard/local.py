@@ -0,0 +1,76 @@
+# coding=utf-8
+# Licensed Materials - Property of IBM
+# Copyright IBM Corp. 2020
+"""
+Local execution of topologies.
+
+Topologies declared using the composites and functions of
+:py:mod:`streamsx.standard.files`, :py:mod:`streamsx.standard.relational`
+and :py:mod:`streamsx.standard.utility` together with Python callables
+(``Stream.map``, ``Stream.for_each`` etc.) can be executed within the
+current Python process without an IBM Streams build or instance.
+
+Each operator in the topology runs on its own thread. Tuples are handed
+off between operators in batches through bounded queues, so that a
+fast upstream operator is blocked rather than consuming unbounded memory
+and the synchronization cost is amortized across the tuples of a batch.
+
+Local execution is intended for testing pipelines and measuring
+their throughput, for example in continuous integration.
+
+Example of executing a topology locally::
+
+    from streamsx.topology.topology import Topology
+    import streamsx.standard.local as local
+    import streamsx.standard.utility as U
+
+    topo = Topology()
+    s = topo.source(U.Sequence(iterations=100000))
+    s = s.map(lambda t : t['seq'] * 2)
+    results = []
+    s.for_each(results.append)
+
+    job = local.run(topo)
+    print(job.metrics)
+
+Tuples of structured schemas are represented as ``dict`` instances,
+tuples of ``CommonSchema.String`` as ``str`` instances and tuples
+of ``CommonSchema.Python`` and ``CommonSchema.Json`` as the Python
+objects themselves.
+
+.. note:: SPL expressions, for example the ``filter`` of :py:class:`~streamsx.standard.relational.Filter`, are supported for attribute references, literals, arithmetic, comparison and logical operators, casts to primitive types and a subset of SPL functions.
+
+.. versionadded:: 1.6
+"""
+
+from streamsx.standard._engine import LocalJob
+
+import streamsx.standard._local_utility
+import streamsx.standard._local_relational
+import streamsx.standard._local_files
+
+__all__ = ['LocalJob', 'run']
+
+def run(topology, timeout=None, batch_size=1024, queue_size=64, app_dir=None, data_dir=None):
+    """Execute a topology locally.
+
+    Blocks until the topology completes, that is all sources
+    are exhausted and all tuples have been processed, or `timeout`
+    expires in which case the execution is cancelled.
+
+    Args:
+        topology(Topology): Topology to execute.
+        timeout(float): Maximum execution time in seconds, `None` to wait for completion.
+        batch_size(int): Maximum number of tuples handed off between operators as a single batch.
+        queue_size(int): Maximum number of batches queued for an operator before upstream operators are blocked.
+        app_dir(str): Application directory, defaults to the current working directory.
+        data_dir(str): Data directory, defaults to the current working directory.
+
+    Returns:
+        LocalJob: Completed (or cancelled) execution.
+    """
+    job = LocalJob(topology, batch_size=batch_size, queue_size=queue_size, app_dir=app_dir, data_dir=data_dir)
+    job.start()
+    if not job.join(timeout):
+        job.cancel()
+    return job
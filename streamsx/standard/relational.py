@@ -5,6 +5,10 @@
 Stream transformations using relational predicates.
 """
 
+import collections
+import datetime
+import re
+
 from streamsx.spl.op import Invoke, Map
 
 import streamsx.standard._version
@@ -84,6 +88,67 @@ class Aggregate(Map):
                  _op.params['partitionBy'] =  _op.attribute(window._config['partitionBy'])
         return _op
   
+    @staticmethod
+    def invoke_windows(stream, windows, trigger, schema, group=None, attribute='window', name=None):
+        """Invoke aggregations against multiple sliding time windows of a stream.
+
+        Aggregations are performed against each window in `windows` every
+        `trigger` period, with the output attribute `attribute` set to the
+        label of the window. The windows share a single store of *panes*,
+        consecutive time slices of the stream pre-aggregated by group, and
+        each window's aggregation is computed by merging its panes.
+        Thus memory and processing scale with the number of panes
+        rather than the number of windows and tuples.
+
+        The pane duration is the greatest common divisor of the window
+        sizes and the trigger period, thus windows and trigger should be
+        multiples of a common duration, for example a whole number of seconds.
+
+        Example of the average reading over the last one, five and
+        fifteen minutes, grouped by sensor and updating every minute::
+
+            schema = 'tuple<int32 id, rstring window, float64 avg_reading>'
+            windows = {'1m': datetime.timedelta(minutes=1),
+                       '5m': datetime.timedelta(minutes=5),
+                       '15m': datetime.timedelta(minutes=15)}
+
+            agg = Aggregate.invoke_windows(readings, windows, datetime.timedelta(minutes=1), schema, group='id')
+            agg.avg_reading = agg.average('reading')
+
+        Args:
+            stream(Stream): Stream to aggregate.
+            windows(dict): Mapping of a window label to the window size as a ``datetime.timedelta``.
+            trigger(datetime.timedelta): Period between aggregations.
+            schema(str,StreamSchema): Schema of output stream containing aggregations.
+            group(str): Attribute name to group aggregations.
+            attribute(str): Output attribute of type ``rstring`` set to the window label.
+            name(str): Invocation name, defaults to a generated name.
+
+        Returns:
+             Aggregate: Aggregate invocation.
+
+        .. note:: The SPL ``Aggregate`` operator aggregates a single window, an aggregation using ``invoke_windows`` can only be executed by :py:mod:`streamsx.standard.local`.
+
+        .. versionadded:: 1.6
+        """
+        if not windows:
+            raise ValueError("At least one window is required.")
+        if not isinstance(trigger, datetime.timedelta):
+            raise TypeError(trigger)
+        sizes = []
+        for label, size in windows.items():
+            if not isinstance(size, datetime.timedelta):
+                raise TypeError(size)
+            if size.total_seconds() <= 0:
+                raise ValueError("Window size must be positive: " + str(size))
+            sizes.append((size.total_seconds(), str(label)))
+        sizes.sort()
+        window = stream.last(datetime.timedelta(seconds=sizes[-1][0])).trigger(trigger)
+        _op = Aggregate(window, schema, group, name=name)
+        _op._windows = collections.OrderedDict((label, size) for size, label in sizes)
+        _op._window_attribute = attribute
+        return _op
+
     def _output_func(self, name, attribute=None):
         _eofn = name + '('
         if attribute is not None:
@@ -322,7 +387,7 @@ class Aggregate(Map):
             schema = 'tuple<int32 id, timestamp ts, float64 sd_reading>'
 
             agg = Aggregate.invoke(s.last(10), schema, group='id')
-            agg.sd_reading = agg.standard_('reading')
+            agg.sd_reading = agg.std('reading')
 
         Args:
             attribute(str): Attribute name to find the average value of.
@@ -333,6 +398,151 @@ class Aggregate(Map):
         """
         return self._output_func('SampleStdDev' if sample else 'PopulationStdDev', attribute)
 
+    def percentile(self, attribute, q):
+        """Approximate percentile of values for an input attribute.
+
+        Returns an output expression representing the value below which
+        `q` percent of the values of the input attribute in the group fall.
+
+        The percentile is approximated using a *t-digest* so that memory
+        per group is bounded regardless of the number of tuples in the
+        window, with accuracy highest for percentiles near 0 and 100.
+
+        The bound applies to the per-group summary. A sliding window also
+        retains the arrival time and group of each tuple for eviction,
+        and the tuple itself when other output functions of the aggregation
+        need it to be evicted, so that memory remains linear in window size.
+
+        Example::
+
+            # Get the median and 99th percentile of readings of the last
+            # ten minutes grouped by sensor id, updating every minute.
+            schema = 'tuple<int32 id, timestamp ts, float64 p50, float64 p99>'
+
+            win = s.last(datetime.timedelta(minutes=10)).trigger(datetime.timedelta(minutes=1))
+            agg = Aggregate.invoke(win, schema, group='id')
+            agg.p50 = agg.percentile('reading', 50)
+            agg.p99 = agg.percentile('reading', 99)
+
+        Args:
+            attribute(str): Attribute name to find the percentile of.
+            q(float): Percentile to compute, between 0 and 100 inclusive.
+
+        Returns:
+            Expression: Output expression with the type ``float64``.
+
+        .. note:: The SPL ``Aggregate`` operator has no percentile output function, an aggregation using ``percentile`` can only be executed by :py:mod:`streamsx.standard.local`.
+
+        .. versionadded:: 1.6
+        """
+        q = float(q)
+        if not 0.0 <= q <= 100.0:
+            raise ValueError("Percentile must be between 0 and 100: " + str(q))
+        return self._output_func('Percentile', attribute + ', ' + repr(q))
+
+    def count_distinct(self, attribute, error=0.01):
+        """Approximate count of distinct values for an input attribute.
+
+        Returns an output expression representing the number of distinct
+        values of the input attribute in the group.
+
+        When executed locally the count is estimated using a *HyperLogLog*
+        sketch whose size depends only on `error`, not on the number of
+        distinct values, so high cardinality attributes such as user
+        identifiers can be counted with bounded memory per group.
+        The SPL ``Aggregate`` operator counts distinct values exactly.
+
+        On a sliding window values are summarized in blocks and the oldest
+        block, which is partially evicted, is counted either in full or not
+        at all. This adds an error of up to half of its values, which are a
+        few percent of the window, in addition to `error`. As with
+        :py:meth:`percentile` a sliding window retains the arrival time
+        and group of each tuple for eviction.
+
+        Example::
+
+            # Count the number of distinct sensors reporting in the last hour.
+            schema = 'tuple<int32 sensors>'
+
+            agg = Aggregate.invoke(s.last(datetime.timedelta(hours=1)), schema)
+            agg.sensors = agg.count_distinct('id')
+
+        Args:
+            attribute(str): Attribute name to count the distinct values of.
+            error(float): Relative standard error of the approximate count, ``None`` for an exact count.
+
+        Returns:
+            Expression: Output expression with the type ``int32``.
+
+        .. versionadded:: 1.6
+        """
+        if error is None:
+            return self._output_func('CountDistinct', attribute)
+        error = float(error)
+        if not 0.0 < error < 1.0:
+            raise ValueError("Error must be between 0 and 1: " + str(error))
+        return self._output_func('CountDistinct', attribute + ', ' + repr(error))
+
+    def top_k(self, attribute, k):
+        """Most frequent values of an input attribute.
+
+        Returns an output expression representing a list of the `k`
+        most frequent values of the input attribute in the group,
+        most frequent first.
+
+        The frequencies are approximated using a *Space-Saving* summary
+        that counts at most ``10 * k`` values, so memory is bounded by `k`
+        regardless of the number of distinct values in the window. Any value
+        occurring in more than a ``1 / (10 * k)`` fraction of the tuples is
+        guaranteed to be counted. As with :py:meth:`percentile` a sliding
+        window retains the arrival time and group of each tuple for eviction.
+
+        Example::
+
+            # Get the ten most active users of the last five minutes
+            # updating every ten seconds.
+            schema = 'tuple<list<rstring> users>'
+
+            win = s.last(datetime.timedelta(minutes=5)).trigger(datetime.timedelta(seconds=10))
+            agg = Aggregate.invoke(win, schema)
+            agg.users = agg.top_k('user', 10)
+
+        Args:
+            attribute(str): Attribute name to find the most frequent values of.
+            k(int): Number of values.
+
+        Returns:
+            Expression: Output expression with the type ``list<T>`` where ``T`` is the type of the input attribute.
+
+        .. note:: The SPL ``Aggregate`` operator has no top-k output function, an aggregation using ``top_k`` can only be executed by :py:mod:`streamsx.standard.local`.
+
+        .. versionadded:: 1.6
+        """
+        k = int(k)
+        if k < 1:
+            raise ValueError("k must be at least 1: " + str(k))
+        return self._output_func('TopK', attribute + ', ' + str(k))
+
+    def _generate(self, opjson):
+        if getattr(self, '_windows', None):
+            raise ValueError("Aggregation of multiple windows is only supported by local execution.")
+        for attr, e in self.__dict__.items():
+            if self._is_output_assignment_expression(e) and str(e._value).split('(')[0] in _LOCAL_FUNCTIONS:
+                raise ValueError("Output function of attribute " + attr + " is only supported by local execution: " + str(e._value))
+        super(Aggregate, self)._generate(opjson)
+        # The error of an approximate output function only applies to
+        # local execution, SPL computes the exact value.
+        for port in opjson['outputs']:
+            for assign in port.get('assigns', {}).values():
+                m = _APPROXIMATE_FUNCTION.match(str(assign['value']))
+                if m is not None:
+                    assign['value'] = m.group(1) + '(' + m.group(2) + ')'
+
+# Aggregate output functions implemented only by local execution.
+_LOCAL_FUNCTIONS = ('Percentile', 'TopK')
+
+_APPROXIMATE_FUNCTION = re.compile(r'^(CountDistinct)\((.*),\s*[0-9.eE+-]+\)$')
+
 
 class Filter(Invoke):
     """Removes tuples from a stream by passing along only those tuples that satisfy a user-specified condition.
@@ -485,6 +695,64 @@ class Join(Invoke):
 
         return _op
 
+    @staticmethod
+    def band(left, left_attribute, right, right_attribute, lower, upper, schema, match=None, name=None):
+        """Correlate tuples from two windows whose values of an attribute are within a band.
+
+        A tuple from `left` matches a tuple from `right` when
+        ``lower <= right_attribute - left_attribute <= upper``,
+        for example a time proximity join between event streams
+        where ``abs(left.ts - right.ts) <= 5.0`` is declared as::
+
+            j = Join.band(left.last(1000), 'ts', right.last(1000), 'ts', -5.0, 5.0, schema)
+
+        When a tuple is received on an input port it is compared against
+        the tuples in the window of the opposing input port with attribute
+        values within the band, and then inserted into its window.
+
+        Args:
+            left(streamsx.topology.topology.Window): Left input window.
+            left_attribute(str): Name of the numeric band attribute of the left input.
+            right(streamsx.topology.topology.Window): Right input window.
+            right_attribute(str): Name of the numeric band attribute of the right input.
+            lower(float): Lower bound of the difference of the right and left values.
+            upper(float): Upper bound of the difference of the right and left values.
+            schema(str,StreamSchema): Schema of output stream.
+            match(str): Additional expression to be used for matching the tuples. The expression might refer to attributes from both input ports.
+            name(str): Invocation name, defaults to a generated name.
+
+        Returns:
+             Join: Join invocation.
+
+        .. note:: When executed locally each window is indexed sorted by the band attribute so that the cost of a tuple is logarithmic in the window size plus the number of matches. The ``spl.relational::Join`` operator evaluates the band as a match expression against each tuple in the window.
+
+        .. versionadded:: 1.6
+        """
+        if not isinstance(left, streamsx.topology.topology.Window):
+            raise TypeError(left)
+        if not isinstance(right, streamsx.topology.topology.Window):
+            raise TypeError(right)
+        lower = float(lower)
+        upper = float(upper)
+        if lower > upper:
+            raise ValueError("Lower bound of band greater than upper bound: " + str(lower) + " > " + str(upper))
+
+        _op = Join(left, right, schemas=schema, name=name)
+        lattr = _op.attribute(left.stream, left_attribute)
+        rattr = _op.attribute(right.stream, right_attribute)
+        diff = '(float64)(' + str(rattr) + ' - ' + str(lattr) + ')'
+        expr = diff + ' >= ' + repr(lower) + ' && ' + diff + ' <= ' + repr(upper)
+        if match is not None:
+            expr = '(' + expr + ') && (' + str(match) + ')'
+        _op.params['match'] = _op.expression(expr)
+        _op._band = (lattr, rattr, lower, upper, match)
+
+        for window, param in ((left, 'partitionByLHS'), (right, 'partitionByRHS')):
+            if window._config is not None and window._config.get('partitioned'):
+                _op.params[param] = _op.attribute(window.stream, window._config['partitionBy'])
+
+        return _op
+
     def __init__(self, left, right, schemas, match=None, name=None):
         topology = left.topology
         kind="spl.relational::Join"
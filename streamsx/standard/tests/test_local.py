@@ -0,0 +1,823 @@
+from unittest import TestCase
+
+import streamsx.standard._local_files as _local_files
+import streamsx.standard._local_utility as _local_utility
+import streamsx.standard._lookup as _lookup
+import streamsx.standard.files as files
+import streamsx.standard.local as local
+import streamsx.standard.relational as R
+import streamsx.standard.utility as U
+import streamsx.spl.op
+
+from streamsx.standard import Schedule
+from streamsx.topology.topology import Topology
+from streamsx.topology.schema import StreamSchema
+
+import datetime
+import multiprocessing
+import multiprocessing.pool
+import os
+import tempfile
+import threading
+import time
+import shutil
+import zlib
+
+
+class Collect(object):
+    def __init__(self):
+        self.items = []
+    def __call__(self, t):
+        self.items.append(t)
+
+
+def _square(t):
+    if t['v'] % 10:
+        return {'v': t['v'], 'sq': t['v'] * t['v']}
+
+
+class TestLocal(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_sequence(self):
+        topo = Topology()
+        s = topo.source(U.Sequence(iterations=5000))
+        s = s.map(lambda t : t['seq'])
+        c = Collect()
+        s.for_each(c)
+
+        job = local.run(topo, batch_size=64, timeout=30)
+        self.assertEqual(list(range(5000)), c.items)
+        self.assertEqual(5000, job.metrics['Sequence(5000)']['tuples_out'])
+
+    def test_batch_aggregate(self):
+        topo = Topology()
+        s = topo.source(U.Sequence(iterations=122))
+        w = s.batch(size=10)
+        a = R.Aggregate.invoke(w, 'tuple<int32 acount, int32 acount_all, uint64 amax>')
+        a.acount = a.count()
+        a.acount_all = a.count_all()
+        a.amax = a.max('seq')
+        c = Collect()
+        a.stream.for_each(c)
+
+        local.run(topo, timeout=30)
+        expected = [{'acount':10, 'acount_all':10, 'amax':i+10-1} for i in range(0, 120, 10)]
+        self.assertEqual(expected, c.items)
+
+    def test_sliding_aggregate(self):
+        topo = Topology()
+        s = topo.source(U.Sequence(iterations=500))
+        s = s.map(lambda t : {'g': t['seq'] % 3, 'v': (t['seq'] * 7919) % 101}, schema='tuple<int32 g, int32 v>')
+        a = R.Aggregate.invoke(s.last(25).trigger(5), 'tuple<int32 g, int32 n, int32 vmin, int32 vmax, int32 vsum, int32 vfirst>', group='g')
+        a.n = a.count()
+        a.vmin = a.min('v')
+        a.vmax = a.max('v')
+        a.vsum = a.sum('v')
+        a.vfirst = a.first('v')
+        c = Collect()
+        a.stream.for_each(c)
+
+        local.run(topo, timeout=30)
+        values = [(i % 3, (i * 7919) % 101) for i in range(500)]
+        key = lambda t: t['g']
+        expected = []
+        for end in range(5, 501, 5):
+            window = values[max(0, end-25):end]
+            results = []
+            for g in set(w[0] for w in window):
+                vs = [v for k, v in window if k == g]
+                results.append({'g':g, 'n':len(vs), 'vmin':min(vs), 'vmax':max(vs), 'vsum':sum(vs), 'vfirst':vs[0]})
+            self.assertEqual(sorted(results, key=key), sorted(c.items[len(expected):len(expected)+len(results)], key=key))
+            expected.extend(results)
+        self.assertEqual(len(expected), len(c.items))
+
+    def test_percentile(self):
+        topo = Topology()
+        s = topo.source(U.Sequence(iterations=3000))
+        a = R.Aggregate.invoke(s.batch(1000), 'tuple<float64 p50, float64 p99>')
+        a.p50 = a.percentile('seq', 50)
+        a.p99 = a.percentile('seq', 99)
+        c = Collect()
+        a.stream.for_each(c)
+
+        local.run(topo, timeout=30)
+        self.assertEqual(3, len(c.items))
+        for i, t in enumerate(c.items):
+            self.assertAlmostEqual(i*1000 + 500, t['p50'], delta=5)
+            self.assertAlmostEqual(i*1000 + 990, t['p99'], delta=2)
+        self.assertRaises(ValueError, topo.graph.generateSPLGraph)
+        self.assertRaises(ValueError, a.percentile, 'seq', 101)
+
+    def test_count_distinct(self):
+        topo = Topology()
+        s = topo.source(U.Sequence(iterations=6000))
+        s = s.map(lambda t : {'user': 'u' + str(t['seq'] % 1500)}, schema='tuple<rstring user>')
+        a = R.Aggregate.invoke(s.batch(3000), 'tuple<int32 users, int32 exact>')
+        a.users = a.count_distinct('user')
+        a.exact = a.count_distinct('user', error=None)
+        w = R.Aggregate.invoke(s.last(1000).trigger(1000), 'tuple<int32 users>')
+        w.users = w.count_distinct('user', error=0.02)
+        c = Collect()
+        a.stream.for_each(c)
+        cw = Collect()
+        w.stream.for_each(cw)
+
+        local.run(topo, timeout=30)
+        self.assertEqual(2, len(c.items))
+        for t in c.items:
+            self.assertAlmostEqual(1500, t['users'], delta=30)
+            self.assertEqual(1500, t['exact'])
+        self.assertEqual(6, len(cw.items))
+        for t in cw.items:
+            self.assertAlmostEqual(1000, t['users'], delta=60)
+
+        assigns = [op['outputs'][0]['assigns'] for op in topo.graph.generateSPLGraph()['operators'] if op['kind'] == 'spl.relational::Aggregate']
+        self.assertEqual({'type':'splexpr', 'value':'CountDistinct(user)'}, assigns[0]['users'])
+
+    def test_top_k(self):
+        topo = Topology()
+        s = topo.source(U.Sequence(iterations=20000))
+        # user i occurs about 2000/(i+1) times in every 10000 tuples
+        s = s.map(lambda t : {'user': 'u' + str(int(1 / (1 - (t['seq'] % 10000) / 10000.0) - 1))}, schema='tuple<rstring user>')
+        a = R.Aggregate.invoke(s.batch(10000), 'tuple<list<rstring> users>')
+        a.users = a.top_k('user', 3)
+        c = Collect()
+        a.stream.for_each(c)
+
+        local.run(topo, timeout=30)
+        self.assertEqual([{'users':['u0', 'u1', 'u2']}] * 2, c.items)
+        self.assertRaises(ValueError, topo.graph.generateSPLGraph)
+
+    def test_aggregate_windows(self):
+        topo = Topology()
+        s = topo.source(U.Sequence(period=0.01))
+        s = s.map(lambda t : {'g': t['seq'] % 2, 'v': t['seq']}, schema='tuple<int32 g, uint64 v>')
+        windows = {'long': datetime.timedelta(seconds=0.6), 'short': datetime.timedelta(seconds=0.2)}
+        a = R.Aggregate.invoke_windows(s, windows, datetime.timedelta(seconds=0.2), 'tuple<rstring window, int32 g, int32 n, uint64 vmin, uint64 vmax>', group='g')
+        a.n = a.count()
+        a.vmin = a.min('v')
+        a.vmax = a.max('v')
+        c = Collect()
+        a.stream.for_each(c)
+
+        local.run(topo, timeout=1.5)
+        self.assertTrue(len(c.items) >= 16)
+        # Each trigger produces the short then the long window for both groups.
+        for i in range(0, len(c.items) - 3, 4):
+            short = c.items[i:i+2]
+            long = c.items[i+2:i+4]
+            self.assertEqual(['short', 'short', 'long', 'long'], [t['window'] for t in short + long])
+            for st, lt in zip(short, long):
+                self.assertEqual(st['g'], lt['g'])
+                self.assertEqual(st['vmax'], lt['vmax'])
+                self.assertTrue(lt['vmin'] <= st['vmin'])
+                self.assertTrue(st['n'] <= lt['n'] <= 4 * st['n'])
+        self.assertRaises(ValueError, topo.graph.generateSPLGraph)
+
+    def test_filter_functor(self):
+        topo = Topology()
+        s = topo.source(U.Sequence(iterations=10))
+        matches, non_matches = R.Filter.matching(s, filter='seq>=2ul && seq<5ul', non_matching=True)
+        fo = R.Functor.map(s, StreamSchema('tuple<uint64 seq, uint64 double>'), filter='seq>=8ul')
+        fo.double = fo.output(fo.outputs[0], 'seq * 2ul')
+        cm = Collect()
+        matches.for_each(cm)
+        cn = Collect()
+        non_matches.for_each(cn)
+        cf = Collect()
+        fo.outputs[0].for_each(cf)
+
+        local.run(topo, timeout=30)
+        self.assertEqual([2, 3, 4], [t['seq'] for t in cm.items])
+        self.assertEqual(7, len(cn.items))
+        self.assertEqual([{'seq':8, 'double':16}, {'seq':9, 'double':18}], cf.items)
+
+    def test_csv_read_write(self):
+        topo = Topology()
+        s = topo.source(range(13))
+        sch = 'tuple<rstring a, int32 b>'
+        s = s.map(lambda v: ('A'+str(v), v+7), schema=sch)
+        fn = os.path.join(self.dir, 'data.csv')
+        s.for_each(files.CSVWriter(fn))
+        local.run(topo, timeout=30)
+
+        topo = Topology()
+        r = topo.source(files.CSVReader(schema=sch, file=fn))
+        c = Collect()
+        r.for_each(c)
+        local.run(topo, timeout=30)
+        self.assertEqual([{'a':'A'+str(v), 'b':v+7} for v in range(13)], c.items)
+
+    def test_csv_columns(self):
+        fn = os.path.join(self.dir, 'data.csv')
+        with open(fn, 'w') as f:
+            f.write('a,b,c\n')
+            for v in range(25):
+                f.write('"A,{0}",{0},{1}\n'.format(v, v / 4))
+        sch = 'tuple<rstring a, int64 b, float64 c>'
+        topo = Topology()
+        r = topo.source(files.CSVReader(schema=sch, file=fn, header=True, batch_size=10))
+        c = Collect()
+        r.for_each(c)
+        local.run(topo, timeout=30)
+        self.assertEqual([10, 10, 5], [len(t['b']) for t in c.items])
+        self.assertEqual(['A,' + str(v) for v in range(25)], [a for t in c.items for a in t['a']])
+        self.assertEqual(list(range(25)), [b for t in c.items for b in t['b']])
+        self.assertEqual([v / 4 for v in range(25)], [x for t in c.items for x in t['c']])
+        self.assertNotIsInstance(c.items[0]['b'], list)
+
+    def test_csv_ragged(self):
+        # Rows and batches of columns handle short and long rows alike.
+        fn = os.path.join(self.dir, 'ragged.csv')
+        with open(fn, 'w') as f:
+            f.write('1,2\n\n3,4,5\n')
+        for batch_size in (None, 10):
+            topo = Topology()
+            r = topo.source(files.CSVReader(schema='tuple<int32 a, int32 b>', file=fn, batch_size=batch_size, ignoreExtraFields=True))
+            c = Collect()
+            r.for_each(c)
+            local.run(topo, timeout=30)
+            items = c.items if batch_size is None else [dict(zip(t, v)) for t in c.items for v in zip(*t.values())]
+            self.assertEqual([{'a': 1, 'b': 2}, {'a': 3, 'b': 4}], items)
+        with open(fn, 'a') as f:
+            f.write('6\n')
+        for batch_size in (None, 10):
+            topo = Topology()
+            r = topo.source(files.CSVReader(schema='tuple<int32 a, int32 b>', file=fn, batch_size=batch_size, ignoreExtraFields=True))
+            r.for_each(Collect())
+            self.assertRaises(ValueError, local.run, topo, timeout=30)
+
+    def test_csv_parallel(self):
+        fn = os.path.join(self.dir, 'data.csv')
+        with open(fn, 'w') as f:
+            f.write('a,b\n')
+            for v in range(20000):
+                # Quoted values with newlines and quotes.
+                if v % 7 == 0:
+                    f.write('"A\n""{0}""",{0}\n'.format(v))
+                else:
+                    f.write('A{0},{0}\n'.format(v))
+        expected = [{'a': 'A\n"{0}"'.format(v) if v % 7 == 0 else 'A' + str(v), 'b': v} for v in range(20000)]
+        sch = 'tuple<rstring a, int32 b>'
+
+        with open(fn, 'rb') as f:
+            ranges = _local_files._ranges(f.read(), True, 4096)
+        self.assertTrue(len(ranges) > 10)
+
+        for preserve in (True, False):
+            topo = Topology()
+            r = topo.source(files.CSVReader(schema=sch, file=fn, header=True, processes=3, preserve_order=preserve))
+            c = Collect()
+            r.for_each(c)
+            local.run(topo, timeout=60)
+            if preserve:
+                self.assertEqual(expected, c.items)
+            else:
+                self.assertEqual(expected, sorted(c.items, key=lambda t: t['b']))
+
+    def test_bounded_map(self):
+        # Ranges are only submitted as results are consumed.
+        submitted = []
+        def tasks():
+            for i in range(40):
+                submitted.append(i)
+                yield i
+        with multiprocessing.pool.ThreadPool(3) as pool:
+            for ordered in (True, False):
+                del submitted[:]
+                results = []
+                for r in _local_files._bounded_map(pool, lambda i: i * i, tasks(), 6, ordered):
+                    self.assertTrue(len(submitted) - len(results) <= 6)
+                    time.sleep(0.005)
+                    results.append(r)
+                expected = [i * i for i in range(40)]
+                self.assertEqual(expected, results if ordered else sorted(results))
+
+    def test_block_memory_map(self):
+        fn = os.path.join(self.dir, 'data.bin')
+        data = bytes(range(256)) * 40
+        with open(fn, 'wb') as f:
+            f.write(data)
+        topo = Topology()
+        s = topo.source([fn])
+        r = s.map(files.BlockFilesReader(block_size=4096, memory_map=True), schema='tuple<blob data>')
+        c = Collect()
+        r.for_each(c)
+        local.run(topo, timeout=30)
+        self.assertEqual([4096, 4096, 2048], [len(t['data']) for t in c.items])
+        self.assertIsInstance(c.items[0]['data'], memoryview)
+        self.assertEqual(data, b''.join(t['data'] for t in c.items))
+        self.assertRaises(ValueError, topo.source([fn]).map, files.BlockFilesReader(compression='gzip', memory_map=True), schema='tuple<blob data>')
+
+    def test_compression(self):
+        codecs = ['zlib', 'gzip', 'bzip2']
+        for module in ('zstandard', 'lz4'):
+            try:
+                __import__(module)
+                codecs.append('zstd' if module == 'zstandard' else 'lz4')
+            except ImportError:
+                pass
+        sch = 'tuple<rstring a, int32 b>'
+        for codec in codecs:
+            fn = os.path.join(self.dir, 'data.' + codec)
+            topo = Topology()
+            s = topo.source(range(1000))
+            s = s.map(lambda v: ('A'+str(v), v), schema=sch)
+            s.for_each(files.FileSink(fn, compression=codec, compression_level=1))
+            local.run(topo, timeout=30)
+
+            topo = Topology()
+            r = topo.source(files.CSVReader(schema=sch, file=fn, compression=codec))
+            c = Collect()
+            r.for_each(c)
+            local.run(topo, timeout=30)
+            self.assertEqual([{'a':'A'+str(v), 'b':v} for v in range(1000)], c.items, codec)
+        self.assertRaises(ValueError, files._check_compression, streamsx.spl.op.Expression.expression('zstd'))
+
+    def test_compression_threads(self):
+        for codec in ('gzip', 'bzip2', 'zstd', 'lz4'):
+            try:
+                _local_files._block_compressor(codec, None)
+            except ImportError:
+                continue
+            fn = os.path.join(self.dir, 'data.' + codec)
+            topo = Topology()
+            s = topo.source(range(200000))
+            s = s.map(lambda v: 'line ' + str(v))
+            s.for_each(files.FileSink(fn, format='line', compression=codec, compression_threads=3))
+            local.run(topo, timeout=60)
+
+            with _local_files._open(fn, 'rb', codec) as f:
+                lines = f.read().decode('utf-8').splitlines()
+            self.assertEqual(['line ' + str(v) for v in range(200000)], lines, codec)
+
+        # Flushing does not cut a block into a member.
+        fn = os.path.join(self.dir, 'flushed.gz')
+        topo = Topology()
+        s = topo.source(range(10000))
+        s = s.map(lambda v: 'line ' + str(v))
+        s.for_each(files.FileSink(fn, format='line', compression='gzip', compression_threads=3, flush=1))
+        local.run(topo, timeout=60)
+        with open(fn, 'rb') as f:
+            d = zlib.decompressobj(wbits=31)
+            lines = d.decompress(f.read()).decode('utf-8').splitlines()
+        self.assertEqual(['line ' + str(v) for v in range(10000)], lines)
+        self.assertEqual(b'', d.unused_data)
+
+        topo = Topology()
+        s = topo.source(range(10))
+        self.assertRaises(ValueError, s.for_each, files.FileSink(os.path.join(self.dir, 'data'), compression='zlib', compression_threads=3))
+
+    def test_file_sink_pool(self):
+        topo = Topology()
+        s = topo.source(range(100))
+        s = s.map(lambda v: ('k' + str(v % 5), v), schema='tuple<rstring k, int32 v>')
+        fn = streamsx.spl.op.Expression.expression('"' + self.dir + '/" + k + ".csv"')
+        s.for_each(files.FileSink(fn, close_mode='dynamic', max_open_files=2, idle_timeout=10.0, suppress='k'))
+        local.run(topo, timeout=30)
+        for k in range(5):
+            with open(os.path.join(self.dir, 'k' + str(k) + '.csv')) as f:
+                self.assertEqual([str(v) for v in range(k, 100, 5)], f.read().splitlines())
+
+        # Files reopened by the pool are appended to as further members or frames.
+        for codec in ('gzip', 'bzip2', 'zstd', 'lz4'):
+            try:
+                _local_files._block_compressor(codec, None)
+            except ImportError:
+                continue
+            topo = Topology()
+            s = topo.source(range(100))
+            s = s.map(lambda v: ('k' + str(v % 5), v), schema='tuple<rstring k, int32 v>')
+            fn = streamsx.spl.op.Expression.expression('"' + self.dir + '/" + k + ".' + codec + '"')
+            s.for_each(files.FileSink(fn, close_mode='dynamic', max_open_files=2, suppress='k', compression=codec))
+            local.run(topo, batch_size=1, timeout=30)
+            for k in range(5):
+                with _local_files._open(os.path.join(self.dir, 'k' + str(k) + '.' + codec), 'rb', codec) as f:
+                    self.assertEqual([str(v) for v in range(k, 100, 5)], f.read().decode('utf-8').splitlines(), codec)
+        topo = Topology()
+        s = topo.source(range(10))
+        self.assertRaises(ValueError, s.for_each, files.FileSink(os.path.join(self.dir, 'data'), compression='zlib', max_open_files=2))
+
+    def test_join_lookup(self):
+        topo = Topology()
+        ref = topo.source([(i, 'N'+str(i)) for i in range(5)])
+        ref = ref.map(lambda x : x, schema='tuple<int32 id, rstring name>')
+        look = topo.source(U.Sequence(iterations=8, delay=0.5))
+        look = look.map(lambda t : {'id': t['seq']}, schema='tuple<int32 id>')
+        j = R.Join.lookup(ref.last(10), 'id', look, 'id', 'tuple<int32 id, rstring name>')
+        c = Collect()
+        j.outputs[0].for_each(c)
+
+        local.run(topo, timeout=30)
+        self.assertEqual([{'id':i, 'name':'N'+str(i)} for i in range(5)], c.items)
+
+    def test_join_partitioned(self):
+        topo = Topology()
+        # Versions 0, 1 and 2 of each id, the window retains the latest version of each id.
+        ref = topo.source([(i % 50, i // 50) for i in range(150)])
+        ref = ref.map(lambda x : x, schema='tuple<int32 id, int32 version>')
+        look = topo.source(U.Sequence(iterations=60, delay=0.5))
+        look = look.map(lambda t : {'id': t['seq']}, schema='tuple<int32 id>')
+        j = R.Join.lookup(ref.last(1).partition('id'), 'id', look, 'id', 'tuple<int32 id, int32 version>')
+        c = Collect()
+        j.outputs[0].for_each(c)
+
+        local.run(topo, timeout=30)
+        self.assertEqual([{'id':i, 'version':2} for i in range(50)], c.items)
+
+    def test_join_band(self):
+        topo = Topology()
+        left = topo.source([(i * 1.0, i) for i in range(300)])
+        left = left.map(lambda x : x, schema='tuple<float64 ts, int32 a>')
+        right = topo.source([(i * 1.0 + 0.3, i) for i in range(300)])
+        right = right.map(lambda x : x, schema='tuple<float64 tr, int32 b>')
+        j = R.Join.band(left.last(1000), 'ts', right.last(1000), 'tr', -1.0, 1.0, 'tuple<int32 a, int32 b>', match=right.name + '.b != 7')
+        c = Collect()
+        j.outputs[0].for_each(c)
+
+        local.run(topo, timeout=30)
+        expected = set((a, b) for a in range(300) for b in range(300) if abs(b + 0.3 - a) <= 1.0 and b != 7)
+        self.assertEqual(len(expected), len(c.items))
+        self.assertEqual(expected, set((t['a'], t['b']) for t in c.items))
+
+    def test_csv_lookup(self):
+        fn = os.path.join(self.dir, 'ref.csv')
+        with open(fn, 'w') as f:
+            f.write('id,name\n')
+            for i in range(1000):
+                f.write('{},"N,{}"\n'.format(i, i))
+            f.write('7,"Seven"\n')
+        topo = Topology()
+        s = topo.source(U.Sequence(iterations=20))
+        s = s.map(lambda t : {'seq': t['seq'], 'id': t['seq'] * 100 - 900}, schema='tuple<uint64 seq, int64 id>')
+        e = s.map(files.CSVLookup('tuple<int64 id, rstring name>', key='id', file=fn, header=True), schema='tuple<uint64 seq, int64 id, rstring name>')
+        c = Collect()
+        e.for_each(c)
+
+        local.run(topo, timeout=30)
+        self.assertEqual([{'seq':i, 'id':i*100-900, 'name':'N,'+str(i*100-900)} for i in range(9, 19)], c.items)
+        # Sized for the 1002 lines of the file, twice the slots rounded up.
+        self.assertEqual(_lookup._HEADER.size + _lookup._SLOT.size * 2048, os.path.getsize(fn + '.idx'))
+        self.assertEqual(['ref.csv', 'ref.csv.idx'], sorted(os.listdir(self.dir)))
+
+        lookup = _lookup._CSVLookup(None, self.dir, r'ref.*\.csv$', StreamSchema('tuple<int64 id, rstring name>'), 'id', 'id', True, ',', None, 0.0)
+        self.assertEqual('Seven', lookup({'id': 7})['name'])
+        with open(os.path.join(self.dir, 'tmp'), 'w') as f:
+            f.write('id,name\n7,Sieben\n')
+        os.utime(os.path.join(self.dir, 'tmp'), (time.time() + 10, time.time() + 10))
+        os.rename(os.path.join(self.dir, 'tmp'), os.path.join(self.dir, 'ref2.csv'))
+        for _ in range(100):
+            if lookup({'id': 7})['name'] == 'Sieben':
+                break
+            time.sleep(0.05)
+        self.assertEqual('Sieben', lookup({'id': 7})['name'])
+        self.assertIsNone(lookup({'id': 8}))
+        lookup.__exit__(None, None, None)
+
+    def test_directory_scan_watch(self):
+        scan = os.path.join(self.dir, 'scan')
+        os.mkdir(scan)
+        with open(os.path.join(scan, 'a.csv'), 'w') as f:
+            f.write('a')
+        topo = Topology()
+        s = topo.source(files.DirectoryScan(directory=scan, pattern='.*\\.csv$', sleep_time=60, watch=True))
+        s = s.map(os.path.basename)
+        c = Collect()
+        s.for_each(c)
+
+        job = local.LocalJob(topo)
+        job.start()
+        time.sleep(0.3)
+        with open(os.path.join(scan, 'b.csv'), 'w') as f:
+            f.write('b')
+        with open(os.path.join(scan, 'c.txt'), 'w') as f:
+            f.write('c')
+        tmp = os.path.join(self.dir, 'd.csv')
+        with open(tmp, 'w') as f:
+            f.write('d')
+        os.rename(tmp, os.path.join(scan, 'd.csv'))
+        # Files are emitted well before the next scan at 60 seconds.
+        job.join(1.5)
+        job.cancel()
+        self.assertEqual(['a.csv', 'b.csv', 'd.csv'], c.items)
+
+    def test_directory_scan_manifest(self):
+        scan = os.path.join(self.dir, 'scan')
+        os.mkdir(scan)
+        manifest = os.path.join(self.dir, 'manifest')
+        def write(name, data):
+            with open(os.path.join(scan, name), 'w') as f:
+                f.write(data)
+        def run():
+            topo = Topology()
+            s = topo.source(files.DirectoryScan(directory=scan, sleep_time=0.1, sort_by='name', manifest=manifest))
+            s = s.map(os.path.basename)
+            c = Collect()
+            s.for_each(c)
+            local.run(topo, timeout=0.5)
+            return c.items
+
+        write('a', 'a')
+        write('b', 'b')
+        self.assertEqual(['a', 'b'], run())
+        self.assertEqual([], run())
+        # Modified and new files are processed after a restart.
+        write('a', 'aa')
+        write('c', 'c')
+        os.remove(os.path.join(scan, 'b'))
+        self.assertEqual(['a', 'c'], run())
+
+        # Files are recorded when submitted, a file whose processing
+        # was interrupted is not submitted again (at most once).
+        write('d', 'd')
+        topo = Topology()
+        s = topo.source(files.DirectoryScan(directory=scan, sleep_time=0.1, manifest=manifest))
+        s = s.map(lambda n: (time.sleep(1.0), os.path.basename(n))[1])
+        c = Collect()
+        s.for_each(c)
+        local.run(topo, timeout=0.3)
+        self.assertEqual([], c.items)
+        self.assertEqual([], run())
+
+        for i in range(2100):
+            write('f%04d' % i, '')
+        self.assertEqual(2100, len(run()))
+        # Compacted while processing, dropping the records of
+        # the removed file b and of a before it was modified.
+        size = os.path.getsize(manifest)
+        self.assertEqual(len(_local_files._Manifest._MAGIC) + 24 * 2103, size)
+
+    def test_directory_scan_shard(self):
+        for i in range(40):
+            with open(os.path.join(self.dir, 'f%02d' % i), 'w') as f:
+                f.write(str(i))
+        topo = Topology()
+        collects = []
+        for i in range(3):
+            s = topo.source(files.DirectoryScan(directory=self.dir, sleep_time=0.1, shard=(i, 3)))
+            c = Collect()
+            s.map(os.path.basename).for_each(c)
+            collects.append(c)
+
+        local.run(topo, timeout=0.5)
+        names = [n for c in collects for n in c.items]
+        self.assertEqual(['f%02d' % i for i in range(40)], sorted(names))
+        self.assertTrue(all(c.items for c in collects))
+        self.assertRaises(ValueError, files.DirectoryScan, directory=self.dir, shard=(3, 3))
+        self.assertRaises(ValueError, topo.graph.generateSPLGraph)
+
+    def test_directory_scan_schedule(self):
+        sizes = {'a': 10, 'b': 3000, 'c': 20, 'd': 1000, 'e': 30}
+        for i, (name, size) in enumerate(sorted(sizes.items())):
+            path = os.path.join(self.dir, name)
+            with open(path, 'w') as f:
+                f.write('x' * size)
+            os.utime(path, (1000 + i, 1000 + i))
+        def run(schedule, budget):
+            topo = Topology()
+            s = topo.source(files.DirectoryScan(directory=self.dir, sleep_time=60, schedule=schedule, size_budget=budget))
+            c = Collect()
+            s.map(os.path.basename).for_each(c)
+            local.run(topo, timeout=0.5)
+            return c.items
+
+        self.assertEqual(['b', 'd', 'e', 'c', 'a'], run(Schedule.largest_first, None))
+        self.assertEqual(['b', 'd', 'a', 'c', 'e'], run('batch_small', 500))
+        # A single scan, emitting the oldest files within the budget.
+        self.assertEqual(['a'], run(Schedule.oldest_first, 100))
+        self.assertEqual(['a', 'b', 'c', 'd'], run(Schedule.oldest_first, 4050))
+
+        # Small files are batched without exceeding the budget.
+        class Scan(object):
+            schedule = 'batch_small'
+            size_budget = 100
+            def __init__(self):
+                self.batches = [[]]
+            def _order(self, candidates):
+                return list(candidates)
+            def _emit(self, entry, st):
+                self.batches[-1].append(st.st_size)
+            def flush(self):
+                if self.batches[-1]:
+                    self.batches.append([])
+        scan = Scan()
+        sizes = [60, 30, 20, 99, 1, 50, 50, 150]
+        candidates = [(None, os.stat_result((0,) * 6 + (size, 0, 0, 0))) for size in sizes]
+        self.assertEqual([], _local_files._DirectoryScan._dispatch(scan, candidates))
+        self.assertEqual([[150], [60, 30], [20], [99, 1], [50, 50]], scan.batches[:-1])
+
+    def test_spray_union(self):
+        topo = Topology()
+        s = topo.source(U.Sequence(iterations=2442))
+        outs = []
+        for so in U.spray(s, count=7):
+            outs.append(so.map(lambda x : (x['seq'], x['ts']), schema=U.SEQUENCE_SCHEMA))
+        s = outs[0].union(set(outs))
+        s = s.map(lambda t : t['seq'])
+        c = Collect()
+        s.for_each(c)
+
+        local.run(topo, batch_size=100, timeout=30)
+        self.assertEqual(list(range(2442)), sorted(c.items))
+
+        # Batches go to channels that are not busy, ties in turn.
+        def slow():
+            for v in range(4):
+                time.sleep(0.02)
+                yield v
+        topo = Topology()
+        s = topo.source(slow)
+        outs = []
+        for i, so in enumerate(U.spray(s, count=4)):
+            outs.append(so.map(lambda v, i=i: (time.sleep(0.3), i)[1]))
+        c = Collect()
+        outs[0].union(set(outs)).for_each(c)
+        local.run(topo, batch_size=1, timeout=30)
+        self.assertEqual([0, 1, 2, 3], sorted(c.items))
+
+    def test_spray_key(self):
+        topo = Topology()
+        s = topo.source(range(3000))
+        s = s.map(lambda v: ('c' + str(v % 37), v), schema='tuple<rstring customer, int32 v>')
+        collects = []
+        for so in U.spray(s, count=4, key='customer'):
+            c = Collect()
+            so.for_each(c)
+            collects.append(c)
+
+        local.run(topo, batch_size=100, timeout=30)
+        self.assertEqual(list(range(3000)), sorted(t['v'] for c in collects for t in c.items))
+        channels = {}
+        for i, c in enumerate(collects):
+            self.assertTrue(c.items)
+            # Tuples of a key are on a single stream in order.
+            self.assertEqual(sorted(c.items, key=lambda t: t['v']), c.items)
+            for t in c.items:
+                self.assertEqual(i, channels.setdefault(t['customer'], i))
+
+    def test_spray_batch(self):
+        topo = Topology()
+        s = topo.source(U.Sequence(iterations=5000))
+        outs = [so.map(lambda x : x['seq']) for so in U.spray(s, count=3, batch_size=64, linger=0.05)]
+        c = Collect()
+        outs[0].union(set(outs)).for_each(c)
+        local.run(topo, timeout=30)
+        self.assertEqual(list(range(5000)), sorted(c.items))
+
+        # Partial micro-batches are handed off after the linger time.
+        topo = Topology()
+        s = topo.source(U.Sequence(iterations=20, period=0.02))
+        outs = [so.map(lambda x : time.monotonic()) for so in U.spray(s, count=2, key='seq', batch_size=1000, linger=0.05)]
+        c = Collect()
+        outs[0].union(set(outs)).for_each(c)
+        local.run(topo, timeout=30)
+        self.assertEqual(20, len(c.items))
+        self.assertTrue(max(c.items) - min(c.items) > 0.2)
+
+        self.assertRaises(ValueError, U.spray, s, count=2, batch_size=0)
+        self.assertRaises(ValueError, U.spray, s, count=2, batch_size=10, linger=-1.0)
+        self.assertRaises(ValueError, U.spray, s, count=2, linger=0.05)
+
+    def test_process_map(self):
+        topo = Topology()
+        s = topo.source(range(10000))
+        s = s.map(lambda v: {'v': v}, schema='tuple<int64 v>')
+        s = U.process_map(s, _square, processes=3, schema='tuple<int64 v, int64 sq>')
+        c = Collect()
+        s.for_each(c)
+        local.run(topo, batch_size=500, timeout=60)
+        self.assertEqual([{'v': v, 'sq': v * v} for v in range(10000) if v % 10], c.items)
+
+        # Workers are stopped when the job is cancelled.
+        topo = Topology()
+        s = topo.source(U.Sequence())
+        s = s.map(lambda t: {'v': t['seq']}, schema='tuple<int64 v>')
+        s = U.process_map(s, _square, processes=2, schema='tuple<int64 v, int64 sq>')
+        s.for_each(Collect())
+        start = time.monotonic()
+        local.run(topo, batch_size=500, timeout=1.0)
+        self.assertTrue(time.monotonic() - start < 10.0)
+        self.assertEqual([], multiprocessing.active_children())
+
+    def test_throttle(self):
+        # After an idle period a burst passes without delay, the rest at the rate.
+        def spike():
+            yield -1
+            time.sleep(0.5)
+            yield from range(60)
+        topo = Topology()
+        s = topo.source(spike)
+        s = s.map(U.Throttle(rate=100.0, burst=20))
+        s = s.map(lambda v: time.monotonic())
+        c = Collect()
+        s.for_each(c)
+        local.run(topo, batch_size=1, timeout=30)
+        self.assertEqual(61, len(c.items))
+        self.assertTrue(c.items[20] - c.items[1] < 0.1)
+        self.assertTrue(c.items[-1] - c.items[1] > 0.3)
+        self.assertRaises(ValueError, U.Throttle, rate=100.0, burst=20, period=1.0)
+
+        # The bucket starts full.
+        topo = Topology()
+        s = topo.source(range(12))
+        s = s.map(U.Throttle(rate=10.0, burst=5))
+        s = s.map(lambda v: time.monotonic())
+        c = Collect()
+        s.for_each(c)
+        local.run(topo, batch_size=1, timeout=30)
+        self.assertTrue(c.items[4] - c.items[0] < 0.05)
+        self.assertTrue(c.items[-1] - c.items[0] > 0.5)
+
+        # The rate is changed at runtime by the control stream.
+        topo = Topology()
+        s = topo.source(range(40))
+        control = topo.source(U.Sequence(iterations=1, delay=0.1)).map(lambda _: 1000.0)
+        s = U.throttle(s, rate=10.0, control=control, burst=1)
+        s = s.map(lambda v: time.monotonic())
+        c = Collect()
+        s.for_each(c)
+        start = time.monotonic()
+        local.run(topo, timeout=30)
+        self.assertEqual(40, len(c.items))
+        # At the initial rate 40 tuples would take four seconds.
+        self.assertTrue(c.items[-1] - start < 1.5)
+        self.assertTrue(c.items[1] - c.items[0] > 0.05)
+
+        # The default burst is 10 tuples.
+        def spike():
+            yield -1
+            time.sleep(1.0)
+            yield from range(30)
+        topo = Topology()
+        s = topo.source(spike)
+        control = topo.source([])
+        s = U.throttle(s, rate=20.0, control=control)
+        s = s.map(lambda v: time.monotonic())
+        c = Collect()
+        s.for_each(c)
+        local.run(topo, batch_size=1, timeout=30)
+        self.assertEqual(31, len(c.items))
+        self.assertTrue(c.items[10] - c.items[1] < 0.04)
+        self.assertTrue(c.items[13] - c.items[1] > 0.09)
+
+    def test_throttle_precise(self):
+        # High rates are paced a time slice at a time.
+        for kw in ({}, {'cpu_budget': 0.0}):
+            topo = Topology()
+            s = topo.source(range(25000))
+            s = s.map(U.Throttle(rate=50000.0, precise=True, **kw))
+            c = Collect()
+            s.for_each(c)
+            start = time.monotonic()
+            local.run(topo, timeout=30)
+            elapsed = time.monotonic() - start
+            self.assertEqual(25000, len(c.items))
+            self.assertTrue(0.45 < elapsed < 1.5, elapsed)
+        self.assertRaises(ValueError, U.Throttle, rate=100.0, precise=True, time_slice=0.0)
+
+        # Lateness of up to a slice is made up by the next slice.
+        class Paced(object):
+            _slice = 10
+            interval = 0.001
+            _released = 0
+            _pacer = None
+            def flush(self):
+                pass
+        throttle = Paced()
+        for behind, due in ((0.5, 0.0), (0.004, 0.006)):
+            now = time.monotonic()
+            throttle._next = now - behind
+            throttle._released = 0
+            _local_utility._Throttle._pace_slice(throttle)
+            self.assertAlmostEqual(now + due, throttle._next, delta=0.002)
+            self.assertEqual(9, throttle._released)
+
+        # The budget splits waits between sleeping and spinning.
+        for budget in (0.0, 1.0):
+            pacer = _local_utility._Pacer(threading.Event(), budget)
+            late = []
+            for _ in range(50):
+                deadline = time.monotonic() + 0.002
+                late.append(pacer.wait(deadline) - deadline)
+            self.assertTrue(min(late) >= 0.0)
+            if budget:
+                self.assertTrue(pacer.spun > 0.0)
+                self.assertTrue(pacer.spun < 0.1)
+            else:
+                self.assertEqual(0.0, pacer.spun)
+        self.assertRaises(ValueError, U.Throttle, rate=100.0, precise=True, cpu_budget=2.0)
+
+    def test_cancel(self):
+        topo = Topology()
+        s = topo.source(U.Sequence(period=0.01))
+        c = Collect()
+        s.for_each(c)
+
+        job = local.run(topo, timeout=0.5)
+        self.assertTrue(len(c.items) > 0)
+        self.assertTrue(job.elapsed >= 0.5)
@@ -0,0 +1,179 @@
+from unittest import TestCase
+
+import streamsx.standard._aggregates as _aggregates
+import streamsx.standard._sketches as _sketches
+
+import bisect
+import collections
+import random
+import statistics
+
+
+class TestMoments(TestCase):
+    def test_large_mean(self):
+        rnd = random.Random(42)
+        values = [1e9 + rnd.gauss(0, 0.01) for _ in range(10000)]
+        m = _sketches._Moments()
+        for v in values:
+            m.insert(v)
+        self.assertAlmostEqual(statistics.pstdev(values), m.stddev(), delta=1e-6)
+        self.assertAlmostEqual(statistics.stdev(values), m.stddev(sample=True), delta=1e-6)
+
+    def test_remove(self):
+        rnd = random.Random(7)
+        values = [1e6 + rnd.random() for _ in range(2000)]
+        m = _sketches._Moments()
+        for i, v in enumerate(values):
+            m.insert(v)
+            if i >= 100:
+                m.remove(values[i-100])
+        self.assertEqual(100, m.n)
+        self.assertAlmostEqual(statistics.pstdev(values[-100:]), m.stddev(), delta=1e-6)
+        for v in values[-100:]:
+            m.remove(v)
+        self.assertEqual(0, m.n)
+        self.assertEqual(0.0, m.stddev())
+
+    def test_merge(self):
+        rnd = random.Random(3)
+        values = [5e8 + rnd.gauss(0, 1) for _ in range(3000)]
+        parts = [_sketches._Moments() for _ in range(7)]
+        for i, v in enumerate(values):
+            parts[i % 7].insert(v)
+        m = _sketches._Moments()
+        for p in parts:
+            m.merge(p)
+        self.assertEqual(3000, m.n)
+        self.assertAlmostEqual(statistics.fmean(values), m.mean, delta=1e-6)
+        self.assertAlmostEqual(statistics.variance(values), m.variance(sample=True), delta=1e-6)
+
+
+def _rank(values, v):
+    return bisect.bisect(values, v) / len(values)
+
+
+class TestTDigest(TestCase):
+    def test_quantiles(self):
+        rnd = random.Random(1)
+        values = [rnd.lognormvariate(0, 1) for _ in range(50000)]
+        d = _sketches._TDigest()
+        for v in values:
+            d.insert(v)
+        self.assertTrue(len(d.means) <= 100)
+        values.sort()
+        for q in (0.001, 0.01, 0.5, 0.9, 0.99, 0.999):
+            self.assertAlmostEqual(q, _rank(values, d.quantile(q)), delta=0.002)
+        self.assertEqual(values[0], d.quantile(0.0))
+        self.assertEqual(values[-1], d.quantile(1.0))
+
+    def test_merge(self):
+        rnd = random.Random(2)
+        values = [rnd.gauss(100, 15) for _ in range(20000)]
+        parts = [_sketches._TDigest() for _ in range(4)]
+        for i, v in enumerate(values):
+            parts[i % 4].insert(v)
+        d = _sketches._TDigest()
+        for p in parts:
+            d.merge(p)
+        values.sort()
+        for q in (0.01, 0.5, 0.95):
+            self.assertAlmostEqual(q, _rank(values, d.quantile(q)), delta=0.005)
+
+    def test_sliding(self):
+        rnd = random.Random(3)
+        values = [rnd.random() * (1 + i // 10000) for i in range(60000)]
+        w = _aggregates._Blocks(_sketches._TDigest, lambda d: d.quantile(0.9))
+        for i, v in enumerate(values):
+            w.insert(v)
+            if i >= 20000:
+                w.evict(values[i-20000])
+        self.assertTrue(len(w.blocks) < 200)
+        self.assertAlmostEqual(0.9, _rank(sorted(values[-20000:]), w.value()), delta=0.01)
+
+    def test_kept_merge(self):
+        # Values merging the kept sketch of closed blocks match merging every block.
+        rnd = random.Random(7)
+        values = [int(rnd.paretovariate(1.1)) for _ in range(30000)]
+        w = _aggregates._Blocks(lambda: _sketches._SpaceSaving(50), lambda s: s.top(5), per_level=4)
+        for i, v in enumerate(values):
+            w.insert(v)
+            if i >= 5000:
+                w.evict(values[i-5000])
+            if i % 997 == 0:
+                full = _sketches._SpaceSaving(50)
+                for b in w.blocks:
+                    full.merge(b.sketch, b.remaining / b.n)
+                self.assertEqual(full.top(5), w.value())
+
+    def test_sketch_retention(self):
+        # Tuples are not retained for eviction of sketch only aggregations.
+        sketch = _aggregates._function('Percentile', lambda t: t['v'], (50,))
+        count = _aggregates._function('Count', lambda t: t['v'], ())
+        p = _aggregates._Partition([sketch], lambda t: t['g'])
+        q = _aggregates._Partition([sketch, count], lambda t: t['g'])
+        for i in range(3000):
+            for part in (p, q):
+                if len(part) >= 1000:
+                    part.evict()
+                part.insert({'g': i % 3, 'v': i}, i)
+        self.assertTrue(all(t is None for _, _, t in p.tuples))
+        self.assertTrue(all(t is not None for _, _, t in q.tuples))
+        self.assertEqual([v for _, v in p.results()], [v[:1] for _, v in q.results()])
+        self.assertEqual([333, 333, 334], [v[1] for _, v in q.results()])
+
+    def test_distinct_unbiased(self):
+        sketch, query = _aggregates._SKETCHES['CountDistinct'](0.01)
+        w = _aggregates._Blocks(sketch, query)
+        errors = []
+        for i in range(60000):
+            w.insert(i)
+            if i >= 5000:
+                w.evict(i - 5000)
+                if i % 101 == 0:
+                    errors.append((w.value() - 5000) / 5000)
+        self.assertAlmostEqual(0.0, statistics.mean(errors), delta=0.005)
+
+
+class TestHyperLogLog(TestCase):
+    def test_cardinality(self):
+        for n in (5, 500, 50000):
+            h = _sketches._HyperLogLog(0.01)
+            for i in range(n):
+                h.insert('user' + str(i))
+                h.insert('user' + str(i // 2))
+            self.assertAlmostEqual(n, h.cardinality(), delta=max(1, n * 0.03))
+        self.assertIsNotNone(h.registers)
+
+    def test_merge(self):
+        parts = [_sketches._HyperLogLog(0.02) for _ in range(3)]
+        for i in range(60000):
+            parts[i % 3].insert(i % 45000)
+        h = _sketches._HyperLogLog(0.02)
+        for p in parts:
+            h.merge(p)
+        self.assertAlmostEqual(45000, h.cardinality(), delta=45000 * 0.06)
+        self.assertRaises(ValueError, h.merge, _sketches._HyperLogLog(0.1))
+
+    def test_stable_hash(self):
+        self.assertEqual(_sketches._hash64('abc'), _sketches._hash64(b'abc'))
+        self.assertEqual(0x5995d533d814bbd8, _sketches._hash64('abc'))
+
+
+class TestSpaceSaving(TestCase):
+    def test_top(self):
+        rnd = random.Random(5)
+        values = [int(rnd.paretovariate(1.2)) for _ in range(50000)]
+        expected = [v for v, _ in collections.Counter(values).most_common(5)]
+        ss = _sketches._SpaceSaving(50)
+        for v in values:
+            ss.insert(v)
+        self.assertTrue(len(ss.counts) <= 50)
+        self.assertEqual(expected, ss.top(5))
+
+        parts = [_sketches._SpaceSaving(50) for _ in range(4)]
+        for i, v in enumerate(values):
+            parts[i % 4].insert(v)
+        for p in parts[1:]:
+            parts[0].merge(p)
+        self.assertTrue(len(parts[0].counts) <= 50)
+        self.assertEqual(expected, parts[0].top(5))
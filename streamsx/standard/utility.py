@@ -111,7 +111,7 @@ class _Beacon(streamsx.spl.op.Source):
         super(_Beacon, self).__init__(topology,kind,schemas,params,name)
 
 
-def spray(stream, count, queue=1000, name=None):
+def spray(stream, count, queue=1000, key=None, batch_size=None, linger=None, name=None):
     """Spray tuples to a number of streams.
     Each tuple on `stream` is sent to one (and only one)
     of the returned streams.
@@ -120,6 +120,13 @@ def spray(stream, count, queue=1000, name=None):
     first available thread will take the tuple and
     submit it.
 
+    When `key` is set the stream for a tuple is instead
+    defined by a stable hash of its `key` attribute, so that
+    all tuples with the same key are sent to the same stream.
+    Stateful processing per key, for example
+    :py:class:`Deduplicate` or an aggregation grouped by
+    the key, can then be spread across the returned streams.
+
     Each tuple on `stream` is placed on internal queue before it
     is submitted to an output stream. If the queue fills up
     then processing of the input stream is blocked until there
@@ -137,18 +144,86 @@ def spray(stream, count, queue=1000, name=None):
             outs.append(so.map(lambda x : (x['seq'], x['ts']), schema=U.SEQUENCE_SCHEMA))
         s = outs[0].union(set(outs))
 
+    Example, spray tuples by the attribute ``customer``, so that each stream deduplicates its own customers::
+
+        for so in U.spray(s, count=4, key='customer'):
+            so.map(U.Deduplicate(count=1000, key='customer'))
+
     Args:
         count(int): Number of output streams the input stream will be sprayed across.
         queue(int): Maximum queue size.
+        key(str): Name of the attribute whose value defines the stream of a tuple. Requires a structured schema.
+
+            .. versionadded:: 1.6
+        batch_size(int): Number of tuples handed off to a stream together. Handing off micro-batches rather than single tuples amortizes the synchronization between threads across the tuples of a batch. Applies to local execution.
+
+            .. versionadded:: 1.6
+        linger(float): Maximum time in seconds that tuples of a partial micro-batch are held before they are handed off, bounding the latency added by `batch_size`, which must be set. If not set, a partial micro-batch is handed off as soon as no more input tuples are queued. Applies to local execution.
+
+            .. versionadded:: 1.6
         name(str): Name of the stream, if `None` a generated name is used.
 
     Returns:
         list(:py:class:`topology_ref:streamsx.topology.topology.Stream`) : List of output streams.
+
+    .. note:: With `key` the tuples are routed by the SPL ``Split`` operator, which does not add threads, in local execution each output stream has its own thread.
     """
-    _op = _ThreadedSplit(stream, count, queue,name=name)
+    if batch_size is not None and batch_size < 1:
+        raise ValueError("batch_size must be at least 1: " + str(batch_size))
+    if linger is not None:
+        if batch_size is None:
+            raise ValueError("linger requires batch_size.")
+        if linger < 0:
+            raise ValueError("linger must not be negative: " + str(linger))
+    if key is not None:
+        _op = _Split(stream, count, key, name=name)
+    else:
+        _op = _ThreadedSplit(stream, count, queue,name=name)
+    _op._batch_size = batch_size
+    _op._linger = linger
     return _op.outputs
 
 
+def process_map(stream, func, processes, schema=None, name=None):
+    """Map tuples using a pool of processes.
+
+    Each tuple on `stream` is mapped by the callable `func` as by
+    :py:meth:`~streamsx.topology.topology.Stream.map`, with the tuples
+    sprayed across `processes` processes and the results united into
+    the returned stream. As each process has its own interpreter, a CPU
+    intensive Python callable is not serialized by the global interpreter lock.
+
+    The map is declared within a parallel region of width `processes`.
+    When executing locally tuples are passed to and from worker processes
+    through shared memory ring buffers and the results are submitted in
+    the order of the input tuples. `func` must be picklable, for example
+    a function or an instance of a class defined at module level.
+
+    Example, scoring readings in four processes::
+
+        import streamsx.standard.utility as U
+
+        scores = U.process_map(readings, score, processes=4, schema='tuple<rstring id, float64 score>')
+
+    Args:
+        stream(Stream): Stream to be mapped.
+        func(callable): Callable invoked for each tuple, as for ``Stream.map``.
+        processes(int): Number of processes.
+        schema(StreamSchema): Schema of the returned stream, as for ``Stream.map``.
+        name(str): Name of the map, if `None` a generated name is used.
+
+    Returns:
+        :py:class:`topology_ref:streamsx.topology.topology.Stream`: Stream of the mapped tuples.
+
+    .. versionadded:: 1.6
+    """
+    if processes < 1:
+        raise ValueError("processes must be at least 1: " + str(processes))
+    mapped = stream.parallel(processes).map(func, schema=schema, name=name)
+    mapped.oport.operator._local_processes = processes
+    return mapped.end_parallel()
+
+
 class _ThreadedSplit (streamsx.spl.op.Invoke):
     def __init__(self, stream, count, queue=1000, name=None):
         topology = stream.topology
@@ -159,6 +234,17 @@ class _ThreadedSplit (streamsx.spl.op.Invoke):
         params['bufferSize'] = uint32(queue)
         super(_ThreadedSplit, self).__init__(topology,kind,inputs,schemas,params,name)
 
+class _Split (streamsx.spl.op.Invoke):
+    def __init__(self, stream, count, key, name=None):
+        topology = stream.topology
+        kind="spl.utility::Split"
+        inputs=stream
+        schemas=[stream.oport.schema] * count
+        params = dict()
+        params['index'] = streamsx.spl.op.Expression.expression('(int64)(hashCode(' + key + ') % ' + str(count) + 'ul)')
+        super(_Split, self).__init__(topology,kind,inputs,schemas,params,name)
+        self._key = key
+
 class Throttle(streamsx.topology.composite.Map):
     """Throttle the rate of a stream.
 
@@ -167,21 +253,49 @@ class Throttle(streamsx.topology.composite.Map):
          precise(bool): Try to make the rate precise at the cost of increased overhead.
          include_punctuations(bool): Specifies whether punctuation is to be included in the rate computation
          period(float): The period to be used for maintaining the wanted rate in seconds. When making rate adjustments, the Throttle operator considers only the last period, going back from the current time. By default, the period is set to 10.0/rate.
+         burst(int): Number of tuples that may pass without delay after the stream has been slower than `rate`. The throttle is then a token bucket holding up to `burst` tokens that are refilled at `rate`, so that a short spike passes through without added latency while the long term rate is bounded. Equivalent to a `period` of ``burst/rate`` and thus cannot be combined with `period` or `precise`.
+
+             .. versionadded:: 1.6
+         time_slice(float): With `precise`, tuples are released in batches covering `time_slice` seconds, so that high rates are paced by waiting once per slice rather than once per tuple. Defaults to 0.001. Applies to local execution.
+
+             .. versionadded:: 1.6
+         cpu_budget(float): With `precise`, the fraction of a core that may be spent busy-waiting. A wait sleeps until shortly before the next slice is due and spins for the remainder to release it on time, once the budget is spent it sleeps until the slice is due. The budget only changes how a wait is split between sleeping and spinning, not the size of slices, a slice released late is made up by scheduling the next slice from when it was due, making up lateness of at most one slice. Defaults to 0.1. Applies to local execution.
+
+             .. versionadded:: 1.6
 
     Example throttling a stream ``readings`` to around 10,000 tuples per second::
 
         import streamsx.standard.utility as U
         readings = readings.map(U.Throttle(rate=10000.0))
 
+    Example allowing spikes of up to 500 readings to pass without delay::
+
+        readings = readings.map(U.Throttle(rate=10000.0, burst=500))
+
+    .. seealso:: :py:func:`throttle` to change the rate at runtime.
     """
-    def __init__(self, rate:float, precise:bool=False, include_punctuations:bool=False, period:float=None):
+    def __init__(self, rate:float, precise:bool=False, include_punctuations:bool=False, period:float=None, burst:int=None, time_slice:float=None, cpu_budget:float=None):
+        if burst is not None and (period is not None or precise):
+            raise ValueError("burst cannot be combined with period or precise.")
+        if time_slice is not None and time_slice <= 0:
+            raise ValueError("time_slice must be positive: " + str(time_slice))
+        if cpu_budget is not None and not 0.0 <= cpu_budget <= 1.0:
+            raise ValueError("cpu_budget must be between 0.0 and 1.0: " + str(cpu_budget))
         self.rate = rate
         self.precise = precise
         self.include_punctuations = include_punctuations
         self.period = period
+        self.burst = burst
+        self.time_slice = time_slice
+        self.cpu_budget = cpu_budget
 
     def populate(self, topology, stream, schema, name, **options):
-        _op = _Throttle(stream, self.rate, period=self.period, includePunctuations=self.include_punctuations, precise=self.precise, name=name)
+        period = self.period
+        if self.burst is not None:
+            period = self.burst / self.rate
+        _op = _Throttle(stream, self.rate, period=period, includePunctuations=self.include_punctuations, precise=self.precise, name=name)
+        _op._time_slice = self.time_slice
+        _op._cpu_budget = self.cpu_budget
         return _op.stream
 
 
@@ -201,6 +315,61 @@ class _Throttle (streamsx.spl.op.Map):
         super(_Throttle, self).__init__(kind,stream,params=params,name=name)
 
 
+def throttle(stream, rate, control, burst=None, include_punctuations=False, name=None):
+    """Throttle the rate of a stream, adapting the rate at runtime.
+
+    Tuples on `stream` are passed through unmodified to the returned
+    stream at `rate` tuples per second, as with :py:class:`Throttle`,
+    until a tuple arrives on the `control` stream. Each tuple on
+    `control` sets a new rate, taken from its ``rate`` attribute or,
+    for a stream of Python objects, the tuple itself. Tuples with a
+    rate that is not positive are ignored.
+
+    Tuples held back by the throttle are queued, so that a tuple on
+    `control` takes effect without waiting for the throttled stream.
+
+    Example slowing down ``readings`` when a downstream consumer reports it is overloaded::
+
+        import streamsx.standard.utility as U
+
+        rates = load.map(lambda l: 1000.0 if l['overloaded'] else 10000.0)
+        readings = U.throttle(readings, rate=10000.0, control=rates)
+
+    Args:
+        stream(:py:class:`topology_ref:streamsx.topology.topology.Stream`): Stream to be throttled.
+        rate(float): Initial rate of the returned stream in tuples/second.
+        control(:py:class:`topology_ref:streamsx.topology.topology.Stream`): Stream setting the rate.
+        burst(int): Number of tuples that may pass without delay after the stream has been slower than the rate, defaults to 10 tuples, as the default `period` of :py:class:`Throttle`.
+        include_punctuations(bool): Specifies whether punctuation is to be included in the rate computation.
+        name(str): Name of resultant stream, defaults to a generated name.
+
+    Returns:
+        :py:class:`topology_ref:streamsx.topology.topology.Stream`: Throttled stream.
+
+    .. note:: Changing the rate from a control stream is only supported by local execution.
+
+    .. versionadded:: 1.6
+    """
+    _op = _ControlledThrottle([stream, control], rate, burst=burst, includePunctuations=include_punctuations, name=name)
+    return _op.outputs[0]
+
+class _ControlledThrottle(streamsx.spl.op.Invoke):
+    def __init__(self, inputs, rate, burst=None, includePunctuations=None, name=None):
+        topology = inputs[0].topology
+        kind="spl.utility::Throttle"
+        schema=inputs[0].oport.schema
+        params = dict()
+        params['rate'] = float64(rate)
+        if burst is not None:
+            params['period'] = float64(burst / rate)
+        if includePunctuations is not None:
+            params['includePunctuations'] = includePunctuations
+        super(_ControlledThrottle, self).__init__(topology,kind,inputs,[schema],params,name)
+
+    def _generate(self, opjson):
+        raise ValueError("Changing the rate of a throttle from a control stream is only supported by local execution.")
+
+
 def union(inputs, schema, name=None):
     """Union structured streams with disparate schemas.
 